@@ -1,24 +1,33 @@
 import os
-import json
-import time
+import re
 from datetime import datetime
-from google import genai
-from google.genai import types
 
-import archive_manager
-from personas_config import SYSTEM_PROMPT_SOVEREIGN
+import delta_store
+import input_builder
+import key_pool
+import llm_cache
+import metrics
+import model_router
+import retry_policy
 
 # ================= 🔧 配置区域 =================
-if os.environ.get("GITHUB_ACTIONS"):
-    print("☁️ 检测到云端环境：禁用代理，使用直连...")
-else:
-    print("🏠 检测到本地环境：启用代理 17890...")
-    PROXY_PORT = "17890"
-    os.environ["HTTP_PROXY"] = f"http://127.0.0.1:{PROXY_PORT}"
-    os.environ["HTTPS_PROXY"] = f"http://127.0.0.1:{PROXY_PORT}"
+# 启动时只做 Key、输入文件和变化检测；google-genai、系统提示词(personas_config)
+# 和归档模块都在真正要用时才导入，代理由 key_pool 在第一次创建客户端时设置。
 
-# 使用性能较好的模型进行决策分析
-MODEL_NAME = "gemini-2.0-flash-exp"
+# 决策分析用的模型由 model_router 按任务 "boardroom" 选择（默认 gemini-2.0-flash-exp，不可用时降级到 gemini-2.5-flash）
+MODEL_TASK = "boardroom"
+
+# 每个板块送入董事会的标题 token 预算（约等于以前的 100 条）
+TOKEN_BUDGET = int(os.environ.get("BOARDROOM_TOKEN_BUDGET", 2500))
+
+# batch = 一次调用生成全部待更新板块（系统提示词只发一次），缺失的板块再单独补；
+# sector = 旧方式，每个板块单独调用
+DEFAULT_MODE = os.environ.get("BOARDROOM_MODE", "batch")
+# 批量响应里按这个标记切分各板块的报告
+SECTION_MARKER = "=== SECTOR: {key} ==="
+SECTION_RE = re.compile(r"^\s*=+\s*SECTOR\s*[:：]\s*([A-Za-z]+)\s*=+\s*$", re.MULTILINE)
+# 切出来的板块报告短于这个长度视为缺失（模型只写了标题或被截断）
+MIN_SECTION_CHARS = 200
 
 # 板块文件配置
 FILES_CONFIG = {
@@ -28,137 +37,195 @@ FILES_CONFIG = {
     "general": { "in": "data_general.json", "name": "综合/娱乐", "key_env": "KEY_GENERAL" }
 }
 
-def get_client(key_env):
+def load_data_titles(filepath, token_budget=None, only_titles=None):
     """
-    初始化 AI 客户端，按优先级尝试不同的 API Key
+    从 JSON 文件中按 token 预算加载标题列表（各平台轮询、近似重复去重），用于 AI 分析
     """
-    # 1. 尝试板块对应的专属 Key
-    api_key = os.environ.get(key_env)
-    
-    # 2. 如果没找到，尝试常见的几个通用环境变量
-    if not api_key:
-        possible_keys = ["GOOGLE_API_KEY", "KEY_1", "KEY_2", "KEY_3", "KEY_4", "KEY_5", "KEY_6", "KEY_7", "KEY_8"]
-        for k in possible_keys:
-            val = os.environ.get(k)
-            if val:
-                api_key = val
-                break
-    
-    if not api_key:
-        return None
-    return genai.Client(api_key=api_key, http_options={'api_version': 'v1alpha'})
+    data = input_builder.load_platforms(filepath)
+    if not data: return []
+    token_budget = TOKEN_BUDGET if token_budget is None else token_budget
+    return input_builder.build_lines(data, token_budget, "- {title}", only_titles)
+
+def build_sector_prompt(label, titles, now=None):
+    from personas_config import SYSTEM_PROMPT_SOVEREIGN
+    config = FILES_CONFIG.get(label, {})
+    return (f"{SYSTEM_PROMPT_SOVEREIGN}\n\n"
+            f"# 今日{config.get('name', label)}板块情报（{(now or datetime.now()).strftime('%Y-%m-%d')}）\n"
+            + "\n".join(titles))
 
-def load_data_titles(filepath, limit=100):
+def build_batch_prompt(sector_titles, now=None):
     """
-    从 JSON 文件中加载标题列表，用于 AI 分析
+    所有板块合在一个 prompt 里：系统提示词只出现一次，要求按分隔标记逐板块输出
     """
-    if not os.path.exists(filepath): return []
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    
-    titles = []
-    count = 0
-    for platform in data:
-        items = platform.get('items', [])
-        for item in items:
-            title = item.get('title', '').strip()
-            if title:
-                titles.append(f"- {title}")
-                count += 1
-            if count >= limit: break
-    return titles
-
-def generate_boardroom_report(sector_name, titles):
-    """
-    召唤董事会 AI 进行激辩并生成战略裁决报告
-    """
-    # --- 🧠 智能重试机制 ---
-    # 定义 Key 池：优先使用专属 Key，失败则轮询通用 Key 池
-    primary_key_env = FILES_CONFIG.get(sector_name, {}).get("key_env")
-    primary_key = os.environ.get(primary_key_env) if primary_key_env else None
-    
-    # 构建所有可用 Key 的列表
-    candidate_keys = []
-    if primary_key: candidate_keys.append(primary_key)
-    candidate_keys.append(os.environ.get("GOOGLE_API_KEY"))
-    for i in range(1, 9):
-        k = os.environ.get(f"KEY_{i}")
-        if k: candidate_keys.append(k)
-        
-    # 去重并过滤空值
-    candidate_keys = list(set([k for k in candidate_keys if k]))
-    
-    if not candidate_keys:
-        print(f"❌ 找不到用于 {sector_name} 的任何 API Key")
+    from personas_config import SYSTEM_PROMPT_SOVEREIGN
+    keys = list(sector_titles)
+    parts = [
+        SYSTEM_PROMPT_SOVEREIGN,
+        f"# 今日情报（{(now or datetime.now()).strftime('%Y-%m-%d')}），共 {len(keys)} 个板块",
+        "下面按板块给出最新标题。请对每个板块分别独立完成上述 STEP 1-3，各自输出一份完整的 Markdown 报告。",
+        f"输出格式：每份报告之前单独一行写分隔标记 `{SECTION_MARKER.format(key='板块代号')}`，"
+        f"按 {', '.join(keys)} 的顺序输出全部 {len(keys)} 个板块，不要合并、不要遗漏。",
+    ]
+    for key, titles in sector_titles.items():
+        parts.append(f"## 板块 {key}（{FILES_CONFIG[key]['name']}）\n" + "\n".join(titles))
+    return "\n\n".join(parts)
+
+def clean_report(text):
+    """
+    清理 Markdown 代码块包裹符
+    """
+    text = text.strip()
+    if text.startswith("```markdown"):
+        text = text.replace("```markdown", "", 1)
+    if text.startswith("```"):
+        text = text.replace("```", "", 1)
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+def split_sections(text, keys):
+    """
+    按分隔标记把批量响应切回 {板块: 报告}；缺失、未请求或过短的板块不返回
+    """
+    matches = list(SECTION_RE.finditer(text or ""))
+    sections = {}
+    for i, m in enumerate(matches):
+        key = m.group(1).lower()
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        content = clean_report(text[m.end():end])
+        if key in keys and key not in sections and len(content) >= MIN_SECTION_CHARS:
+            sections[key] = content
+    return sections
+
+def require_text(text):
+    if not (text or "").strip(): raise retry_policy.MalformedResponse("模型返回了空报告")
+    return text
+
+def call_model(label, prompt, primary_key_env=None):
+    """
+    发送一次董事会请求：优先使用专属 Key，失败时按 retry_policy 分类重试（429 换 Key，5xx / 超时 / 空响应退避后重试）
+    """
+    candidate_envs = [primary_key_env, "GOOGLE_API_KEY"] + [f"KEY_{i}" for i in range(1, 9)]
+    pool = key_pool.get_pool()
+    if not pool.resolve(candidate_envs):
+        print(f"❌ 找不到用于 {label} 的任何 API Key")
         return None
 
-    # 开始尝试
-    for attempt, api_key in enumerate(candidate_keys):
-        try:
-            print(f"🧠 {sector_name}: 正在尝试 Key [{attempt+1}/{len(candidate_keys)}] (AI 生成中)...")
-            
-            client = genai.Client(api_key=api_key, http_options={'api_version': 'v1alpha'})
-            
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    temperature=1.0, 
-                )
-            )
-            return response.text
-            
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                print(f"⚠️ Key [{attempt+1}] 额度耗尽 (429)，正在切换下一个...")
-                time.sleep(2) # 稍微冷却切换
-                continue
-            else:
-                # 其他错误直接抛出
-                print(f"❌ 生成 {sector_name} 报告时发生非 429 错误: {e}")
-                return None
-    
-    print(f"❌ {sector_name}: 所有可用 Key ({len(candidate_keys)} 个) 均已耗尽额度或失败。")
-    return None
+    from google.genai import types
+    gen_config = types.GenerateContentConfig(
+        temperature=1.0, 
+    )
+    def send(client, model):
+        return client.models.generate_content(model=model, contents=prompt, config=gen_config).text
+
+    print(f"🧠 {label}: AI 生成中...")
+    try:
+        model, text, _, from_cache = model_router.get_router().call(
+            MODEL_TASK, "boardroom", prompt, send, pool, parse=require_text, label=label, gen_config=gen_config,
+            preferred=primary_key_env, candidates=candidate_envs, api_version='v1alpha')
+    except Exception as e:
+        print(f"❌ 生成 {label} 报告失败 ({retry_policy.classify(e)}): {e}")
+        return None
+    if not from_cache: llm_cache.put(model, prompt, gen_config, text)
+    return text
+
+def generate_boardroom_report(sector_name, titles, now=None):
+    """
+    召唤董事会 AI 进行激辩并生成单个板块的战略裁决报告
+    """
+    text = call_model(sector_name, build_sector_prompt(sector_name, titles, now),
+                      FILES_CONFIG.get(sector_name, {}).get("key_env"))
+    return clean_report(text) if text else None
 
-def run_boardroom():
+def generate_batch_reports(sector_titles, now=None):
+    """
+    一次调用生成多个板块的报告，返回 {板块: 报告}（只含成功切出来的板块）
+    """
+    text = call_model("batch", build_batch_prompt(sector_titles, now), "GOOGLE_API_KEY")
+    sections = split_sections(text, set(sector_titles))
+    for key in sector_titles:
+        metrics.inc("boardroom_batch_sections_total", stage="boardroom", status="ok" if key in sections else "missing")
+    return sections
+
+def generate_reports(mode=None, files_config=None, now=None):
+    """
+    收集需要更新的板块并生成报告，返回 {板块: 报告或 None}，不落盘。
+    files_config/now 供回放时换成历史目录和历史日期（此时不看当前差量，全部重新生成）
+    """
+    mode = mode or DEFAULT_MODE
+    files_config = FILES_CONFIG if files_config is None else files_config
+    replay = now is not None
+    if not len(key_pool.get_pool()):
+        print("❌ 未检测到 API Key，跳过董事会报告。")
+        return {}
+    pending = {}
+    for key, config in files_config.items():
+        if not os.path.exists(config['in']):
+            print(f"⚠️ 跳过 {key}: 未找到对应数据文件。")
+            continue
+        if not replay and delta_store.sector_done("boardroom", key, config['in']) and os.path.exists(f"strategy_{key}.md"):
+            print(f"💤 跳过 {key}: 数据与上次成功生成时相同。")
+            continue
+
+        titles = load_data_titles(config['in'], only_titles=None if replay else delta_store.fresh_titles(key))
+        if not titles:
+            print(f"⚠️ 跳过 {key}: 数据文件里没有可用标题。")
+            continue
+        pending[key] = titles
+
+    # 多个板块时先批量生成；切不出来的板块（缺失/过短/整批失败）再逐个单独调用
+    reports = {}
+    if mode == "batch" and len(pending) > 1:
+        print(f"🧠 批量生成 {len(pending)} 个板块: {', '.join(pending)}")
+        reports = generate_batch_reports(pending, now)
+        missing = [key for key in pending if key not in reports]
+        if missing:
+            print(f"⚠️ 批量响应缺少板块 {', '.join(missing)}，改为单独生成。")
+    for key, titles in pending.items():
+        if key not in reports:
+            reports[key] = generate_boardroom_report(key, titles, now)
+    return reports
+
+def run_boardroom(archive=True, mode=None):
     """
     董事会运行主逻辑：归档旧数据 -> 生成各版块报告 -> 更新前端索引
+    archive=False 时只生成报告，归档与索引交给 pipeline.py 的 archive 阶段。返回报告生成失败的板块
     """
     print("🚀 Sovereign AI Boardroom 正在启动...")
-    archive_manager.init_dirs()
     
-    # 1. 首先归档原始数据
-    raw_files = [cfg['in'] for cfg in FILES_CONFIG.values()]
-    archive_manager.archive_daily_data(raw_files)
+    # 1. 首先归档原始数据（归档模块牵涉 SQLite、压缩等，只在要归档或保存报告时导入）
+    if archive:
+        import archive_manager
+        archive_manager.init_dirs()
+        raw_files = [cfg['in'] for cfg in FILES_CONFIG.values()]
+        archive_manager.archive_daily_data(raw_files)
     
-    # 2. 遍历处理每个板块
-    for key, config in FILES_CONFIG.items():
-        titles = load_data_titles(config['in'])
-        if not titles:
-            print(f"⚠️ 跳过 {key}: 未找到对应数据文件。")
-            continue
-            
-        report_content = generate_boardroom_report(key, titles)
-        if report_content:
-            # 清理 Markdown 代码块包裹符
-            if report_content.startswith("```markdown"):
-                report_content = report_content.replace("```markdown", "", 1)
-            if report_content.startswith("```"):
-                report_content = report_content.replace("```", "", 1)
-            if report_content.endswith("```"):
-                report_content = report_content[:-3]
-                
-            # 保存报告并存档
-            report_path = archive_manager.save_report(key, report_content)
-            print(f"✅ 报告已保存: {report_path}")
-            
-        time.sleep(5) # 防止触发 API 频率限制
+    # 2. 生成需要更新的板块报告
+    generated = generate_reports(mode=mode)
+    reports = {key: content for key, content in generated.items() if content}
+    failed = [key for key, content in generated.items() if not content]
+    if failed: print(f"❌ 以下板块的报告没有生成: {', '.join(failed)}")
+
+    if reports: import archive_manager
+    for key, report_content in reports.items():
+        # 保存报告并存档
+        report_path = archive_manager.save_report(key, report_content)
+        delta_store.mark_done("boardroom", key, FILES_CONFIG[key]['in'])
+        print(f"✅ 报告已保存: {report_path}")
 
     # 3. 更新历史记录索引，供前端调用数据
-    archive_manager.update_history_index()
-    print("📅 历史索引已更新，系统运行完毕。")
+    if archive:
+        archive_manager.update_history_index()
+        archive_manager.build_bundles()
+        print("📅 历史索引与前端数据包已更新，系统运行完毕。")
+    model_router.finish_run()
+    metrics.flush("boardroom", "archive")
+    return failed
 
 if __name__ == "__main__":
-    run_boardroom()
+    import argparse
+    parser = argparse.ArgumentParser(description="AI 董事会：生成各板块战略报告")
+    parser.add_argument("--mode", choices=["batch", "sector"], default=DEFAULT_MODE,
+                        help="batch 一次调用生成全部板块；sector 每个板块单独调用")
+    args = parser.parse_args()
+    run_boardroom(mode=args.mode)
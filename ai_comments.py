@@ -2,19 +2,28 @@ import json
 import os
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from google import genai
-from google.genai import types
+
+import atomic_io
+import delta_store
+import input_builder
+import key_pool
+import llm_cache
+import metrics
+import model_router
+import retry_policy
 
 # ================= 🔧 模型与策略配置 =================
-MODEL_REGISTRY = {
-    "smart": "gemini-3-flash-preview",       # 聪明/专业角色用
-    "cheap": "gemini-2.5-flash", # 普通/吃瓜角色用
+# 角色分两档，每档对应 model_router 里的一个任务，具体用哪个模型由路由按预算和近期表现决定
+MODEL_TASKS = {
+    "smart": "comments.smart",   # 聪明/专业角色用（默认 gemini-3-flash-preview）
+    "cheap": "comments.cheap",   # 普通/吃瓜角色用（默认 gemini-2.5-flash）
 }
 
 DEFAULT_MODEL = "cheap"
 
-# 🌟 智能分组关键词：包含这些词的角色会分配给 "smart" 模型
+# 🌟 智能分组关键词：包含这些词的角色会分到 "smart" 档
 HIGH_INTEL_KEYWORDS = [
     "医生", "分析师", "博主", "老师", "创业者", "捞偏门", 
     "大厂", "律师", "公务员", "老干部", "首富", 
@@ -57,29 +66,26 @@ FILES_CONFIG = {
     "general": { "in": "data_general.json", "out": "comments_general.json", "name": "娱乐/吃瓜" }
 }
 
+# 评论模块只使用通用 Key 池，按健康度路由（见 key_pool.py）
 KEY_VARS = ["KEY_1", "KEY_2", "KEY_3", "KEY_4", "KEY_5", "KEY_6", "KEY_7", "KEY_8"]
 
-def get_random_client():
-    valid_keys = [os.environ.get(k) for k in KEY_VARS if os.environ.get(k)]
-    if not valid_keys:
-        print("❌ 错误：未检测到 API Key")
-        return None
-    return genai.Client(api_key=random.choice(valid_keys), http_options={'api_version': 'v1alpha'})
-
-def load_news_summary(filepath):
-    if not os.path.exists(filepath): return ""
-    with open(filepath, "r", encoding="utf-8") as f: data = json.load(f)
-    summary = []
-    count = 0
-    for platform in data:
-        items = platform.get('items', [])
-        for item in items:
-            if count >= 15: break
-            summary.append(f"- {item.get('title')}")
-            count += 1
-    return "\n".join(summary)
+# 评论用的新闻摘要 token 预算（约等于以前的 15 条，但覆盖更多平台）
+NEWS_TOKEN_BUDGET = int(os.environ.get("COMMENTS_TOKEN_BUDGET", 450))
+
+# ================= ⚡ 并发分片配置 =================
+PERSONA_SHARD_SIZE = int(os.environ.get("COMMENTS_SHARD_SIZE", 12))  # 每个请求模拟的角色数
+MAX_WORKERS = int(os.environ.get("COMMENTS_MAX_WORKERS", 8))         # 同时在途的请求数
+
+def load_news_summary(filepath, only_titles=None, token_budget=None):
+    data = input_builder.load_platforms(filepath)
+    if not data: return ""
+    token_budget = NEWS_TOKEN_BUDGET if token_budget is None else token_budget
+    return "\n".join(input_builder.build_lines(data, token_budget, "- {title}", only_titles))
 
 def assign_model_to_personas():
+    """
+    按关键词把角色分到 smart / cheap 两档，返回 {档位: 角色列表}
+    """
     batches = {}
     for persona in PERSONAS:
         assigned_alias = DEFAULT_MODEL
@@ -87,14 +93,19 @@ def assign_model_to_personas():
             if kw in persona:
                 assigned_alias = "smart"
                 break
-        real_model_name = MODEL_REGISTRY.get(assigned_alias, MODEL_REGISTRY[DEFAULT_MODEL])
-        if real_model_name not in batches: batches[real_model_name] = []
-        batches[real_model_name].append(persona)
+        if assigned_alias not in batches: batches[assigned_alias] = []
+        batches[assigned_alias].append(persona)
     return batches
 
-def process_batch(client, model_name, personas_list, news_text, category_name):
+def parse_comments(text):
+    comments = json.loads(text or "")
+    if not isinstance(comments, list) or not comments:
+        raise retry_policy.MalformedResponse(f"评论应为非空 JSON 数组，实际为 {type(comments).__name__}")
+    return comments
+
+def process_batch(tier, personas_list, news_text, category_name):
     if not personas_list: return []
-    print(f"   ⚡ [{model_name}] 生成 {len(personas_list)} 个角色评论...")
+    print(f"   ⚡ [{tier}] 生成 {len(personas_list)} 个角色评论...")
     
     # 🔥🔥🔥 核心 Prompt 修改：增加随机性和长短不一的要求 🔥🔥🔥
     prompt = f"""
@@ -128,45 +139,130 @@ def process_batch(client, model_name, personas_list, news_text, category_name):
     ]
     """
 
+    from google.genai import types   # SDK 推迟到真正要调用模型（或查缓存）时才导入
+    gen_config = types.GenerateContentConfig(response_mime_type="application/json", temperature=0.9) # 温度调高，增加随机性
+
+    def send(client, model):
+        return client.models.generate_content(model=model, contents=prompt, config=gen_config).text
+
     try:
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt,
-            config=types.GenerateContentConfig(response_mime_type="application/json", temperature=0.9) # 温度调高，增加随机性
-        )
-        return json.loads(response.text)
+        model, text, comments, from_cache = model_router.get_router().call(
+            MODEL_TASKS.get(tier, MODEL_TASKS[DEFAULT_MODEL]), "comments", prompt, send, key_pool.get_pool(),
+            parse=parse_comments, label=f"[{tier}] {category_name}", gen_config=gen_config,
+            candidates=KEY_VARS, api_version='v1alpha')
     except Exception as e:
-        print(f"   ⚠️ 错误: {e}")
+        # 所有模型都重试用尽才放弃这一批角色，并计入指标（以前任何错误都静默返回空列表）
+        print(f"   ❌ [{tier}] {len(personas_list)} 个角色的评论没有生成 ({retry_policy.classify(e)}): {e}")
+        metrics.inc("comment_batches_dropped_total", stage="comments", tier=tier)
         return []
+    if not from_cache: llm_cache.put(model, prompt, gen_config, text)
+    return comments
 
-def generate_comments(category_key, config):
-    client = get_random_client()
-    if not client: return
-    print(f"🔄 处理板块：{config['name']}")
-    news_text = load_news_summary(config['in'])
-    if not news_text: return
+def build_shards(shard_size=PERSONA_SHARD_SIZE):
+    """
+    按档位分组后再把每组角色切成固定大小的分片，返回 [(档位, 角色列表)]
+    """
+    shards = []
+    for tier, personas in assign_model_to_personas().items():
+        for i in range(0, len(personas), shard_size):
+            shards.append((tier, personas[i:i + shard_size]))
+    return shards
 
-    batches = assign_model_to_personas()
-    all_comments = []
+def run_shard(tier, personas_list, news_text, category_name):
+    """
+    生成一个分片，返回 (评论列表, 耗时)；失败时评论列表为空，不影响其他分片（重试由 retry_policy 负责）
+    """
+    start = time.perf_counter()
+    comments = process_batch(tier, personas_list, news_text, category_name)
+    return comments, time.perf_counter() - start
 
-    for model_name, personas_sublist in batches.items():
-        time.sleep(1)
-        batch_client = get_random_client() or client
-        comments = process_batch(batch_client, model_name, personas_sublist, news_text, config['name'])
-        if comments: all_comments.extend(comments)
+def prepare_sector(category_key, config, replay=False):
+    """
+    检查是否需要处理该板块，需要时返回新闻摘要文本，否则返回 None；回放历史日期时不看当前差量
+    """
+    if not os.path.exists(config['in']):
+        print(f"⚠️ 跳过 {config['name']}：未找到输入文件 {config['in']}。")
+        return None
+    if not replay and delta_store.sector_done("comments", category_key, config['in']) and os.path.exists(config['out']):
+        print(f"💤 跳过 {config['name']}：数据与上次成功生成时相同。")
+        return None
+    if not key_pool.get_pool().resolve(KEY_VARS):
+        print("❌ 错误：未检测到 API Key")
+        return None
+    print(f"🔄 处理板块：{config['name']}")
+    return load_news_summary(config['in'], None if replay else delta_store.fresh_titles(category_key)) or None
 
+def save_comments(category_key, config, all_comments, now=None):
     random.shuffle(all_comments)
     
     # 随机选取 30 条左右，避免太多
     final_comments = all_comments[:35] if len(all_comments) > 35 else all_comments
 
     if final_comments:
-        output_data = { "date": datetime.now().strftime("%Y-%m-%d %H:%M"), "category": category_key, "comments": final_comments }
-        with open(config['out'], "w", encoding="utf-8") as f: json.dump(output_data, f, ensure_ascii=False, indent=2)
-        print(f"✅ 完成！生成 {len(final_comments)} 条评论。\n")
+        output_data = { "date": (now or datetime.now()).strftime("%Y-%m-%d %H:%M"), "category": category_key, "comments": final_comments }
+        atomic_io.write_json(config['out'], output_data, stage="comments")
+        print(f"✅ {config['name']} 完成！生成 {len(final_comments)} 条评论。")
 
-if __name__ == "__main__":
+def process_sectors(keys=None, files_config=None, now=None):
+    """
+    所有板块 × 所有角色分片一起并发，总耗时约等于最慢的一次调用；限速交给 Key 池。
+    files_config/now 供回放时换成历史目录和历史日期，返回各分片的耗时记录
+    """
+    files_config = FILES_CONFIG if files_config is None else files_config
+    keys = list(files_config) if keys is None else keys
+    shards = build_shards()
+
+    news = {}
+    for key in keys:
+        news_text = prepare_sector(key, files_config[key], replay=now is not None)
+        if news_text: news[key] = news_text
+
+    results = {key: [] for key in news}
+    timings = []
+    if news:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = {}
+            for key, news_text in news.items():
+                for idx, (tier, personas_list) in enumerate(shards):
+                    future = pool.submit(run_shard, tier, personas_list, news_text, files_config[key]['name'])
+                    futures[future] = (key, idx, tier, len(personas_list))
+            for future in as_completed(futures):
+                key, idx, tier, size = futures[future]
+                comments, elapsed = future.result()
+                results[key].extend(comments)
+                metrics.observe("shard_seconds", elapsed, "comments", tier=tier)
+                timings.append((key, idx, tier, size, len(comments), elapsed))
+
+    failed = {key for key, _, _, _, count, _ in timings if not count}
+    for key, all_comments in results.items():
+        save_comments(key, files_config[key], all_comments, now)
+        # 有分片失败的板块不记为完成，下一轮即使数据没变也会重新生成
+        if now is None and all_comments and key not in failed:
+            delta_store.mark_done("comments", key, files_config[key]['in'])
+    return timings
+
+def run_comments(keys=None, files_config=None):
+    """
+    返回各分片的耗时记录；评论数为 0 的分片即生成失败（pipeline.py 据此判定阶段失败）
+    """
     print(f"🤖 AI 模拟评论启动...")
-    for key, config in FILES_CONFIG.items():
-        generate_comments(key, config)
-        time.sleep(2)
\ No newline at end of file
+    run_start = time.perf_counter()
+    timings = process_sectors(keys, files_config)
+
+    if timings:
+        print("⏱️ 分片耗时:")
+        for key, idx, tier, size, count, elapsed in sorted(timings):
+            print(f"   {key:<8} #{idx:<2} {tier:<6} 角色 {size:>2} -> 评论 {count:>2}  {elapsed:6.1f}s")
+    print(f"⏱️ 总耗时: {time.perf_counter() - run_start:.1f}s")
+    model_router.finish_run()
+    metrics.flush("comments")
+    return timings
+
+def generate_comments(category_key, config):
+    """
+    只处理单个板块（兼容旧入口），输入输出路径取自传入的 config
+    """
+    return run_comments([category_key], {category_key: config})
+
+if __name__ == "__main__":
+    run_comments()
\ No newline at end of file
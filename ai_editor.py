@@ -1,25 +1,44 @@
-import json
+import argparse
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# ================= 📦 新版 SDK 导入 =================
-# 必须先在 requirements.txt 或 workflow 中安装 google-genai
-from google import genai
-from google.genai import types
+import atomic_io
+import delta_store
+import input_builder
+import key_pool
+import llm_cache
+import metrics
+import model_router
+import news_cluster
+import retry_policy
+import stream_json
+import trend_engine
+from title_matcher import TitleMatcher
 
 # ================= 🔧 智能配置区域 =================
-if os.environ.get("GITHUB_ACTIONS"):
-    print("☁️ 检测到云端环境：禁用代理，使用直连...")
-else:
-    print("🏠 检测到本地环境：启用代理 17890...")
-    PROXY_PORT = "17890"
-    os.environ["HTTP_PROXY"] = f"http://127.0.0.1:{PROXY_PORT}"
-    os.environ["HTTPS_PROXY"] = f"http://127.0.0.1:{PROXY_PORT}"
-
-# 💡 提示：新版 SDK 通常使用 'gemini-2.0-flash' 或 'gemini-1.5-flash'
-# 如果你的账号有 'gemini-3.0-flash' 权限，可以在这里修改
-MODEL_NAME = "gemini-3-flash-preview"
+# google-genai（需在 requirements.txt 或 workflow 中安装）和代理设置都推迟到真正调用模型时：
+# SDK 在下面构造生成配置时才导入，客户端和代理由 key_pool 在第一次取 Key 时创建/设置。
+# 输入文件、变化检测和 Key 检查都在这之前，空跑只需几十毫秒。
+
+# 用哪个模型由 model_router 按任务 "editor" 的档位、预算和近期表现决定（默认 gemini-3-flash-preview，
+# 不可用时降级到 gemini-2.5-flash），要换模型改 model_router.TASKS 或 model_policy.json
+MODEL_TASK = "editor"
+
+# 执行模式：parallel = 四个板块并发（各自 Key 独立限速），sequential = 逐个执行
+DEFAULT_MODE = os.environ.get("EDITOR_MODE", "parallel")
+# 每个板块喂给模型的新闻素材 token 预算
+TOKEN_BUDGET = int(os.environ.get("EDITOR_TOKEN_BUDGET", 12000))
+# 是否用 crawl.py 产出的跨源聚类去重并标注多源热度（EDITOR_CLUSTERS=0 关闭）
+USE_CLUSTERS = os.environ.get("EDITOR_CLUSTERS", "1") == "1"
+# 是否让 trend_engine 排名靠前的升温词所在标题优先进入 prompt（EDITOR_TRENDS=0 关闭）
+USE_TRENDS = os.environ.get("EDITOR_TRENDS", "1") == "1"
+TREND_TERMS = 15
+# 流式接收响应（EDITOR_STREAM=0 关闭）：条目边生成边解析，流中途断开时保留已完成的条目
+STREAM_MODE = os.environ.get("EDITOR_STREAM", "1") == "1"
+# 流断开或 JSON 不完整时，至少抢救到这么多条才写出部分结果，否则按失败处理
+MIN_PARTIAL_ITEMS = int(os.environ.get("EDITOR_MIN_PARTIAL_ITEMS", 3))
 
 FILES_CONFIG = {
     "finance": { "in": "data_finance.json", "out": "analysis_finance.json", "type": "finance", "key_env": "KEY_FINANCE" },
@@ -28,35 +47,35 @@ FILES_CONFIG = {
     "general": { "in": "data_general.json", "out": "analysis_general.json", "type": "general", "key_env": "KEY_GENERAL" }
 }
 
-def load_and_simplify(filepath):
-    if not os.path.exists(filepath): return None, None
-    with open(filepath, "r", encoding="utf-8") as f: raw_data = json.load(f)
+def load_and_simplify(filepath, only_titles=None, token_budget=None, clusters=None, priority_terms=None):
+    raw_data = input_builder.load_platforms(filepath)
+    if raw_data is None: return None, None
+    token_budget = TOKEN_BUDGET if token_budget is None else token_budget
     
-    simplified_lines = []
+    # 按 token 预算、各平台轮询取素材，近似重复的标题（含跨源聚类的同簇标题）只保留一条
+    line_format = "[{site_id}]{title}{heat}"
+    selected, used_tokens, dropped = input_builder.select_items(
+        raw_data, token_budget, line_format=line_format, only_titles=only_titles, clusters=clusters,
+        priority_terms=priority_terms
+    )
+    simplified_lines = [input_builder.format_line(line_format, site_id, title, clusters) for site_id, title, _ in selected]
+    if clusters and any(title in clusters for _, title, _ in selected):
+        simplified_lines.insert(0, "（标题后的“N源”表示该新闻被 N 个平台同时报道，可作为热度参考）")
+
+    # URL 回填用全部原始标题，被去重掉的写法也能匹配回链接
     url_lookup = {}
-    
-    # 保持较大的读取量，确保 AI 有足够素材
-    TOTAL_SAFETY_CAP = 2000 
-    total_count = 0
-    
     for platform in raw_data:
-        site_id = platform.get('id', 'unknown')
-        items = platform.get('items', [])
-        for item in items:
-            if total_count >= TOTAL_SAFETY_CAP: break
+        for item in platform.get('items', []):
             title = item.get('title', '').strip()
-            url = item.get('url', '')
-            if title:
-                simplified_lines.append(f"[{site_id}]{title}")
-                url_lookup[title] = url
-                total_count += 1
-        if total_count >= TOTAL_SAFETY_CAP: break
+            if title and title not in url_lookup:
+                url_lookup[title] = item.get('url', '')
                 
-    print(f"📊 {filepath} 读取到 {total_count} 条数据。")
+    sources = len({site_id for site_id, _, _ in selected})
+    print(f"📊 {filepath} 选取 {len(selected)} 条数据（{sources} 个平台，约 {used_tokens} tokens，去重 {dropped} 条）。")
     return "\n".join(simplified_lines), url_lookup
 
-def get_prompt(module_type, data_text):
-    base_info = f"Date:{datetime.now().strftime('%Y-%m-%d')}\nData:\n{data_text}"
+def get_prompt(module_type, data_text, now=None):
+    base_info = f"Date:{(now or datetime.now()).strftime('%Y-%m-%d')}\nData:\n{data_text}"
     format_instruction = "Return strictly pure JSON only. No Markdown."
     
     # 提示词保持原样，未做修改
@@ -170,83 +189,183 @@ def get_prompt(module_type, data_text):
         {format_instruction}
         """
 
-def process_module(key, config):
-    print(f"🔄 Processing: {key} (Model: {MODEL_NAME})")
+def stream_generate(client, key, model, prompt, gen_config):
+    """
+    流式调用模型，返回 (原始文本, 解析器, 中途错误)。
+    一条都没收到就出错时直接抛出，交给外层按 429 / 普通错误处理
+    """
+    parser = stream_json.StreamingJSONParser()
+    chunks = []
+    start = time.perf_counter()
+    first_item = None
+    try:
+        for chunk in client.models.generate_content_stream(model=model, contents=prompt, config=gen_config):
+            text = chunk.text or ""
+            chunks.append(text)
+            if parser.feed(text) and first_item is None:
+                first_item = time.perf_counter() - start
+                metrics.observe("time_to_first_item_seconds", first_item, "editor", sector=key)
+                print(f"⚡ {key}: 首条在 {first_item:.1f}s 到达")
+    except Exception as e:
+        if not parser.items: raise
+        print(f"⚠️ {key}: 流在第 {len(parser.items)} 条后中断 ({e})")
+        return "".join(chunks), parser, e
+    return "".join(chunks), parser, None
+
+def parse_response(raw):
+    """
+    返回 (结果, 是否完整)。流式时条目已经边收边解析好；整体不是合法 JSON（被截断、多了尾巴）时用已完成的部分，
+    抢救到的条目不足 MIN_PARTIAL_ITEMS 时抛 MalformedResponse 让重试策略重新生成
+    """
+    if isinstance(raw, tuple):
+        _, parser = raw
+        ai_json, complete = parser.result(), parser.complete
+    else:
+        if not raw: raise retry_policy.MalformedResponse("Empty response from API.")
+        ai_json, complete = stream_json.parse_tolerant(raw)
+    if not complete and len(ai_json.get("items", [])) < MIN_PARTIAL_ITEMS:
+        raise retry_policy.MalformedResponse(f"响应不完整，只抢救到 {len(ai_json.get('items', []))} 条")
+    return ai_json, complete
+
+def process_module(key, config, now=None):
+    """
+    now 不为空表示回放历史日期（见 replay.py）：不看当前抓取的差量和升温词，整份数据重新处理
+    """
+    print(f"🔄 Processing: {key}")
+
+    replay = now is not None
+    if not os.path.exists(config['in']):
+        print(f"⚠️ Skip {key}: 未找到输入文件 {config['in']}。")
+        return "skipped"
+    if not replay and delta_store.sector_done("editor", key, config['in']) and os.path.exists(config['out']):
+        print(f"💤 Skip {key}: 数据与上次成功生成时相同。")
+        return "unchanged"
     
-    current_api_key = os.environ.get(config['key_env']) or os.environ.get("GOOGLE_API_KEY")
-    if not current_api_key:
+    pool = key_pool.get_pool()
+    if not len(pool):
         print(f"❌ Skip {key}: No API Key found.")
-        return
+        return "skipped"
 
     # ================= ⚡ 新版 SDK 调用逻辑 =================
     try:
-        # 1. 初始化客户端
-        client = genai.Client(api_key=current_api_key)
-        
-        slim_text, url_lookup = load_and_simplify(config['in'])
-        if not slim_text: return
-        
-        # 2. 发送请求 (使用新版 generate_content 方法)
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=get_prompt(config['type'], slim_text),
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json",
-                safety_settings=[
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_HARASSMENT",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_HATE_SPEECH",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        threshold="BLOCK_NONE"
-                    ),
-                    types.SafetySetting(
-                        category="HARM_CATEGORY_DANGEROUS_CONTENT",
-                        threshold="BLOCK_NONE"
-                    )
-                ]
-            )
+        # 1. 读取数据（客户端由 Key 池按需分配并复用）
+        slim_text, url_lookup = load_and_simplify(
+            config['in'], None if replay else delta_store.fresh_titles(key),
+            clusters=news_cluster.load_clusters(key, config.get('clusters', news_cluster.CLUSTER_FILE)) if USE_CLUSTERS else None,
+            priority_terms=trend_engine.load_trend_terms(key, TREND_TERMS) if USE_TRENDS and not replay else None
         )
+        if not slim_text: return "skipped"
         
-        # 3. 解析 JSON 响应
-        # 新版 SDK 的 response.text 直接返回字符串
-        if not response.text:
-            print(f"⚠️ Warning {key}: Empty response from API.")
-            return
+        # 2. 构造请求（缓存键 = 模型 + prompt + 生成配置）
+        prompt = get_prompt(config['type'], slim_text, now)
+        from google.genai import types   # 缓存键也依赖生成配置，到这里才需要 SDK
+        gen_config = types.GenerateContentConfig(
+            response_mime_type="application/json",
+            safety_settings=[
+                types.SafetySetting(
+                    category="HARM_CATEGORY_HARASSMENT",
+                    threshold="BLOCK_NONE"
+                ),
+                types.SafetySetting(
+                    category="HARM_CATEGORY_HATE_SPEECH",
+                    threshold="BLOCK_NONE"
+                ),
+                types.SafetySetting(
+                    category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                    threshold="BLOCK_NONE"
+                ),
+                types.SafetySetting(
+                    category="HARM_CATEGORY_DANGEROUS_CONTENT",
+                    threshold="BLOCK_NONE"
+                )
+            ]
+        )
+        def send(client, model):
+            if not STREAM_MODE:
+                return client.models.generate_content(model=model, contents=prompt, config=gen_config).text
+            text, parser, stream_error = stream_generate(client, key, model, prompt, gen_config)
+            # 流断开且抢救到的条目不够用：按原始错误（429 / 连接中断）交给重试策略
+            if stream_error is not None and len(parser.items) < MIN_PARTIAL_ITEMS: raise stream_error
+            return text, parser
+
+        # 3. 选模型交给 model_router（先查缓存），调用与解析交给 retry_policy：
+        #    429 换 Key，5xx / 超时退避重试，不能用的响应重新生成，重试用尽再降级到下一档模型
+        model, response_text, (ai_json, complete), from_cache = model_router.get_router().call(
+            MODEL_TASK, "editor", prompt, send, pool, parse=parse_response, label=key, gen_config=gen_config,
+            preferred=[config['key_env'], "GOOGLE_API_KEY"])
 
-        ai_json = json.loads(response.text)
+        if not complete:
+            metrics.inc("editor_partial_responses_total", stage="editor", sector=key)
+            print(f"🩹 {key}: 响应不完整，保留已完成的 {len(ai_json.get('items', []))} 条。")
+        # 只缓存完整且能正常解析的响应
+        elif not from_cache:
+            llm_cache.put(model, prompt, gen_config, response_text)
         
-        # 4. URL 回填逻辑 (保持不变)
+        # 4. URL 回填逻辑：一次建索引，按相似度取最佳匹配
+        matcher = TitleMatcher(url_lookup)
         for item in ai_json.get("items", []):
-            t = item.get("title")
-            item['url'] = "#"
-            # 简单的模糊匹配
-            for raw_t, raw_u in url_lookup.items():
-                if t and (t in raw_t or raw_t in t):
-                    item['url'] = raw_u
-                    break
-        
-        ai_json['date'] = datetime.now().strftime("%Y-%m-%d %H:%M")
-        
-        # 5. 保存文件
-        with open(config['out'], "w", encoding="utf-8") as f:
-            json.dump(ai_json, f, ensure_ascii=False, indent=2)
+            matched_url, _ = matcher.match(item.get("title"))
+            item['url'] = matched_url or "#"
+            metrics.inc("editor_url_backfill_total", stage="editor", result="hit" if matched_url else "miss")
+        
+        ai_json['date'] = (now or datetime.now()).strftime("%Y-%m-%d %H:%M")
+        
+        # 5. 保存文件（原子替换，前端和下游阶段不会读到半截文件）
+        atomic_io.write_json(config['out'], ai_json, stage="editor")
         print(f"✅ Generated: {config['out']}")
+        # 不完整的结果不记为完成，下一轮即使数据没变也会重新生成
+        if complete and not replay: delta_store.mark_done("editor", key, config['in'])
+        return "ok" if complete else "partial"
         
     except Exception as e:
         print(f"❌ Error {key}: {e}")
         # 打印更多调试信息（如果存在）
         if hasattr(e, 'response'):
              print(f"🔍 API Response Info: {e.response}")
+        return "error"
 
-if __name__ == "__main__":
-    for key, config in FILES_CONFIG.items():
-        process_module(key, config)
-        # 稍微增加延时，防止触发新 API 的速率限制
-        time.sleep(8)
+def timed_process_module(key, config, now=None):
+    start = time.perf_counter()
+    status = process_module(key, config, now)
+    return status, time.perf_counter() - start
 
+def process_sectors(mode=DEFAULT_MODE, files_config=None, now=None):
+    """
+    处理全部板块，返回 {板块: (状态, 耗时)}；files_config/now 供回放时换成历史目录和历史日期
+    """
+    files_config = FILES_CONFIG if files_config is None else files_config
+    results = {}
+    if mode == "parallel":
+        with ThreadPoolExecutor(max_workers=len(files_config)) as pool:
+            futures = {key: pool.submit(timed_process_module, key, config, now) for key, config in files_config.items()}
+            for key, future in futures.items():
+                results[key] = future.result()
+    else:
+        for key, config in files_config.items():
+            results[key] = timed_process_module(key, config, now)
+
+    for key, (status, elapsed) in results.items():
+        metrics.observe("sector_seconds", elapsed, "editor", sector=key, status=status)
+    return results
+
+def run_editor(mode=DEFAULT_MODE):
+    """
+    运行全部板块；parallel 模式下各板块并发，限速交给每个 Key 的令牌桶
+    """
+    run_start = time.perf_counter()
+    results = process_sectors(mode)
+
+    print(f"⏱️ 板块耗时 ({mode}):")
+    for key, (status, elapsed) in results.items():
+        print(f"   {key:<8} {status:<8} {elapsed:6.1f}s")
+    print(f"⏱️ 总耗时: {time.perf_counter() - run_start:.1f}s")
+    model_router.finish_run()
+    metrics.flush("editor")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI 编辑：生成各板块分析")
+    parser.add_argument("--mode", choices=["parallel", "sequential"], default=DEFAULT_MODE,
+                        help="parallel 并发执行各板块；sequential 逐个执行")
+    args = parser.parse_args()
+    run_editor(args.mode)
@@ -1,11 +1,48 @@
 import os
 import shutil
 import json
+import gzip
+import hashlib
+import time
 from datetime import datetime
 
+import atomic_io
+import headline_db
+import history_store
+import metrics
+
 HISTORY_DIR = "history"
 REPORTS_DIR = "reports"
 
+# copy  = 每天整份复制 data_*.json 到 history/YYYY-MM-DD/（默认，前端兼容）
+# store = 按条目去重写入 history_store/（见 history_store.py，可按需还原成旧目录结构）
+ARCHIVE_BACKEND = os.environ.get("ARCHIVE_BACKEND", "copy")
+# ARCHIVE_DB=1 时每次归档额外写入 SQLite 标题库（见 headline_db.py），与上面的后端互不影响
+ARCHIVE_DB = os.environ.get("ARCHIVE_DB", "0") == "1"
+
+# 前端数据包：每个日期一份压缩后的 JSON（各板块的原始条目 + 分析 + 评论 + 报告），
+# 文件名带内容哈希，可以被浏览器永久缓存；manifest.json 记录当前各包的文件名
+BUNDLE_DIR = "bundles"
+BUNDLE_MANIFEST = os.path.join(BUNDLE_DIR, "manifest.json")
+SECTORS = ["finance", "tech", "global", "general"]
+# GitHub Pages 不会返回预压缩文件，默认不写；放在支持 gzip_static 的服务器后面时设 BUNDLE_COMPRESS=1
+BUNDLE_COMPRESS = os.environ.get("BUNDLE_COMPRESS", "0") == "1"
+
+# 历史索引：history_index.json 只放最近的日期列表（前端兼容字段 dates）、最近几天的完整条目和分片目录，
+# 每个月的完整条目放在 history_index/YYYY-MM.json。每次归档只重算当天、只改当月分片，
+# 历史再长，根索引的大小和前端启动时的读取量都不变
+HISTORY_INDEX = "history_index.json"
+INDEX_SHARD_DIR = "history_index"
+INDEX_VERSION = 2
+INDEX_ROOT_DATES = int(os.environ.get("INDEX_ROOT_DATES", 90))   # 根索引 dates 列出的日期数
+INDEX_RECENT = 7                                                 # 根索引直接带完整条目的日期数
+
+# brotli 是可选依赖：BUNDLE_COMPRESS=1 且装了 brotli 时额外输出 .br
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 def get_today_str():
     return datetime.now().strftime("%Y-%m-%d")
 
@@ -18,8 +55,22 @@ def init_dirs():
 def archive_daily_data(file_paths):
     """
     Archive the given list of files to history/YYYY-MM-DD/
+    (or into the deduplicated history_store when ARCHIVE_BACKEND=store)
     """
     today = get_today_str()
+
+    if ARCHIVE_DB:
+        with metrics.timer("archive_db_seconds", "archive"):
+            rows, new_items = headline_db.record_files(file_paths)
+        metrics.inc("archive_db_new_items_total", new_items, stage="archive")
+
+    if ARCHIVE_BACKEND == "store":
+        with metrics.timer("archive_store_seconds", "archive"):
+            added, total = history_store.archive_files(today, file_paths)
+        metrics.inc("archive_store_items_total", total, stage="archive")
+        metrics.inc("archive_store_new_items_total", added, stage="archive")
+        return
+
     target_dir = os.path.join(HISTORY_DIR, today)
     
     if not os.path.exists(target_dir):
@@ -28,7 +79,9 @@ def archive_daily_data(file_paths):
     for file_path in file_paths:
         if os.path.exists(file_path):
             filename = os.path.basename(file_path)
+            start = time.perf_counter()
             shutil.copy2(file_path, os.path.join(target_dir, filename))
+            metrics.observe_file_write("archive", os.path.join(target_dir, filename), time.perf_counter() - start)
             # print(f"📚 Archived {filename} to {target_dir}")
 
 def save_report(category, content):
@@ -45,8 +98,7 @@ def save_report(category, content):
         
     filename = f"{category}_strategy.md"
     
-    with open(os.path.join(history_report_dir, filename), "w", encoding="utf-8") as f:
-        f.write(content)
+    atomic_io.write_text(os.path.join(history_report_dir, filename), content, stage="archive")
         
     # 2. Save to Latest (Root/reports for frontend)
     # We might want to save it in the root or a static folder for the frontend to read easily.
@@ -55,8 +107,7 @@ def save_report(category, content):
     # Or just root/strategy_{category}.md to keep it simple for the frontend.
     
     latest_path = f"strategy_{category}.md" # Root directory for easy access
-    with open(latest_path, "w", encoding="utf-8") as f:
-        f.write(content)
+    atomic_io.write_text(latest_path, content, stage="archive")
         
     return latest_path
 
@@ -64,20 +115,227 @@ def get_available_dates():
     """
     Return a list of available dates in history
     """
-    if not os.path.exists(HISTORY_DIR):
-        return []
-    dates = [d for d in os.listdir(HISTORY_DIR) if os.path.isdir(os.path.join(HISTORY_DIR, d))]
+    dates = set(history_store.list_dates())
+    if os.path.exists(HISTORY_DIR):
+        dates.update(d for d in os.listdir(HISTORY_DIR) if os.path.isdir(os.path.join(HISTORY_DIR, d)))
     return sorted(dates, reverse=True)
 
-def update_history_index():
+def _content_hash(obj):
+    data = json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def _count(obj, key):
+    return len(obj.get(key) or []) if isinstance(obj, dict) else 0
+
+def describe_date(date, store_day=None):
+    """
+    Build the index entry of one archived date: per-sector item counts,
+    which reports exist and a content hash per sector. None if nothing is archived.
+    """
+    sectors = {}
+    for sector in SECTORS:
+        content = collect_sector(date, sector, store_day)
+        if all(v is None for v in content.values()): continue
+        raw = content["raw"] if isinstance(content["raw"], list) else []
+        sectors[sector] = {
+            "platforms": len(raw),
+            "items": sum(len(p.get("items", [])) for p in raw),
+            "analysis_items": _count(content["analysis"], "items"),
+            "comments": _count(content["comments"], "comments"),
+            "report": content["report"] is not None,
+            "hash": _content_hash(content),
+        }
+    if not sectors: return None
+    return {
+        "sectors": sectors,
+        "reports": [sector for sector, info in sectors.items() if info["report"]],
+        "items": sum(info["items"] for info in sectors.values()),
+        "hash": _content_hash({sector: info["hash"] for sector, info in sectors.items()}),
+    }
+
+def _shard_file(month):
+    return f"{INDEX_SHARD_DIR}/{month}.json"
+
+def update_history_index(dates=None, rebuild=False):
     """
-    Generate a history_index.json file in the root directory for frontend to consume.
+    Incrementally refresh history_index.json and its monthly shards.
+    Only the given dates (default: today) are re-described and only their
+    month shards rewritten. An index in the old format, or rebuild=True,
+    triggers a one-off full rebuild from every archived date.
     """
-    dates = get_available_dates()
+    root = _read_json(HISTORY_INDEX) or {}
+    if rebuild or root.get("version") != INDEX_VERSION:
+        dates = get_available_dates()
+        shards, listed = {}, set()
+        if os.path.isdir(INDEX_SHARD_DIR):
+            shutil.rmtree(INDEX_SHARD_DIR)
+    else:
+        dates = dates or [get_today_str()]
+        shards, listed = dict(root.get("shards", {})), set(root.get("dates", []))
+    os.makedirs(INDEX_SHARD_DIR, exist_ok=True)
+
+    loaded = {}
+    def get_shard(month):
+        if month not in loaded:
+            loaded[month] = _read_json(_shard_file(month)) or {"month": month, "dates": {}}
+        return loaded[month]
+
+    store_dates = set(history_store.list_dates())
+    for date in dates:
+        store_day = history_store.load_day(date) if date in store_dates else None
+        entry = describe_date(date, store_day)
+        shard = get_shard(date[:7])
+        if entry is None:
+            shard["dates"].pop(date, None)
+            listed.discard(date)
+        else:
+            shard["dates"][date] = entry
+            listed.add(date)
+
+    for month in {date[:7] for date in dates}:
+        shard = get_shard(month)
+        if shard["dates"]:
+            shard["dates"] = dict(sorted(shard["dates"].items(), reverse=True))
+            atomic_io.write_json(_shard_file(month), shard, compact=True)
+            shards[month] = {
+                "file": _shard_file(month),
+                "count": len(shard["dates"]),
+                "items": sum(e["items"] for e in shard["dates"].values()),
+                "hash": _content_hash({d: e["hash"] for d, e in shard["dates"].items()}),
+            }
+        else:
+            shards.pop(month, None)
+            if os.path.exists(_shard_file(month)): os.remove(_shard_file(month))
+
+    # 根索引只列最近 INDEX_ROOT_DATES 天；删掉日期后不够数时才去读更早的分片补齐
+    total = sum(s["count"] for s in shards.values())
+    months = sorted(shards, reverse=True)
+    for month in months:
+        if len(listed) >= min(total, INDEX_ROOT_DATES): break
+        if sum(d[:7] == month for d in listed) < shards[month]["count"]:
+            listed.update(get_shard(month)["dates"])
+    root_dates = sorted(listed, reverse=True)[:INDEX_ROOT_DATES]
+
     index_data = {
-        "dates": dates,
+        "version": INDEX_VERSION,
+        "dates": root_dates,
+        "total_dates": total,
+        "recent": {date: get_shard(date[:7])["dates"].get(date) for date in root_dates[:INDEX_RECENT]},
+        "shards": {month: shards[month] for month in months},
         "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
-    with open("history_index.json", "w", encoding="utf-8") as f:
-        json.dump(index_data, f, ensure_ascii=False, indent=2)
-    # print(f"📅 Updated history_index.json with {len(dates)} dates.")
+    atomic_io.write_json(HISTORY_INDEX, index_data)
+    return index_data
+
+def _read_json(path):
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _read_text(path):
+    if not os.path.exists(path): return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def collect_sector(date, sector, store_day=None):
+    """
+    Gather raw items, analysis, comments and report of one sector.
+    date == "latest" reads the live files in the root directory.
+    """
+    if date == "latest":
+        return {
+            "raw": _read_json(f"data_{sector}.json"),
+            "analysis": _read_json(f"analysis_{sector}.json"),
+            "comments": _read_json(f"comments_{sector}.json"),
+            "report": _read_text(f"strategy_{sector}.md"),
+            "trends": _read_json(f"trends_{sector}.json"),
+        }
+    day_dir = os.path.join(HISTORY_DIR, date)
+    raw = _read_json(os.path.join(day_dir, f"data_{sector}.json"))
+    if raw is None and store_day:
+        raw = store_day.get(f"data_{sector}.json")
+    return {
+        "raw": raw,
+        "analysis": _read_json(os.path.join(day_dir, f"analysis_{sector}.json")),
+        "comments": _read_json(os.path.join(day_dir, f"comments_{sector}.json")),
+        "report": _read_text(os.path.join(day_dir, "reports", f"{sector}_strategy.md")),
+    }
+
+def _write_bundle(name, payload):
+    """
+    Write one minified bundle named by its content hash (plus .gz / .br
+    siblings when BUNDLE_COMPRESS is on).
+    Unchanged content keeps the same file name, so nothing is rewritten.
+    """
+    data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f"{name}.{digest}.json"
+    path = os.path.join(BUNDLE_DIR, filename)
+    entry = {"file": filename, "hash": digest, "bytes": len(data)}
+    metrics.observe("bundle_bytes", len(data), "archive")
+
+    if BUNDLE_COMPRESS and not os.path.exists(path + ".gz"):
+        # 先写压缩版本，清单指向的主文件最后出现
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        metrics.observe("bundle_gzip_bytes", len(gz), "archive")
+        atomic_io.write_bytes(path + ".gz", gz)
+    if not os.path.exists(path):
+        atomic_io.write_bytes(path, data, stage="archive")
+    else:
+        metrics.inc("bundle_unchanged_total", stage="archive")
+    if BUNDLE_COMPRESS and brotli is not None:
+        if not os.path.exists(path + ".br"):
+            atomic_io.write_bytes(path + ".br", brotli.compress(data, quality=11))
+        entry["br"] = os.path.getsize(path + ".br")
+    return entry
+
+def _remove_bundle(filename):
+    for suffix in ("", ".gz", ".br"):
+        path = os.path.join(BUNDLE_DIR, filename + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+def build_bundles(dates=None):
+    """
+    Emit one bundle per date and refresh bundles/manifest.json.
+    The "all" bundle holds every sector, so the page loads a whole date in
+    a single request.
+    Defaults to the live data and today's archive; pass get_available_dates()
+    to rebuild everything.
+    """
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    manifest = _read_json(BUNDLE_MANIFEST) or {"dates": {}}
+    store_dates = set(history_store.list_dates())
+
+    for date in dates or ["latest", get_today_str()]:
+        store_day = history_store.load_day(date) if date in store_dates else None
+        sectors = {sector: collect_sector(date, sector, store_day) for sector in SECTORS}
+        sectors = {k: v for k, v in sectors.items() if any(x is not None for x in v.values())}
+        if not sectors: continue
+
+        previous = manifest["dates"].get(date, {})
+        entry = {"all": _write_bundle(date, {"date": date, "sectors": sectors})}
+        # 旧清单里的按板块数据包也一并清掉
+        stale = [previous.get("all", {}).get("file")] + [e.get("file") for e in previous.get("sectors", {}).values()]
+        for filename in stale:
+            if filename and filename != entry["all"]["file"]:
+                _remove_bundle(filename)
+        manifest["dates"][date] = entry
+
+    manifest["generated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    atomic_io.write_json(BUNDLE_MANIFEST, manifest, compact=True)
+    return manifest
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Rebuild frontend bundles and history index")
+    parser.add_argument("--all", action="store_true", help="rebuild bundles and the history index for every archived date")
+    args = parser.parse_args()
+    manifest = build_bundles(["latest"] + get_available_dates() if args.all else None)
+    update_history_index(rebuild=args.all)
+    metrics.flush("archive")
+    for date, entry in sorted(manifest["dates"].items()):
+        print(f"📦 {date}: {entry['all']['file']} {entry['all']['bytes'] / 1024:.1f} KB")
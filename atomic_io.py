@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+import time
+
+# ================= 💾 原子写文件 =================
+# 所有产出文件都经由这里写：先写同目录下的隐藏临时文件并 fsync，再 os.replace 覆盖目标。
+# 进程崩溃、超时被杀或并发阶段同时读取时，读者只会看到旧文件或完整的新文件，不会读到半截 JSON。
+# 临时文件以 "." 开头，不会被 data_*.json 之类的通配匹配到。
+# 传入 stage 时顺带把写入字节数和耗时记进 metrics（file_write_bytes / file_write_seconds）。
+
+FSYNC = os.environ.get("ATOMIC_FSYNC", "1") == "1"          # 关掉可在本地调试时省 I/O，但不再防断电
+# 供人阅读的 JSON 默认 indent=2；COMPACT_JSON=1 时一律紧凑输出（前端照常解析）
+COMPACT_JSON = os.environ.get("COMPACT_JSON", "0") == "1"
+
+
+def _fsync_dir(directory):
+    """
+    rename 本身也要落盘，否则断电后目录项可能还指向旧文件
+    """
+    if os.name != "posix": return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_bytes(path, data, stage=None):
+    """
+    原子写入二进制内容，返回写入的字节数
+    """
+    start = time.perf_counter()
+    directory = os.path.dirname(path) or "."
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if FSYNC:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    if FSYNC: _fsync_dir(directory)
+    if stage:
+        import metrics   # metrics 自己也用本模块写文件，延迟导入避免循环
+        metrics.observe_file_write(stage, path, time.perf_counter() - start, len(data))
+    return len(data)
+
+
+def write_text(path, text, stage=None):
+    return write_bytes(path, text.encode("utf-8"), stage)
+
+
+def dumps_json(data, compact=None):
+    """
+    compact=True 用于只给程序读的文件（差量、聚类、状态）；None 跟随 COMPACT_JSON
+    """
+    compact = COMPACT_JSON if compact is None else compact
+    if compact:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return json.dumps(data, ensure_ascii=False, indent=2)
+
+
+def write_json(path, data, compact=None, stage=None):
+    return write_text(path, dumps_json(data, compact), stage)
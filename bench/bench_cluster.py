@@ -0,0 +1,76 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import input_builder
+import news_cluster
+
+# ================= 📏 跨源聚类基准测试 =================
+# 在 history/ 下每天的 data_*.json 上跑 news_cluster，统计：
+#   吞吐（条/秒）、簇数、跨源簇数，以及按代表标题计算的 token 压缩比
+
+
+def iter_days(history_dir):
+    for date in sorted(os.listdir(history_dir)):
+        day_dir = os.path.join(history_dir, date)
+        if not os.path.isdir(day_dir): continue
+        files = {}
+        for name in sorted(os.listdir(day_dir)):
+            if name.startswith("data_") and name.endswith(".json"):
+                with open(os.path.join(day_dir, name), "r", encoding="utf-8") as f:
+                    files[name[len("data_"):-len(".json")]] = json.load(f)
+        if files: yield date, files
+
+
+def title_tokens(titles):
+    return sum(input_builder.estimate_tokens(t) + 1 for t in titles)
+
+
+def bench(history_dir, threshold, num_perm, bands, rounds):
+    hasher = news_cluster.MinHasher(num_perm)
+    total_items = total_clusters = total_multi = 0
+    tokens_before = tokens_after = 0
+    elapsed = 0.0
+
+    for date, sectors in iter_days(history_dir):
+        day_items = day_multi = 0
+        day_start = time.perf_counter()
+        for _ in range(rounds):
+            results = {cat: news_cluster.cluster_items(p, threshold, hasher, bands) for cat, p in sectors.items()}
+        day_elapsed = (time.perf_counter() - day_start) / rounds
+        elapsed += day_elapsed
+
+        for clusters in results.values():
+            day_items += sum(len(c["members"]) for c in clusters)
+            day_multi += sum(1 for c in clusters if c["source_count"] > 1)
+            total_clusters += len(clusters)
+            tokens_before += title_tokens(m["title"] for c in clusters for m in c["members"])
+            tokens_after += title_tokens(c["title"] for c in clusters)
+        total_items += day_items
+        total_multi += day_multi
+        print(f"{date}: {day_items:5d} 条 {day_elapsed * 1000:7.1f} ms "
+              f"({day_items / day_elapsed:8.0f} 条/s) 跨源簇 {day_multi}")
+
+    if not total_items:
+        print(f"❌ {history_dir}/ 下没有可用的 data_*.json")
+        return
+    print(f"📊 perm={num_perm} bands={bands} 阈值={threshold}: 共 {total_items} 条 -> {total_clusters} 簇，"
+          f"跨源簇 {total_multi}，吞吐 {total_items / elapsed:.0f} 条/s")
+    print(f"📉 标题 token: {tokens_before} -> {tokens_after} "
+          f"({(1 - tokens_after / tokens_before) * 100:.1f}% 减少)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="news_cluster 聚类吞吐基准测试")
+    parser.add_argument("--history", default=os.path.join(ROOT_DIR, "history"))
+    parser.add_argument("--threshold", type=float, default=news_cluster.JACCARD_THRESHOLD)
+    parser.add_argument("--perms", type=int, default=news_cluster.NUM_PERM)
+    parser.add_argument("--bands", type=int, default=news_cluster.BANDS)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    bench(args.history, args.threshold, args.perms, args.bands, args.rounds)
@@ -0,0 +1,65 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import crawl
+from stub_newsnow import start_stub_server
+
+# ================= 📏 抓取模式基准测试 =================
+# 对本地桩服务器分别跑 single(一次性大请求) 与 sharded(分片并发)，
+# 统计每轮耗时的 p50/p95/max 和平台吞吐。
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values: return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[idx]
+
+
+def bench_mode(mode, rounds, shard_size):
+    durations, platforms, failed_total = [], 0, 0
+    session = crawl.create_session()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        try:
+            if mode == "single":
+                raw_data, failed = crawl.fetch_single()
+            else:
+                raw_data, failed = crawl.fetch_sharded(shard_size=shard_size, session=session)
+        except Exception:
+            raw_data, failed = [], list(crawl.ALL_SOURCES)
+        durations.append(time.perf_counter() - start)
+        platforms += len(raw_data)
+        failed_total += len(failed)
+
+    total = sum(durations)
+    print(f"{mode:<8} shard={shard_size if mode != 'single' else '-':<3} rounds={rounds} "
+          f"p50={statistics.median(durations):6.2f}s p95={percentile(durations, 95):6.2f}s "
+          f"max={max(durations):6.2f}s 吞吐={platforms / total:6.1f} 平台/s 失败源={failed_total}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="crawl.py 抓取模式基准测试")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务器每个源的处理耗时")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="桩服务器单次请求失败概率")
+    parser.add_argument("--shard-sizes", default="4,6,12")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, fail_rate=args.fail_rate)
+    crawl.API_URL = f"{base_url}/api/s/entire"
+    # 压测时缩短重试退避，避免 sleep 淹没真实耗时
+    crawl.SHARD_RETRIES = 1
+    try:
+        bench_mode("single", args.rounds, len(crawl.ALL_SOURCES))
+        for size in (int(x) for x in args.shard_sizes.split(",")):
+            bench_mode("sharded", args.rounds, size)
+    finally:
+        server.shutdown()
@@ -0,0 +1,223 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# 在导入各阶段模块之前准备环境：关闭响应缓存（否则第二轮全是命中）、
+# 按云端模式运行（不改代理）、每个 Key 变量都给一个假值
+os.environ["LLM_CACHE"] = "0"
+os.environ.setdefault("GITHUB_ACTIONS", "1")
+FAKE_KEY_ENVS = ["KEY_FINANCE", "KEY_GLOBAL", "KEY_TECH", "KEY_GENERAL", "GOOGLE_API_KEY"] + \
+                [f"KEY_{i}" for i in range(1, 9)]
+for _env in FAKE_KEY_ENVS:
+    os.environ[_env] = f"fake-{_env.lower()}"
+
+import ai_comments
+import ai_editor
+import archive_manager
+import crawl
+import delta_store
+import rate_limiter
+from fake_genai import FakeBackend, install
+
+# ================= 📏 全流程离线基准测试 =================
+# 把 history/*/data_*.json 逐天回放一遍：
+#   crawl     分类 + 差量 + 写文件 + 聚类（不联网）
+#   editor    load_and_simplify + 假模型 + URL 回填
+#   comments  角色分片并发 + 假模型
+#   archive   归档 + 历史索引 + 前端数据包
+# 每个阶段统计墙钟时间、CPU 时间、API 调用数，再单独重放统计峰值内存(tracemalloc)，
+# 结果可保存为基线 JSON，之后的运行与基线比较，超出容差即视为回归（退出码 1）。
+
+STAGES = ["crawl", "editor", "comments", "archive"]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "pipeline.json")
+TIME_SLACK = 0.05        # 秒；很短的阶段只看相对比例会被噪声误报
+
+
+def load_history_days(history_dir, limit=None):
+    days = []
+    for date in sorted(os.listdir(history_dir)):
+        day_dir = os.path.join(history_dir, date)
+        if not os.path.isdir(day_dir): continue
+        raw_data = []
+        for name in sorted(os.listdir(day_dir)):
+            if name.startswith("data_") and name.endswith(".json"):
+                with open(os.path.join(day_dir, name), "r", encoding="utf-8") as f:
+                    raw_data.extend(json.load(f))
+        if raw_data: days.append((date, raw_data))
+    return days[-limit:] if limit else days
+
+
+def run_archive():
+    archive_manager.init_dirs()
+    archive_manager.archive_daily_data(list(crawl.FILES.values()))
+    archive_manager.update_history_index()
+    archive_manager.build_bundles()
+
+
+def measure(fn, backend):
+    """
+    返回 {wall, cpu, api_calls, rate_limited, errors}；阶段本身的输出被吞掉
+    """
+    before = backend.snapshot()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    after = backend.snapshot()
+    return {
+        "wall": wall, "cpu": cpu,
+        "api_calls": after["calls"] - before["calls"],
+        "rate_limited": after["rate_limited"] - before["rate_limited"],
+        "errors": after["errors"] - before["errors"],
+    }
+
+
+def measure_peak(fn):
+    """
+    tracemalloc 会让纯 Python 的热点慢 10 倍左右，所以峰值内存单独跑一遍，不和计时混在一起
+    """
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def run_bench(days, backend, memory_days=1):
+    """
+    先逐天计时；再把最后 memory_days 天重放一遍，只统计各阶段峰值内存
+    """
+    install(backend)
+    # 各阶段在构造生成配置时才导入 google.genai（约 1 秒）；提前导入，免得算进第一次计时的 editor 里
+    import google.genai.types
+    totals = {stage: {"wall": 0.0, "cpu": 0.0, "peak_kb": 0.0, "api_calls": 0, "rate_limited": 0, "errors": 0}
+              for stage in STAGES}
+    steps = {
+        "crawl": lambda raw: crawl.process_raw_data([dict(p) for p in raw]),
+        "editor": lambda raw: ai_editor.run_editor("parallel"),
+        "comments": lambda raw: ai_comments.run_comments(),
+        "archive": lambda raw: run_archive(),
+    }
+    for date, raw_data in days:
+        for stage in STAGES:
+            result = measure(lambda: steps[stage](raw_data), backend)
+            for field, value in result.items():
+                totals[stage][field] += value
+        print(f"📅 {date}: " + "  ".join(f"{s} {totals[s]['wall']:.2f}s" for s in STAGES))
+
+    for date, raw_data in days[-memory_days:] if memory_days else []:
+        for stage in STAGES:
+            totals[stage]["peak_kb"] = max(totals[stage]["peak_kb"], measure_peak(lambda: steps[stage](raw_data)))
+            if stage == "crawl" and os.path.exists(delta_store.DELTA_FILE):
+                # 同一天重放时差量为空，AI 阶段会直接跳过；删掉差量让它们照常跑完
+                os.remove(delta_store.DELTA_FILE)
+    return {stage: {k: round(v, 4) if isinstance(v, float) else v for k, v in t.items()}
+            for stage, t in totals.items()}
+
+
+def print_table(results):
+    print(f"{'stage':<10}{'wall(s)':>10}{'cpu(s)':>10}{'peak(KB)':>12}{'calls':>8}{'429':>6}{'err':>6}")
+    for stage, r in results.items():
+        print(f"{stage:<10}{r['wall']:>10.3f}{r['cpu']:>10.3f}{r['peak_kb']:>12.1f}"
+              f"{r['api_calls']:>8}{r['rate_limited']:>6}{r['errors']:>6}")
+
+
+def compare(results, baseline, tolerance):
+    """
+    与基线比较，返回回归描述列表。时间和内存按比例容差，调用数在配置相同时必须一致
+    """
+    regressions = []
+    same_config = baseline.get("config") == results["config"]
+    if not same_config:
+        print("⚠️ 基线的压测配置与本次不同，只比较时间和内存。")
+    for stage, r in results["stages"].items():
+        b = baseline.get("stages", {}).get(stage)
+        if not b: continue
+        for field in ("wall", "cpu"):
+            if r[field] > b[field] * (1 + tolerance) + TIME_SLACK:
+                regressions.append(f"{stage}.{field}: {b[field]:.3f}s -> {r[field]:.3f}s")
+        if r["peak_kb"] > b["peak_kb"] * (1 + tolerance):
+            regressions.append(f"{stage}.peak_kb: {b['peak_kb']:.0f} -> {r['peak_kb']:.0f}")
+        if same_config and r["api_calls"] != b["api_calls"]:
+            regressions.append(f"{stage}.api_calls: {b['api_calls']} -> {r['api_calls']}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全流程离线基准测试（假 Gemini 后端）")
+    parser.add_argument("--history", default=os.path.join(ROOT_DIR, "history"))
+    parser.add_argument("--days", type=int, default=None, help="只回放最近 N 天")
+    parser.add_argument("--latency", type=float, default=0.05, help="假模型每次调用的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的比例")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rpm", type=int, default=6000, help="每个 Key 的令牌桶速率，默认放开以免限速淹没耗时")
+    parser.add_argument("--memory-days", type=int, default=1, help="用 tracemalloc 统计峰值内存时重放的天数，0 为不统计")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="把本次结果写成新的基线")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="时间/内存允许超出基线的比例")
+    args = parser.parse_args()
+
+    days = load_history_days(args.history, args.days)
+    if not days:
+        sys.exit(f"❌ {args.history}/ 下没有可回放的 data_*.json")
+
+    rate_limiter.DEFAULT_RPM = args.rpm
+    rate_limiter.DEFAULT_BURST = max(rate_limiter.DEFAULT_BURST, args.rpm // 60)
+    backend = FakeBackend(latency=args.latency, error_rate=args.error_rate,
+                          rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+
+    # 各阶段按相对路径读写文件，整个回放放在临时目录里进行，不碰仓库里的数据
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        start = time.perf_counter()
+        stages = run_bench(days, backend, args.memory_days)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {"days": [d for d, _ in days], "latency": args.latency, "error_rate": args.error_rate,
+                   "rate_limit_rate": args.rate_limit_rate, "seed": args.seed, "rpm": args.rpm,
+                   "memory_days": args.memory_days},
+        "stages": stages,
+        "total_wall": round(elapsed, 3),
+    }
+    print_table(stages)
+    print(f"⏱️ 总耗时 {elapsed:.2f}s，按模型调用数（含内存统计重放）: {backend.by_model}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 基线已保存: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("❌ 相对基线出现回归:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("✅ 未发现回归。")
+    else:
+        print(f"ℹ️ 没有基线文件 {args.baseline}，可加 --save 生成。")
@@ -0,0 +1,169 @@
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+# 与 bench_pipeline.py 相同：导入各阶段前关闭响应缓存、按云端模式运行、给每个 Key 变量一个假值
+os.environ["LLM_CACHE"] = "0"
+os.environ.setdefault("GITHUB_ACTIONS", "1")
+FAKE_KEY_ENVS = ["KEY_FINANCE", "KEY_GLOBAL", "KEY_TECH", "KEY_GENERAL", "GOOGLE_API_KEY"] + \
+                [f"KEY_{i}" for i in range(1, 9)]
+for _env in FAKE_KEY_ENVS:
+    os.environ[_env] = f"fake-{_env.lower()}"
+
+import ai_boardroom
+import ai_comments
+import ai_editor
+import metrics
+import model_router
+import rate_limiter
+import retry_policy
+from fake_genai import FakeBackend, install
+
+# ================= 💥 模型调用故障注入测试 =================
+# 用最近一天的归档数据，在假 Gemini 后端上按不同故障场景把三个 AI 阶段各跑一遍：
+#   quota 429 + Retry-After / transient 5xx / timeout 超时 / malformed 截断的响应 / tail 长尾延迟（触发对冲）
+#   fallback 首选的预览模型整个不可用（model_router 降级到下一档）
+# 每个场景连跑几轮（像回放多天那样在同一进程里积累延迟样本，对冲才有 p95 可用），
+# 统计三个阶段的产出是否完整、模型调用数、重试和对冲次数、预算耗尽次数和墙钟时间。
+# 退避和对冲阈值按假后端的延迟缩小，整套跑完在十几秒内；任一场景产出不完整即退出码 1。
+
+SCENARIOS = {
+    "clean":     {},
+    "quota":     {"rate_limit_rate": 0.3},
+    "transient": {"error_rate": 0.2},
+    "timeout":   {"timeout_rate": 0.15},
+    "malformed": {"malformed_rate": 0.2},
+    "tail":      {"slow_rate": 0.1},
+    "fallback":  {"fail_models": ["gemini-3-flash-preview"]},
+    "mixed":     {"rate_limit_rate": 0.1, "error_rate": 0.05, "timeout_rate": 0.05,
+                  "malformed_rate": 0.05, "slow_rate": 0.05},
+}
+SECTORS = ["finance", "global", "tech", "general"]
+COUNTERS = ["model_retries_total", "model_hedges_total", "model_hedge_wins_total", "model_fallbacks_total",
+            "retry_budget_exhausted_total", "comment_batches_dropped_total"]
+
+
+def latest_history_day(history_dir):
+    for date in sorted(os.listdir(history_dir), reverse=True):
+        day_dir = os.path.join(history_dir, date)
+        if os.path.exists(os.path.join(day_dir, "data_finance.json")): return day_dir
+    return None
+
+
+def drain_counters():
+    """
+    取走全部计数器，按名字汇总（忽略 stage / model / kind 标签）
+    """
+    counters, _ = metrics._drain(None)
+    totals = {}
+    for (name, _labels), value in counters.items():
+        totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def run_stages(now):
+    """
+    按回放方式跑三个阶段（不看差量，整份数据重新处理），返回各阶段产出的完整度
+    """
+    editor = ai_editor.process_sectors(ai_editor.DEFAULT_MODE, now=now)
+    timings = ai_comments.process_sectors(now=now)
+    reports = ai_boardroom.generate_reports(now=now)
+    return {
+        "editor": sum(1 for status, _ in editor.values() if status != "error"),
+        "partial": sum(1 for status, _ in editor.values() if status == "partial"),
+        "comments": sum(t[4] for t in timings),
+        "boardroom": sum(1 for content in reports.values() if content),
+    }
+
+
+def run_scenario(faults, latency, seed, rounds):
+    backend = FakeBackend(latency=latency, jitter=latency / 2, seed=seed, retry_delay=latency * 2, **faults)
+    install(backend)
+    retry_policy.reset()
+    model_router._ROUTER = None   # 路由的模型统计也从零开始，上个场景的失败率不影响这个场景
+    drain_counters()
+    outputs = {}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for field, value in run_stages(datetime.now()).items():
+                outputs[field] = outputs.get(field, 0) + value
+    wall = time.perf_counter() - start
+    counters = drain_counters()
+    return dict(outputs, wall=wall, calls=backend.snapshot()["calls"],
+                **{c: int(counters.get(c, 0)) for c in COUNTERS})
+
+
+def print_table(results, expected):
+    print(f"{'scenario':<10}{'editor':>8}{'comments':>10}{'board':>7}{'calls':>7}"
+          f"{'retry':>7}{'hedge':>7}{'won':>5}{'fallbk':>8}{'budget':>8}{'wall(s)':>9}")
+    for name, r in results.items():
+        editor = f"{r['editor']}/{expected['editor']}" + ("*" if r["partial"] else "")
+        print(f"{name:<10}{editor:>8}{r['comments']:>6}/{expected['comments']:<3}"
+              f"{r['boardroom']:>3}/{expected['boardroom']:<3}{r['calls']:>7}{r['model_retries_total']:>7}"
+              f"{r['model_hedges_total']:>7}{r['model_hedge_wins_total']:>5}{r['model_fallbacks_total']:>8}"
+              f"{r['retry_budget_exhausted_total']:>8}{r['wall']:>9.2f}")
+    print("   editor 列带 * 表示有板块只拿到了流式截断前的部分结果")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模型调用重试策略的故障注入测试（假 Gemini 后端）")
+    parser.add_argument("--history", default=os.path.join(ROOT_DIR, "history"))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔，可选 " + ",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.05, help="假模型每次调用的延迟（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, default=3, help="每个场景连跑的轮数")
+    parser.add_argument("--no-hedge", action="store_true", help="关闭对冲，对比 tail 场景的耗时")
+    args = parser.parse_args()
+
+    day_dir = latest_history_day(args.history)
+    if not day_dir:
+        sys.exit(f"❌ {args.history}/ 下没有可用的 data_*.json")
+    selected = [s for s in args.scenarios.split(",") if s]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown: parser.error(f"未知场景: {', '.join(sorted(unknown))}")
+
+    rate_limiter.DEFAULT_RPM = 6000
+    rate_limiter.DEFAULT_BURST = 100
+    metrics.ENABLED = True
+    # 退避和对冲阈值按假后端的延迟等比例缩小
+    retry_policy.BASE_DELAY = args.latency
+    retry_policy.HEDGE_MIN_DELAY = args.latency * 3
+    retry_policy.HEDGE = not args.no_hedge
+
+    expected = {"editor": len(SECTORS), "comments": len(SECTORS) * len(ai_comments.PERSONAS), "boardroom": len(SECTORS)}
+    expected = {stage: count * args.rounds for stage, count in expected.items()}
+    work_dir = tempfile.mkdtemp(prefix="bench_retry_")
+    cwd = os.getcwd()
+    for sector in SECTORS:
+        src = os.path.join(day_dir, f"data_{sector}.json")
+        if os.path.exists(src): shutil.copy(src, work_dir)
+    os.chdir(work_dir)
+    results = {}
+    try:
+        for name in selected:
+            results[name] = run_scenario(SCENARIOS[name], args.latency, args.seed, args.rounds)
+            print(f"💥 {name}: {results[name]['wall']:.2f}s")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"📂 输入: {day_dir}")
+    print_table(results, expected)
+    incomplete = [name for name, r in results.items()
+                  if any(r[stage] < expected[stage] for stage in expected)]
+    if incomplete:
+        print(f"❌ 产出不完整的场景: {', '.join(incomplete)}")
+        sys.exit(1)
+    print("✅ 所有场景的产出都完整。")
@@ -0,0 +1,125 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# 允许直接 python bench/bench_startup.py 运行
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import delta_store
+
+# ================= 🚀 AI 脚本启动耗时基准 =================
+# 在临时目录里按 pipeline.py 的调用方式跑三个 AI 阶段的“空跑”：没有 Key / 没有输入 / 数据未变化。
+# 每次都是新进程并带 -X importtime，统计墙钟时间、导入耗时，并检查 google.genai 是否被导入。
+# 空跑本应在几十毫秒内结束；SDK 被提前导入时会多出 0.5 秒以上。
+
+SECTORS = ["finance", "global", "tech", "general"]
+STAGES = {
+    "editor": "import ai_editor; ai_editor.run_editor()",
+    "comments": "import ai_comments; ai_comments.run_comments()",
+    "boardroom": "import ai_boardroom; ai_boardroom.run_boardroom(archive=False)",
+}
+FAKE_KEYS = {"GOOGLE_API_KEY": "bench-key", "KEY_1": "bench-key-1"}
+
+
+def parse_importtime(stderr):
+    """
+    返回 {模块名: 累计导入微秒}（顶层导入的累计值已包含其依赖）
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line: continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def run_once(code, cwd, env, module):
+    """
+    跑一次，返回 (墙钟秒数, module 的累计导入微秒, 是否导入了 google.genai, 退出码)
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=cwd, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    modules = parse_importtime(proc.stderr)
+    import_us = modules.get(module, 0)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:])
+    return wall, import_us, "google.genai" in modules, proc.returncode
+
+
+def prepare(scenario, workdir):
+    """
+    no_keys: 有输入没 Key；no_input: 有 Key 没输入；
+    unchanged: 输入和上轮产出都在，差量显示未变化，且各阶段记录的上次成功输入与当前一致
+    """
+    env = {k: v for k, v in os.environ.items() if not k.startswith("KEY_") and k != "GOOGLE_API_KEY"}
+    env.update(PYTHONPATH=ROOT_DIR, GITHUB_ACTIONS="1", METRICS="0", LLM_CACHE_DIR=os.path.join(workdir, ".llm_cache"))
+    if scenario != "no_keys": env.update(FAKE_KEYS)
+    if scenario == "no_input": return env
+
+    history = sorted(glob.glob(os.path.join(ROOT_DIR, "history", "*", "data_finance.json")))
+    source_dir = os.path.dirname(history[-1]) if history else ROOT_DIR
+    for sector in SECTORS:
+        src = os.path.join(source_dir, f"data_{sector}.json")
+        if os.path.exists(src): shutil.copy(src, os.path.join(workdir, f"data_{sector}.json"))
+    if scenario == "unchanged":
+        for sector in SECTORS:
+            for name in (f"analysis_{sector}.json", f"comments_{sector}.json", f"strategy_{sector}.md"):
+                with open(os.path.join(workdir, name), "w", encoding="utf-8") as f:
+                    f.write("{}")
+        with open(os.path.join(workdir, "data_delta.json"), "w", encoding="utf-8") as f:
+            json.dump({"sectors": {s: {"changed": False} for s in SECTORS}}, f)
+        digests = {s: delta_store.input_digest(os.path.join(workdir, f"data_{s}.json")) for s in SECTORS}
+        for stage in STAGES:
+            with open(os.path.join(workdir, delta_store.STAMP_FILE.format(stage=stage)), "w", encoding="utf-8") as f:
+                json.dump(digests, f)
+    return env
+
+
+def run_bench(repeat=3, max_ms=None):
+    sdk = run_once("from google import genai", ROOT_DIR, dict(os.environ), "google.genai")
+    base = run_once("pass", ROOT_DIR, dict(os.environ), "site")
+    print(f"🐍 参考：空解释器墙钟 {base[0] * 1000:.0f} ms")
+    print(f"📦 参考：单独导入 google.genai 墙钟 {sdk[0] * 1000:.0f} ms，导入耗时 {sdk[1] / 1000:.0f} ms")
+    print(f"{'stage':<10} {'scenario':<10} {'wall(ms)':>9} {'import(ms)':>11}  sdk")
+
+    failed = []
+    for stage, code in STAGES.items():
+        for scenario in ("no_keys", "no_input", "unchanged"):
+            walls, imports, sdk_loaded = [], [], False
+            for _ in range(repeat):
+                workdir = tempfile.mkdtemp(prefix="bench_startup_")
+                try:
+                    wall, import_us, loaded, rc = run_once(code, workdir, prepare(scenario, workdir), f"ai_{stage}")
+                finally:
+                    shutil.rmtree(workdir, ignore_errors=True)
+                if rc != 0: failed.append(f"{stage}/{scenario} 退出码 {rc}")
+                walls.append(wall)
+                imports.append(import_us)
+                sdk_loaded = sdk_loaded or loaded
+            wall_ms, import_ms = min(walls) * 1000, min(imports) / 1000
+            print(f"{stage:<10} {scenario:<10} {wall_ms:9.0f} {import_ms:11.0f}  {'⚠️ 已导入' if sdk_loaded else '-'}")
+            if sdk_loaded: failed.append(f"{stage}/{scenario} 空跑导入了 google.genai")
+            if max_ms and wall_ms > max_ms: failed.append(f"{stage}/{scenario} {wall_ms:.0f} ms > {max_ms} ms")
+
+    if failed:
+        print("❌ " + "；".join(failed))
+        return False
+    print("✅ 空跑均未导入 SDK。")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI 脚本空跑的启动耗时")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景运行次数，取最小值")
+    parser.add_argument("--max-ms", type=float, default=None, help="任一空跑墙钟时间超过该值即失败")
+    args = parser.parse_args()
+    sys.exit(0 if run_bench(args.repeat, args.max_ms) else 1)
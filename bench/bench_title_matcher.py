@@ -0,0 +1,113 @@
+import glob
+import json
+import os
+import sys
+import time
+
+# 允许直接 python bench/bench_title_matcher.py 运行
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from ai_editor import load_and_simplify
+from title_matcher import TitleMatcher
+
+# ================= 📏 URL 回填基准测试 =================
+# 用 history/*/data_*.json 构建 url_lookup，对比旧的线性子串扫描和新的索引匹配。
+# 查询集 = 当前 analysis_*.json 中 AI 改写后的标题 + 从原始标题截取的片段(模拟改写)
+
+
+def legacy_match(title, url_lookup):
+    """
+    ai_editor 原先的回填逻辑：线性扫描，拿第一个子串命中的结果
+    """
+    for raw_t, raw_u in url_lookup.items():
+        if title and (title in raw_t or raw_t in title):
+            return raw_u
+    return "#"
+
+
+def build_queries(sector, url_lookup):
+    queries = []
+    analysis_path = os.path.join(ROOT_DIR, f"analysis_{sector}.json")
+    if os.path.exists(analysis_path):
+        with open(analysis_path, "r", encoding="utf-8") as f:
+            queries.extend(i.get("title", "") for i in json.load(f).get("items", []))
+    # 取每隔 20 条原始标题的中间片段，模拟 AI 对标题的轻度改写
+    for i, raw_t in enumerate(url_lookup):
+        if i % 20 == 0 and len(raw_t) > 8:
+            queries.append(raw_t[2:-2])
+    return queries
+
+
+def time_per_item(fn, queries, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in queries:
+            fn(q)
+    return (time.perf_counter() - start) / (repeat * max(len(queries), 1))
+
+
+def run_bench(repeat=3):
+    files = sorted(glob.glob(os.path.join(ROOT_DIR, "history", "*", "data_*.json")))
+    if not files:
+        print("❌ 未找到 history/*/data_*.json")
+        return
+
+    totals = {"files": 0, "queries": 0, "legacy_hits": 0, "indexed_hits": 0,
+              "legacy_us": 0.0, "indexed_us": 0.0, "build_ms": 0.0}
+
+    for path in files:
+        sector = os.path.basename(path)[len("data_"):-len(".json")]
+        _, url_lookup = load_and_simplify(path)
+        if not url_lookup: continue
+        queries = build_queries(sector, url_lookup)
+
+        build_start = time.perf_counter()
+        matcher = TitleMatcher(url_lookup)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        legacy_us = time_per_item(lambda q: legacy_match(q, url_lookup), queries, repeat) * 1e6
+        indexed_us = time_per_item(matcher.match, queries, repeat) * 1e6
+        legacy_hits = sum(1 for q in queries if legacy_match(q, url_lookup) != "#")
+        indexed_hits = sum(1 for q in queries if matcher.match(q)[0])
+
+        rel = os.path.relpath(path, ROOT_DIR)
+        print(f"{rel:<40} titles={len(url_lookup):>5} queries={len(queries):>4} "
+              f"build={build_ms:7.2f}ms legacy={legacy_us:9.1f}us/item indexed={indexed_us:7.1f}us/item "
+              f"hits {legacy_hits}->{indexed_hits}")
+
+        totals["files"] += 1
+        totals["queries"] += len(queries)
+        totals["legacy_hits"] += legacy_hits
+        totals["indexed_hits"] += indexed_hits
+        totals["legacy_us"] += legacy_us * len(queries)
+        totals["indexed_us"] += indexed_us * len(queries)
+        totals["build_ms"] += build_ms
+
+    # 单日数据量只有几百条，再把所有日期合并到 TOTAL_SAFETY_CAP(2000) 的规模看扩展性
+    merged = {}
+    for path in files:
+        _, url_lookup = load_and_simplify(path)
+        for raw_t, raw_u in (url_lookup or {}).items():
+            if len(merged) >= 2000: break
+            merged.setdefault(raw_t, raw_u)
+    queries = []
+    for sector in ("finance", "tech", "global", "general"):
+        queries.extend(build_queries(sector, {}))
+    queries.extend(t[2:-2] for i, t in enumerate(merged) if i % 20 == 0 and len(t) > 8)
+    matcher = TitleMatcher(merged)
+    legacy_us = time_per_item(lambda q: legacy_match(q, merged), queries, repeat) * 1e6
+    indexed_us = time_per_item(matcher.match, queries, repeat) * 1e6
+    print(f"{'merged (cap 2000)':<40} titles={len(merged):>5} queries={len(queries):>4} "
+          f"legacy={legacy_us:9.1f}us/item indexed={indexed_us:7.1f}us/item")
+
+    n = max(totals["queries"], 1)
+    print("-" * 60)
+    print(f"📊 {totals['files']} 个文件 / {totals['queries']} 条查询")
+    print(f"   旧线性扫描: {totals['legacy_us'] / n:9.1f} us/item, 命中 {totals['legacy_hits']}")
+    print(f"   索引匹配:   {totals['indexed_us'] / n:9.1f} us/item, 命中 {totals['indexed_hits']} "
+          f"(建索引合计 {totals['build_ms']:.1f} ms)")
+
+
+if __name__ == "__main__":
+    run_bench()
@@ -0,0 +1,192 @@
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+# ================= 🎭 离线假 Gemini 后端 =================
+# 代替 google.genai.Client，接口只实现脚本用到的 generate_content / generate_content_stream。
+# 可配置延迟、普通错误率、429 比例和流中断比例；按 prompt 类型返回结构合法的假数据：
+#   ai_editor    -> {"summary": ..., "items": [...]}（标题做轻微改写，用来压测 URL 回填）
+#   ai_comments  -> 评论 JSON 数组，条数等于角色数
+#   ai_boardroom -> Markdown 报告（批量 prompt 按板块输出带分隔标记的多份）
+# 故障注入（bench_retry.py 用）：超时、返回截断的坏数据、少量请求拖成长尾、指定模型整个不可用（404）；
+# 429 同时带 Retry-After 头和 retryDelay。
+# 用法：backend = FakeBackend(...); install(backend)
+
+_DATA_LINE_RE = re.compile(r"^\s*(?:\[[^\]]+\]|-)\s*(.+?)(?:\s\(\d+源\))?\s*$")
+_BATCH_SECTION_RE = re.compile(r"^## 板块 ([a-z]+)（.*$", re.MULTILINE)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeAPIError(Exception):
+    """
+    仿 SDK 的 APIError：带 code 和 response.headers
+    """
+    def __init__(self, code, message, headers=None):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.response = SimpleNamespace(status_code=code, headers=headers or {})
+
+
+class FakeBackend:
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_delay=0.2, seed=42, stream_cut_rate=0.0, chunk_chars=200,
+                 timeout_rate=0.0, malformed_rate=0.0, slow_rate=0.0, slow_factor=20.0, fail_models=()):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_delay = retry_delay
+        self.stream_cut_rate = stream_cut_rate   # 流式响应中途断开的比例
+        self.chunk_chars = chunk_chars
+        self.timeout_rate = timeout_rate         # 等满 2 倍延迟后抛超时
+        self.malformed_rate = malformed_rate     # 正常返回，但内容被截掉一大半
+        self.slow_rate = slow_rate               # 延迟乘以 slow_factor 的长尾请求
+        self.slow_factor = slow_factor
+        self.fail_models = set(fail_models)      # 这些模型的请求一律 404（模拟预览模型下线）
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "ok": 0, "errors": 0, "rate_limited": 0, "stream_cut": 0,
+                      "timeouts": 0, "malformed": 0, "slow": 0, "model_down": 0}
+        self.by_model = {}
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def _roll(self, model):
+        with self.lock:
+            self.stats["calls"] += 1
+            self.by_model[model] = self.by_model.get(model, 0) + 1
+            if model in self.fail_models:
+                self.stats["model_down"] += 1
+                return "down", 0.0
+            roll = self.rng.random()
+            delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            outcome = "ok"
+            for name, rate, stat in (("429", self.rate_limit_rate, "rate_limited"), ("error", self.error_rate, "errors"),
+                                     ("timeout", self.timeout_rate, "timeouts"),
+                                     ("malformed", self.malformed_rate, "malformed")):
+                if roll < rate:
+                    outcome = name
+                    self.stats[stat] += 1
+                    break
+                roll -= rate
+            if outcome == "ok": self.stats["ok"] += 1
+            if outcome != "429" and self.rng.random() < self.slow_rate:
+                self.stats["slow"] += 1
+                delay *= self.slow_factor
+        return outcome, delay
+
+    def _rate_limited(self):
+        return FakeAPIError(429, f"RESOURCE_EXHAUSTED. {{'retryDelay': '{self.retry_delay}s'}}",
+                            {"Retry-After": str(self.retry_delay)})
+
+    def _text(self, outcome, prompt):
+        text = fake_text(prompt)
+        return text[:len(text) // 3] if outcome == "malformed" else text
+
+    def _model_down(self, model):
+        return FakeAPIError(404, f"NOT_FOUND. models/{model} is not found for API version v1beta.")
+
+    def generate(self, model, prompt):
+        outcome, delay = self._roll(model)
+        if outcome == "down": raise self._model_down(model)
+        if outcome == "timeout":
+            time.sleep(delay * 2)
+            raise TimeoutError("The read operation timed out")
+        time.sleep(delay)
+        if outcome == "429": raise self._rate_limited()
+        if outcome == "error":
+            raise FakeAPIError(500, "INTERNAL. An internal error has occurred.")
+        return FakeResponse(self._text(outcome, prompt))
+
+    def generate_stream(self, model, prompt):
+        """
+        把同一份假数据切成小块逐块返回，延迟按块均摊（模拟逐 token 生成）；
+        按 stream_cut_rate 在中途抛出连接错误
+        """
+        outcome, delay = self._roll(model)
+        if outcome == "down": raise self._model_down(model)
+        if outcome == "429":
+            time.sleep(delay * 0.1)
+            raise self._rate_limited()
+        if outcome == "timeout":
+            time.sleep(delay * 2)
+            raise TimeoutError("The read operation timed out")
+        text = self._text(outcome, prompt)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)] or [""]
+        with self.lock:
+            cut_at = int(len(chunks) * self.rng.uniform(0.3, 0.9)) if self.rng.random() < self.stream_cut_rate else None
+            if cut_at is not None: self.stats["stream_cut"] += 1
+        if outcome == "error": cut_at = 0
+        for i, chunk in enumerate(chunks):
+            if i == cut_at:
+                raise FakeAPIError(503, "UNAVAILABLE. Connection reset while streaming.")
+            time.sleep(delay / len(chunks))
+            yield FakeResponse(chunk)
+
+
+def _data_titles(prompt):
+    titles = []
+    for line in prompt.splitlines():
+        m = _DATA_LINE_RE.match(line)
+        if m and len(m.group(1)) > 4: titles.append(m.group(1))
+    return titles
+
+
+def fake_text(prompt):
+    if "输出 JSON 数组格式" in prompt:
+        roles = prompt.split("【待模拟角色列表】：", 1)[1].strip().splitlines()[0].split(", ")
+        return json.dumps([{"role": r, "name": f"网友{i}", "content": "离线假评论。", "emotion": "平静"}
+                           for i, r in enumerate(roles)], ensure_ascii=False)
+    if '"items"' in prompt:
+        # 去掉末尾一个字符，模拟模型改写标题
+        items = [{"title": t[:-1], "summary": "离线假摘要。", "sentiment": "Mixed", "impact": "-",
+                  "prediction": "-", "special_note": "无"} for t in _data_titles(prompt)[:18]]
+        return json.dumps({"summary": "离线假综述。", "economy_summary": "离线假综述。", "items": items},
+                          ensure_ascii=False)
+    sections = _BATCH_SECTION_RE.split(prompt)
+    if len(sections) > 1:
+        # ai_boardroom 批量模式：按板块输出带分隔标记的多份报告
+        return "\n\n".join(f"=== SECTOR: {key} ===\n" + _fake_report(body)
+                             for key, body in zip(sections[1::2], sections[2::2]))
+    return _fake_report(prompt)
+
+
+def _fake_report(prompt):
+    return "## 离线假报告\n\n" + "\n".join(f"- {t}" for t in _data_titles(prompt)[:10])
+
+
+class _FakeModels:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def generate_content(self, model, contents, config=None):
+        return self.backend.generate(model, contents)
+
+    def generate_content_stream(self, model, contents, config=None):
+        return self.backend.generate_stream(model, contents)
+
+
+class FakeClient:
+    def __init__(self, backend, api_key=None, http_options=None):
+        self.api_key = api_key
+        self.models = _FakeModels(backend)
+
+
+def install(backend):
+    """
+    让 key_pool 创建的所有客户端都指向 backend，并丢弃已有的 Key 池单例
+    """
+    import key_pool
+    key_pool.genai = SimpleNamespace(
+        Client=lambda api_key=None, http_options=None: FakeClient(backend, api_key, http_options)
+    )
+    key_pool._POOL = None
@@ -0,0 +1,106 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ================= 🧪 newsnow 接口本地桩服务器 =================
+# 用 history/<date>/data_*.json 回放 /api/s/entire 的响应，
+# 每个源按配置注入延迟/长尾/失败，用来离线压测 crawl.py 的抓取模式。
+# 单独运行: python bench/stub_newsnow.py --port 8765
+# 然后:     NEWSNOW_API=http://127.0.0.1:8765 python crawl.py
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_LATENCY = 0.05     # 每个源的基础处理耗时(秒)，一次请求按源数量累加
+DEFAULT_SLOW_SOURCES = {"douban": 3.0, "producthunt": 2.0}   # 慢源额外耗时
+DEFAULT_FAIL_RATE = 0.0    # 每次请求整体失败(返回 502)的概率
+
+
+def load_day(date=None):
+    """
+    读取某天的归档数据，返回 {源 id: 平台对象}；不指定日期时取最新一天
+    """
+    day_dirs = sorted(glob.glob(os.path.join(ROOT_DIR, "history", "*")))
+    if not day_dirs: return {}
+    day_dir = os.path.join(ROOT_DIR, "history", date) if date else day_dirs[-1]
+    platforms = {}
+    for path in glob.glob(os.path.join(day_dir, "data_*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            for platform in json.load(f):
+                platforms[platform.get("id")] = platform
+    return platforms
+
+
+def make_handler(platforms, latency, slow_sources, fail_rate):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("content-length", 0))
+            try:
+                sources = json.loads(self.rfile.read(length) or b"{}").get("sources", [])
+            except ValueError:
+                sources = []
+
+            # 上游聚合接口按源串行处理，慢源会拖住整个请求
+            delay = len(sources) * latency + sum(slow_sources.get(s, 0) for s in sources)
+            time.sleep(delay)
+
+            if random.random() < fail_rate:
+                self.send_response(502)
+                self.end_headers()
+                return
+
+            body = json.dumps(
+                [platforms.get(s, {"id": s, "items": []}) for s in sources], ensure_ascii=False
+            ).encode("utf-8")
+            # 支持条件请求：内容没变时返回 304（crawl_daemon.py 会带 If-None-Match）
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("ETag", etag)
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(port=0, date=None, latency=DEFAULT_LATENCY, slow_sources=None, fail_rate=DEFAULT_FAIL_RATE):
+    """
+    在后台线程启动桩服务器，返回 (server, base_url)；用完调用 server.shutdown()
+    """
+    slow_sources = DEFAULT_SLOW_SOURCES if slow_sources is None else slow_sources
+    handler = make_handler(load_day(date), latency, slow_sources, fail_rate)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="newsnow 接口本地桩服务器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--date", default=None, help="回放 history/<date>，默认最新一天")
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY)
+    parser.add_argument("--fail-rate", type=float, default=DEFAULT_FAIL_RATE)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(args.port, args.date, args.latency, fail_rate=args.fail_rate)
+    print(f"🧪 桩服务器已启动: {base_url}/api/s/entire (Ctrl+C 退出)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
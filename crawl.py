@@ -2,8 +2,14 @@ import requests
 import json
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+import atomic_io
+import delta_store
+import metrics
+import news_cluster
+
 # ================= 配置区域 =================
 # 抓取间隔 (2小时)
 INTERVAL = 7200 
@@ -49,86 +55,246 @@ ALL_SOURCES = []
 for ids in CATEGORY_MAP.values():
     ALL_SOURCES.extend(ids)
 
+# ================= 分片抓取配置 =================
+# 接口地址可通过环境变量指向本地桩服务器（bench/stub_newsnow.py）做离线压测
+API_BASE = os.environ.get("NEWSNOW_API", "https://newsnow.busiyi.world")
+API_URL = f"{API_BASE}/api/s/entire"
+
+HEADERS = {
+    "content-type": "application/json",
+    "origin": "https://newsnow.busiyi.world",
+    "referer": "https://newsnow.busiyi.world/c/hottest",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36 Edg/143.0.0.0"
+}
+
+# sharded = 把 ALL_SOURCES 切片并发请求；single = 旧的一次性大请求
+FETCH_MODE = os.environ.get("CRAWL_MODE", "sharded")
+SHARD_SIZE = int(os.environ.get("CRAWL_SHARD_SIZE", 6))
+SHARD_TIMEOUT = 15   # 单个分片的超时(秒)
+SHARD_RETRIES = 2    # 单个分片失败后的重试次数
+MAX_WORKERS = 8
+
 # ===========================================
 
 def get_current_time():
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-def run_spider():
-    print(f"[{get_current_time()}] 🚀 开始新一轮抓取...")
-    
-    url = "https://newsnow.busiyi.world/api/s/entire"
-    
-    headers = {
-        "content-type": "application/json",
-        "origin": "https://newsnow.busiyi.world",
-        "referer": "https://newsnow.busiyi.world/c/hottest",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36 Edg/143.0.0.0"
+def split_shards(sources, size):
+    return [sources[i:i + size] for i in range(0, len(sources), size)]
+
+def create_session(pool_size=MAX_WORKERS):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+def fetch_shard(session, shard, timeout=None, retries=None, validators=None):
+    """
+    请求一个分片，失败按 1s/2s... 退避重试，最终失败抛出最后一次的异常。
+    传入 validators（{"etag", "last_modified"}）时发条件请求：上游返回 304 时结果为 None，
+    返回 200 时就地更新为新的校验值
+    """
+    timeout = SHARD_TIMEOUT if timeout is None else timeout
+    retries = SHARD_RETRIES if retries is None else retries
+    headers = {}
+    if validators:
+        if validators.get("etag"): headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"): headers["If-Modified-Since"] = validators["last_modified"]
+    last_error = None
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            response = session.post(API_URL, json={"sources": shard}, timeout=timeout, headers=headers or None)
+            metrics.observe("crawl_fetch_seconds", time.perf_counter() - start, "crawl", mode="sharded")
+            metrics.observe("crawl_response_bytes", len(response.content), "crawl", mode="sharded")
+            if response.status_code == 304:
+                metrics.inc("crawl_not_modified_total", stage="crawl")
+                return None
+            if response.status_code == 200:
+                if validators is not None:
+                    validators["etag"] = response.headers.get("ETag")
+                    validators["last_modified"] = response.headers.get("Last-Modified")
+                return response.json()
+            last_error = RuntimeError(f"HTTP {response.status_code}")
+        except (requests.RequestException, ValueError) as e:
+            last_error = e
+        metrics.inc("crawl_fetch_errors_total", stage="crawl", error=type(last_error).__name__)
+        if attempt < retries:
+            metrics.inc("crawl_fetch_retries_total", stage="crawl")
+            time.sleep(2 ** attempt)
+    raise last_error
+
+def fetch_sharded(sources=None, shard_size=SHARD_SIZE, session=None):
+    """
+    并发抓取所有分片，返回 (按 sources 顺序合并的平台列表, 失败的源 id 列表)
+    """
+    sources = ALL_SOURCES if sources is None else sources
+    shards = split_shards(sources, shard_size)
+    session = session or create_session()
+    raw_data, failed = [], []
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(shards))) as pool:
+        futures = {pool.submit(fetch_shard, session, shard): shard for shard in shards}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                raw_data.extend(future.result())
+            except Exception as e:
+                print(f"⚠️ 分片 {shard[0]}... ({len(shard)} 个源) 抓取失败: {e}")
+                failed.extend(shard)
+
+    return sort_by_source(raw_data, sources), failed
+
+def sort_by_source(raw_data, sources=None):
+    """
+    按 sources 的顺序排列平台（不在列表里的排到最后），输出文件的顺序不受分片完成先后影响
+    """
+    order = {site_id: i for i, site_id in enumerate(ALL_SOURCES if sources is None else sources)}
+    raw_data.sort(key=lambda p: order.get(p.get('id'), len(order)))
+    return raw_data
+
+def fetch_single(sources=None):
+    """
+    旧模式：所有源一次性请求，任何失败都会丢掉全部分类
+    """
+    sources = ALL_SOURCES if sources is None else sources
+    with metrics.timer("crawl_fetch_seconds", "crawl", mode="single"):
+        response = requests.post(API_URL, headers=HEADERS, json={"sources": sources}, timeout=30)
+    metrics.observe("crawl_response_bytes", len(response.content), "crawl", mode="single")
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}")
+    return response.json(), []
+
+def load_previous_platforms():
+    """
+    读取上一轮快照，按源 id 索引，用于补齐失败分片
+    """
+    previous = {}
+    for filename in FILES.values():
+        if not os.path.exists(filename): continue
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                for platform in json.load(f):
+                    previous[platform.get('id')] = platform
+        except (OSError, ValueError):
+            continue
+    return previous
+
+def categorize(raw_data):
+    # 初始化 4 个空列表，用来装不同分类的数据
+    categorized_data = {
+        "finance": [],
+        "tech": [],
+        "global": [],
+        "general": []
     }
 
-    payload = { "sources": ALL_SOURCES }
+    # 遍历原始数据，进行分拣
+    for platform in raw_data:
+        site_id = platform.get('id')
+        items = platform.get('items', [])
+        
+        if not items: continue
 
-    try:
-        print("⏳ 正在请求数据...")
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        # 【极简处理】只保留 title 和 url
+        clean_items = []
+        for item in items:
+            clean_items.append({
+                "title": item.get('title', '').strip(),
+                "url": item.get('url', '')
+            })
+
+        # 构建精简后的平台对象
+        clean_platform = {
+            "id": site_id,
+            "items": clean_items
+        }
+
+        # 判断这个平台属于哪个分类，扔进对应的列表
+        found_category = False
+        for cat_name, ids_list in CATEGORY_MAP.items():
+            if site_id in ids_list:
+                categorized_data[cat_name].append(clean_platform)
+                found_category = True
+                break
         
-        if response.status_code == 200:
-            raw_data = response.json()
-            print(f"📦 成功收到数据，开始分类处理...")
-
-            # 初始化 4 个空列表，用来装不同分类的数据
-            categorized_data = {
-                "finance": [],
-                "tech": [],
-                "global": [],
-                "general": []
-            }
-
-            # 遍历原始数据，进行分拣
-            for platform in raw_data:
-                site_id = platform.get('id')
-                items = platform.get('items', [])
-                
-                if not items: continue
-
-                # 【极简处理】只保留 title 和 url
-                clean_items = []
-                for item in items:
-                    clean_items.append({
-                        "title": item.get('title', '').strip(),
-                        "url": item.get('url', '')
-                    })
-
-                # 构建精简后的平台对象
-                clean_platform = {
-                    "id": site_id,
-                    "items": clean_items
-                }
-
-                # 判断这个平台属于哪个分类，扔进对应的列表
-                found_category = False
-                for cat_name, ids_list in CATEGORY_MAP.items():
-                    if site_id in ids_list:
-                        categorized_data[cat_name].append(clean_platform)
-                        found_category = True
-                        break
-                
-                # 如果没在字典里定义的，默认扔进 general
-                if not found_category:
-                    categorized_data["general"].append(clean_platform)
-
-            # 写入 4 个独立文件
-            for cat_name, data_list in categorized_data.items():
-                filename = FILES[cat_name]
-                with open(filename, "w", encoding="utf-8") as f:
-                    json.dump(data_list, f, ensure_ascii=False, indent=2) # indent=2 为了让你打开看时更清晰
-                print(f"✅ 已生成: {filename} (包含 {len(data_list)} 个平台)")
+        # 如果没在字典里定义的，默认扔进 general
+        if not found_category:
+            categorized_data["general"].append(clean_platform)
+
+    return categorized_data
+
+def process_raw_data(raw_data):
+    """
+    抓取之后的全部本地处理：分类 -> 差量 -> 写文件 -> 聚类（bench/bench_pipeline.py 直接复用）
+    """
+    categorized_data = categorize(raw_data)
+
+    # 先和指纹库/旧快照比对出差量（必须在覆盖旧文件之前）
+    fingerprints = delta_store.load_fingerprints()
+    delta = delta_store.build_delta(categorized_data, FILES, fingerprints)
+
+    # 写入 4 个独立文件
+    for cat_name, data_list in categorized_data.items():
+        filename = FILES[cat_name]
+        atomic_io.write_json(filename, data_list, stage="crawl") # 默认 indent=2 为了让你打开看时更清晰
+        metrics.inc("crawl_items_total", sum(len(p['items']) for p in data_list), stage="crawl", sector=cat_name)
+        print(f"✅ 已生成: {filename} (包含 {len(data_list)} 个平台)")
 
+    delta_store.save_delta(delta)
+    delta_store.save_fingerprints(fingerprints)
+
+    # 跨源近似重复聚类，供下游去重和“多源热度”使用
+    start = time.perf_counter()
+    with metrics.timer("cluster_seconds", "crawl"):
+        clusters = news_cluster.save_clusters(news_cluster.cluster_sectors(categorized_data))
+    for cat_name, info in clusters["sectors"].items():
+        print(f"🧩 {cat_name}: {info['items']} 条 -> {info['clusters']} 个簇（合并 {len(info['merged'])} 簇）")
+    print(f"🧩 聚类耗时 {time.perf_counter() - start:.2f}s，已写入 {news_cluster.CLUSTER_FILE}")
+    for cat_name, sector_delta in delta["sectors"].items():
+        print(f"🧬 {cat_name}: 新增 {sector_delta['added']} 条, 移除 {sector_delta['removed']} 条")
+    if not delta["changed"]:
+        print("💤 本轮没有任何新条目，下游 AI 阶段将跳过。")
+
+def run_spider(mode=FETCH_MODE):
+    """
+    抓取并处理一轮，返回是否成功（全部分片失败或处理出错时为 False，根目录保留上一轮数据）
+    """
+    print(f"[{get_current_time()}] 🚀 开始新一轮抓取...")
+
+    try:
+        print(f"⏳ 正在请求数据 ({mode})...")
+        start = time.perf_counter()
+        if mode == "single":
+            raw_data, failed = fetch_single()
         else:
-            print(f"❌ 请求失败: {response.status_code}")
+            raw_data, failed = fetch_sharded()
+        print(f"📦 收到 {len(raw_data)} 个平台，耗时 {time.perf_counter() - start:.1f}s，开始分类处理...")
+
+        if not raw_data:
+            print("❌ 所有分片均抓取失败，保留上一轮数据。")
+            metrics.inc("stage_errors_total", stage="crawl")
+            return False
+
+        # 失败分片沿用上一轮快照，避免整个分类被清空
+        if failed:
+            previous = load_previous_platforms()
+            kept = [previous[site_id] for site_id in failed if site_id in previous]
+            raw_data = sort_by_source(raw_data + kept)
+            print(f"♻️ {len(failed)} 个源抓取失败，其中 {len(kept)} 个沿用上一轮数据。")
+            metrics.inc("crawl_failed_sources_total", len(failed), stage="crawl")
+
+        process_raw_data(raw_data)
+        return True
 
     except Exception as e:
         print(f"❌ 发生错误: {e}")
+        metrics.inc("stage_errors_total", stage="crawl")
+        return False
+    finally:
+        metrics.flush("crawl")
 
 # ================= 主程序 =================
 if __name__ == "__main__":
@@ -140,6 +306,10 @@ if __name__ == "__main__":
     if os.environ.get("GITHUB_ACTIONS"):
         run_spider()
         print("⚡ GitHub Action 环境：单次运行结束。")
+    elif os.environ.get("CRAWL_DAEMON", "1") == "1":
+        # 本地常驻：按源自适应轮询（见 crawl_daemon.py），CRAWL_DAEMON=0 回到固定间隔全量抓取
+        import crawl_daemon
+        crawl_daemon.run_daemon()
     else:
         while True:
             run_spider()
@@ -0,0 +1,284 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import atomic_io
+import crawl
+import metrics
+
+# ================= 🛰️ 常驻抓取：按源自适应轮询 =================
+# 本地运行 crawl.py 时不再每 2 小时全量抓一次，而是每个源有自己的轮询间隔：
+#   - 每次轮询记录“内容是否变化”，用指数滑动平均估计变化概率 p，
+#     再换算成变化速率 λ = -ln(1-p) / 间隔；
+#   - 在总请求预算不变的前提下（默认等于旧模式：每 INTERVAL 秒每个源一次），
+#     按 √λ 分配轮询频率（快讯类源更勤，豆瓣、producthunt 这类慢源更疏），并限制在 [MIN, MAX] 之间；
+#   - 同一批到期的源合并成分片请求，分片带 ETag / Last-Modified 做条件请求，304 视为没有变化；
+#   - 有源变化时用各源最新数据拼出完整快照，交给 crawl.process_raw_data 原子写出；
+#   - 学到的间隔和校验值存入 DAEMON_STATE_FILE，重启后继续沿用；
+#   - 127.0.0.1:DAEMON_PORT/status 返回各源的间隔、最近变化时间等状态（JSON）。
+
+DAEMON_STATE_FILE = os.environ.get("DAEMON_STATE_FILE", "crawl_daemon_state.json")
+DAEMON_PORT = int(os.environ.get("DAEMON_PORT", 8787))      # 0 = 不开状态接口
+TICK = int(os.environ.get("DAEMON_TICK", 30))                # 调度循环的检查间隔(秒)
+MIN_INTERVAL = int(os.environ.get("DAEMON_MIN_INTERVAL", 300))
+MAX_INTERVAL = int(os.environ.get("DAEMON_MAX_INTERVAL", 6 * 3600))
+# 每小时允许的“源次”请求量，默认与旧的固定间隔全量抓取相同
+BUDGET_PER_HOUR = float(os.environ.get("DAEMON_BUDGET", len(crawl.ALL_SOURCES) * 3600 / crawl.INTERVAL))
+EWMA_ALPHA = 0.3         # 变化概率的平滑系数，越大越快跟上源的节奏变化
+INITIAL_CHANGE_P = 0.5   # 新源的先验变化概率
+MAX_VALIDATORS = 256     # 分片组合会变，只保留最近用过的条件请求校验值
+
+
+def platform_hash(platform):
+    titles = "\n".join(item.get("title", "").strip() for item in platform.get("items", []))
+    return hashlib.sha1(titles.encode("utf-8")).hexdigest()[:16]
+
+
+def change_rate(state):
+    """
+    由平滑后的变化概率和当前间隔估算每秒变化次数
+    """
+    p = min(max(state["change_p"], 0.02), 0.98)
+    return -math.log(1 - p) / state["interval"]
+
+
+def allocate_intervals(states, budget_per_hour, min_interval=None, max_interval=None):
+    """
+    预算固定时按 √λ 分配轮询频率：频率_i = B * √λ_i / Σ√λ，再夹到 [min, max]；
+    被夹住的源按夹后的频率计入预算，剩余预算在其余源之间重新分配，直到没有新的源被夹住
+    """
+    min_interval = MIN_INTERVAL if min_interval is None else min_interval
+    max_interval = MAX_INTERVAL if max_interval is None else max_interval
+    weights = {site_id: math.sqrt(change_rate(s)) for site_id, s in states.items()}
+    budget = budget_per_hour / 3600
+    fixed, proposed = {}, {}
+    for _ in range(len(weights)):
+        free = [k for k in weights if k not in fixed]
+        left = budget - sum(1 / i for i in fixed.values())
+        total = sum(weights[k] for k in free)
+        proposed = {k: total / (weights[k] * left) if left > 0 else max_interval for k in free}
+        clipped = {k: min(max(v, min_interval), max_interval) for k, v in proposed.items()
+                   if v < min_interval or v > max_interval}
+        if not clipped: break
+        fixed.update(clipped)
+        proposed = {k: v for k, v in proposed.items() if k not in clipped}
+    for site_id, state in states.items():
+        state["interval"] = fixed.get(site_id) or proposed[site_id]
+
+
+class CrawlDaemon:
+    def __init__(self, sources=None, budget_per_hour=None, clock=time.time, session=None):
+        self.sources = list(crawl.ALL_SOURCES if sources is None else sources)
+        self.budget = BUDGET_PER_HOUR if budget_per_hour is None else budget_per_hour
+        self.clock = clock
+        self.session = session or crawl.create_session()
+        self.lock = threading.Lock()
+        self.platforms = {}        # 源 id -> 最新平台对象
+        self.validators = {}       # 分片 key -> {"etag", "last_modified"}
+        self.started = clock()
+        self.counters = {"ticks": 0, "requests": 0, "source_polls": 0, "not_modified": 0,
+                         "failed": 0, "changes": 0, "snapshots": 0}
+        self.states = {}
+        self._load_state()
+
+    # ---------- 状态持久化 ----------
+    def _new_state(self, now):
+        return {"interval": crawl.INTERVAL, "change_p": INITIAL_CHANGE_P, "next_due": now,
+                "last_poll": None, "last_change": None, "hash": None, "polls": 0, "changes": 0}
+
+    def _load_state(self):
+        now = self.clock()
+        saved = {}
+        if os.path.exists(DAEMON_STATE_FILE):
+            try:
+                with open(DAEMON_STATE_FILE, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+            except (OSError, ValueError):
+                saved = {}
+        for site_id in self.sources:
+            state = self._new_state(now)
+            state.update(saved.get("sources", {}).get(site_id, {}))
+            # 重启后上一轮的到期时间不再可信，已过期的立即轮询
+            state["next_due"] = min(state["next_due"], now + state["interval"])
+            self.states[site_id] = state
+        self.validators = saved.get("validators", {})
+        # 上一轮快照作为起点，没轮询到的源先沿用它；首次轮询和快照相同不算变化
+        self.platforms = crawl.load_previous_platforms()
+        for site_id, state in self.states.items():
+            if state["hash"] is None and site_id in self.platforms:
+                state["hash"] = platform_hash(self.platforms[site_id])
+
+    def save_state(self):
+        atomic_io.write_json(DAEMON_STATE_FILE, {"sources": self.states, "validators": self.validators,
+                                                 "saved": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, compact=True)
+
+    # ---------- 调度 ----------
+    def due_sources(self, now):
+        return [s for s in self.sources if self.states[s]["next_due"] <= now]
+
+    def _fetch(self, shard):
+        key = ",".join(shard)
+        with self.lock:
+            validators = self.validators.pop(key, {})
+            self.validators[key] = validators           # 移到末尾，按最近使用淘汰
+            while len(self.validators) > MAX_VALIDATORS:
+                del self.validators[next(iter(self.validators))]
+        try:
+            return shard, crawl.fetch_shard(self.session, shard, validators=validators), None
+        except Exception as e:
+            return shard, None, e
+
+    def poll(self, sources):
+        """
+        轮询一批源，返回内容有变化的源 id 列表
+        """
+        now = self.clock()
+        shards = crawl.split_shards(sources, crawl.SHARD_SIZE)
+        changed = []
+        with ThreadPoolExecutor(max_workers=min(crawl.MAX_WORKERS, len(shards))) as pool:
+            results = list(pool.map(self._fetch, shards))
+
+        with self.lock:
+            for shard, data, error in results:
+                self.counters["requests"] += 1
+                self.counters["source_polls"] += len(shard)
+                metrics.inc("crawl_daemon_polls_total", len(shard), stage="crawl")
+                if error is not None:
+                    self.counters["failed"] += len(shard)
+                    print(f"⚠️ 分片 {shard[0]}... ({len(shard)} 个源) 抓取失败: {error}")
+                    for site_id in shard:
+                        # 失败不更新变化估计，稍后按当前间隔的一半重试
+                        self.states[site_id]["next_due"] = now + max(MIN_INTERVAL, self.states[site_id]["interval"] / 2)
+                    continue
+                if data is None:
+                    self.counters["not_modified"] += len(shard)
+                fresh = {p.get("id"): p for p in data or []}
+                for site_id in shard:
+                    state = self.states[site_id]
+                    platform = fresh.get(site_id)
+                    new_hash = platform_hash(platform) if platform and platform.get("items") else state["hash"]
+                    is_changed = new_hash != state["hash"]
+                    if platform and platform.get("items"):
+                        self.platforms[site_id] = platform
+                    state["change_p"] = (1 - EWMA_ALPHA) * state["change_p"] + EWMA_ALPHA * (1.0 if is_changed else 0.0)
+                    state["hash"] = new_hash
+                    state["last_poll"] = now
+                    state["polls"] += 1
+                    if is_changed:
+                        state["last_change"] = now
+                        state["changes"] += 1
+                        changed.append(site_id)
+
+            allocate_intervals(self.states, self.budget)
+            for site_id in sources:
+                state = self.states[site_id]
+                if state["last_poll"] == now:
+                    state["next_due"] = now + state["interval"]
+            self.counters["changes"] += len(changed)
+        return changed
+
+    def write_snapshot(self):
+        """
+        用各源最新数据拼出完整快照，走与单次抓取相同的处理流程（分类、差量、聚类、原子写文件）
+        """
+        with self.lock:
+            raw_data = [self.platforms[s] for s in self.sources if s in self.platforms]
+            raw_data += [p for s, p in self.platforms.items() if s not in self.states]
+        if not raw_data: return
+        crawl.process_raw_data([dict(p) for p in raw_data])
+        self.counters["snapshots"] += 1
+
+    def tick(self):
+        """
+        调度一次：轮询到期的源，有变化就写新快照；返回变化的源
+        """
+        self.counters["ticks"] += 1
+        due = self.due_sources(self.clock())
+        if not due: return []
+        print(f"[{crawl.get_current_time()}] 🛰️ 轮询 {len(due)} 个到期源: {', '.join(due[:6])}{' ...' if len(due) > 6 else ''}")
+        changed = self.poll(due)
+        if changed:
+            print(f"🔔 {len(changed)} 个源有更新: {', '.join(changed)}")
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                print(f"❌ 写快照失败: {e}")
+                metrics.inc("stage_errors_total", stage="crawl")
+        self.save_state()
+        metrics.flush("crawl")
+        return changed
+
+    def status(self):
+        now = self.clock()
+        with self.lock:
+            sources = {
+                site_id: {
+                    "interval": round(s["interval"]),
+                    "change_p": round(s["change_p"], 3),
+                    "next_in": round(s["next_due"] - now),
+                    "last_poll_ago": None if s["last_poll"] is None else round(now - s["last_poll"]),
+                    "last_change_ago": None if s["last_change"] is None else round(now - s["last_change"]),
+                    "polls": s["polls"], "changes": s["changes"],
+                }
+                for site_id, s in self.states.items()
+            }
+            planned = sum(3600 / s["interval"] for s in self.states.values())
+            return {"uptime": round(now - self.started), "budget_per_hour": round(self.budget, 1),
+                    "planned_per_hour": round(planned, 1), "counters": dict(self.counters), "sources": sources}
+
+
+# ================= 🩺 本地状态接口 =================
+def start_status_server(daemon, port=DAEMON_PORT):
+    """
+    在后台线程提供 GET /status（仅监听 127.0.0.1），返回 server；port=0 时随机端口
+    """
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/status"):
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = json.dumps(daemon.status(), ensure_ascii=False, indent=2).encode("utf-8")
+            self.send_response(200)
+            self.send_header("content-type", "application/json; charset=utf-8")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StatusHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_daemon(port=DAEMON_PORT, tick=TICK, budget_per_hour=None):
+    daemon = CrawlDaemon(budget_per_hour=budget_per_hour)
+    if port:
+        server = start_status_server(daemon, port)
+        print(f"🩺 状态接口: http://127.0.0.1:{server.server_address[1]}/status")
+    print(f"🛰️ 常驻抓取已启动：{len(daemon.sources)} 个源，预算 {daemon.budget:.1f} 源次/小时。")
+    while True:
+        try:
+            daemon.tick()
+        except Exception as e:
+            print(f"❌ 调度出错: {e}")
+        time.sleep(tick)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="常驻抓取：按源自适应轮询")
+    parser.add_argument("--port", type=int, default=DAEMON_PORT, help="状态接口端口，0 为不开启")
+    parser.add_argument("--tick", type=int, default=TICK, help="调度检查间隔(秒)")
+    parser.add_argument("--budget", type=float, default=None, help="每小时的源次请求预算")
+    args = parser.parse_args()
+    run_daemon(args.port, args.tick, args.budget)
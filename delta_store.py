@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import atomic_io
+
+# ================= 🧬 增量抓取：条目指纹与差量文件 =================
+# crawl.py 每轮抓取后：
+#   1. 用指纹库(每个源 id 下的条目哈希 -> 最后出现时间)判断哪些条目是新出现的
+#   2. 和上一轮的 data_*.json 比对，得出本轮被挤掉的条目
+#   3. 输出 data_delta.json，下游 AI 阶段据此跳过没变化的板块，或只喂新条目
+
+FINGERPRINT_FILE = "crawl_fingerprints.json"
+DELTA_FILE = "data_delta.json"
+
+# 指纹保留时长：超过这个时间没再出现的条目会被遗忘，再次出现时算作新条目
+FINGERPRINT_TTL = 3 * 24 * 3600
+
+# 下游是否只把新增条目喂给模型（默认仍用全量快照，只做“无变化跳过”）
+FRESH_ONLY = os.environ.get("DELTA_FRESH_ONLY", "0") == "1"
+
+# 各 AI 阶段每个板块最近一次成功生成时所用输入文件的哈希。
+# 差量说“没变化”只代表和上一轮抓取相同；上一轮生成失败时输出还是更早的，必须对上这里的记录才能跳过
+STAMP_FILE = "inputs_{stage}.json"
+_stamp_lock = threading.Lock()
+
+
+def item_fingerprint(item):
+    """
+    条目指纹只看标题：同一条新闻的 URL 经常带不同的追踪参数
+    """
+    title = (item.get('title') or '').strip()
+    return hashlib.sha1(title.encode("utf-8")).hexdigest()[:16]
+
+
+def load_fingerprints(path=FINGERPRINT_FILE):
+    if not os.path.exists(path): return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_fingerprints(fingerprints, path=FINGERPRINT_FILE):
+    atomic_io.write_json(path, fingerprints, compact=True)
+
+
+def _load_snapshot(filepath):
+    if not os.path.exists(filepath): return []
+    try:
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def build_delta(categorized_data, files, fingerprints, now=None):
+    """
+    对比新抓取结果与指纹库/旧快照，返回差量字典，并就地更新指纹库。
+    必须在覆盖 data_*.json 之前调用（要读取旧快照来计算 removed）。
+    """
+    now = int(now or time.time())
+    delta = {
+        "generated": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+        "changed": False,
+        "sectors": {}
+    }
+
+    for cat_name, platforms in categorized_data.items():
+        old_platforms = {p.get('id'): p.get('items', []) for p in _load_snapshot(files[cat_name])}
+        sector_delta = {"changed": False, "added": 0, "removed": 0, "platforms": {}}
+
+        for platform in platforms:
+            site_id = platform.get('id')
+            items = platform.get('items', [])
+            seen = fingerprints.setdefault(site_id, {})
+
+            added = []
+            current_fps = set()
+            for item in items:
+                fp = item_fingerprint(item)
+                current_fps.add(fp)
+                if fp not in seen:
+                    added.append(item)
+                seen[fp] = now
+
+            removed = [
+                item for item in old_platforms.pop(site_id, [])
+                if item_fingerprint(item) not in current_fps
+            ]
+            if added or removed:
+                sector_delta["platforms"][site_id] = {"added": added, "removed": removed}
+                sector_delta["added"] += len(added)
+                sector_delta["removed"] += len(removed)
+
+        # 上一轮有、这一轮整个平台都没返回的，全部算作 removed
+        for site_id, old_items in old_platforms.items():
+            if not old_items: continue
+            sector_delta["platforms"][site_id] = {"added": [], "removed": old_items}
+            sector_delta["removed"] += len(old_items)
+
+        sector_delta["changed"] = bool(sector_delta["platforms"])
+        delta["changed"] = delta["changed"] or sector_delta["changed"]
+        delta["sectors"][cat_name] = sector_delta
+
+    prune_fingerprints(fingerprints, now)
+    return delta
+
+
+def prune_fingerprints(fingerprints, now=None):
+    now = int(now or time.time())
+    for site_id in list(fingerprints.keys()):
+        seen = fingerprints[site_id]
+        for fp in [fp for fp, ts in seen.items() if now - ts > FINGERPRINT_TTL]:
+            del seen[fp]
+        if not seen:
+            del fingerprints[site_id]
+
+
+def save_delta(delta, path=DELTA_FILE):
+    atomic_io.write_json(path, delta, compact=True)
+
+
+def load_delta(path=DELTA_FILE):
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def has_changes(delta=None):
+    """
+    没有差量文件时无法判断，按“有变化”处理，保证下游照常运行
+    """
+    delta = load_delta() if delta is None else delta
+    if delta is None: return True
+    return bool(delta.get("changed", True))
+
+
+def sector_changed(sector, delta=None):
+    delta = load_delta() if delta is None else delta
+    if delta is None: return True
+    sector_delta = delta.get("sectors", {}).get(sector)
+    if sector_delta is None: return True
+    return bool(sector_delta.get("changed", True))
+
+
+def input_digest(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:16]
+    except OSError:
+        return None
+
+
+def _load_stamps(stage):
+    path = STAMP_FILE.format(stage=stage)
+    if not os.path.exists(path): return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def sector_done(stage, sector, input_path, delta=None):
+    """
+    板块可以跳过：差量显示没变化，且该阶段上次成功生成用的就是现在这份输入
+    """
+    if sector_changed(sector, delta): return False
+    digest = input_digest(input_path)
+    return digest is not None and _load_stamps(stage).get(sector) == digest
+
+
+def mark_done(stage, sector, input_path):
+    """
+    记录该阶段这个板块已用当前输入成功生成（同一进程里多个阶段/板块并发调用也安全）
+    """
+    digest = input_digest(input_path)
+    if digest is None: return
+    with _stamp_lock:
+        stamps = _load_stamps(stage)
+        stamps[sector] = digest
+        atomic_io.write_json(STAMP_FILE.format(stage=stage), stamps, compact=True)
+
+
+def fresh_titles(sector, delta=None):
+    """
+    返回该板块本轮新增的标题集合；未开启 DELTA_FRESH_ONLY 或没有差量时返回 None（表示不过滤）
+    """
+    if not FRESH_ONLY: return None
+    delta = load_delta() if delta is None else delta
+    if delta is None: return None
+    sector_delta = delta.get("sectors", {}).get(sector)
+    if sector_delta is None: return None
+    titles = set()
+    for platform_delta in sector_delta.get("platforms", {}).values():
+        for item in platform_delta.get("added", []):
+            title = (item.get('title') or '').strip()
+            if title: titles.add(title)
+    return titles
@@ -0,0 +1,279 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import history_store
+from delta_store import item_fingerprint
+
+# ================= 🗃️ SQLite 标题时间序列库 =================
+# history/ 下只有按天复制的 JSON，想知道“某条标题最早什么时候出现、有几个源报道过”
+# 只能把所有文件读一遍。这里把每轮抓取写进本地 SQLite（WAL 模式）：
+#   sources    平台 id 与所属板块
+#   items      每条标题一行，按指纹（与 delta_store 一致）去重，记录首次/最近出现时间
+#   sightings  (条目, 平台, 时间) 的每一次出现，带当时的排名
+#   items_fts  标题全文索引（trigram 分词，中文子串也能查）
+# 由 archive_manager 在 ARCHIVE_DB=1 时写入；backfill 可以把已有 history/ 一次性导入。
+
+DB_PATH = os.environ.get("HEADLINE_DB", "headlines.db")
+HISTORY_DIR = "history"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id      INTEGER PRIMARY KEY,
+    name    TEXT NOT NULL UNIQUE,
+    sector  TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id          INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    title       TEXT NOT NULL,
+    url         TEXT,
+    first_seen  INTEGER NOT NULL,
+    last_seen   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sightings (
+    item_id   INTEGER NOT NULL REFERENCES items(id),
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    seen_at   INTEGER NOT NULL,
+    rank      INTEGER,
+    PRIMARY KEY (item_id, source_id, seen_at)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_items_first_seen ON items(first_seen);
+CREATE INDEX IF NOT EXISTS idx_sightings_source_time ON sightings(source_id, seen_at);
+CREATE INDEX IF NOT EXISTS idx_sightings_time ON sightings(seen_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, content='items', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts(rowid, title) VALUES (new.id, new.title);
+END;
+"""
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _source_ids(conn, names_with_sector):
+    conn.executemany(
+        "INSERT INTO sources(name, sector) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET sector = COALESCE(excluded.sector, sources.sector)",
+        names_with_sector
+    )
+    return {row["name"]: row["id"] for row in conn.execute("SELECT id, name FROM sources")}
+
+
+def record_platforms(conn, sectors, seen_at=None):
+    """
+    写入一轮抓取。sectors = {板块: data_*.json 里的平台列表}，seen_at 为 epoch 秒（默认当前时间）。
+    返回 (本轮条目数, 新标题数)
+    """
+    seen_at = int(seen_at if seen_at is not None else time.time())
+    rows = []  # (fingerprint, title, url, site_id, rank)
+    sources = {}
+    for sector, platforms in sectors.items():
+        for platform in platforms or []:
+            site_id = platform.get('id') or 'unknown'
+            sources[site_id] = sector
+            for rank, item in enumerate(platform.get('items', []), 1):
+                title = (item.get('title') or '').strip()
+                if title:
+                    rows.append((item_fingerprint(item), title, item.get('url', ''), site_id, rank))
+    if not rows: return 0, 0
+
+    with conn:
+        source_ids = _source_ids(conn, list(sources.items()))
+        before = conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()[0]
+        conn.executemany(
+            "INSERT OR IGNORE INTO items(fingerprint, title, url, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)",
+            [(fp, title, url, seen_at, seen_at) for fp, title, url, _, _ in rows]
+        )
+        new_items = conn.execute("SELECT COUNT(*) FROM items WHERE id > ?", (before,)).fetchone()[0]
+        conn.executemany(
+            "UPDATE items SET first_seen = MIN(first_seen, ?), last_seen = MAX(last_seen, ?) WHERE fingerprint = ?",
+            [(seen_at, seen_at, fp) for fp in {r[0] for r in rows}]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO sightings(item_id, source_id, seen_at, rank) "
+            "SELECT id, ?, ?, ? FROM items WHERE fingerprint = ?",
+            [(source_ids[site_id], seen_at, rank, fp) for fp, _, _, site_id, rank in rows]
+        )
+    return len(rows), new_items
+
+
+def _sector_of(path):
+    name = os.path.basename(path)
+    return name[len("data_"):-len(".json")] if name.startswith("data_") and name.endswith(".json") else None
+
+
+def record_files(file_paths, seen_at=None, path=None):
+    """
+    archive_manager 的入口：直接读取 data_*.json 写库
+    """
+    sectors = {}
+    for file_path in file_paths:
+        if not os.path.exists(file_path): continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            sectors[_sector_of(file_path) or "general"] = json.load(f)
+    conn = connect(path)
+    try:
+        return record_platforms(conn, sectors, seen_at)
+    finally:
+        conn.close()
+
+
+# ================= 🔍 查询接口 =================
+
+def _fmt(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else None
+
+
+def lookup(conn, title):
+    """
+    按标题精确查找（走指纹索引）：首次/最近出现时间、报道过的平台及出现次数
+    """
+    row = conn.execute("SELECT * FROM items WHERE fingerprint = ?",
+                       (item_fingerprint({"title": title}),)).fetchone()
+    if row is None: return None
+    sources = conn.execute(
+        "SELECT s.name, s.sector, COUNT(*) AS sightings, MIN(g.seen_at) AS first_seen, MIN(g.rank) AS best_rank "
+        "FROM sightings g JOIN sources s ON s.id = g.source_id WHERE g.item_id = ? "
+        "GROUP BY s.id ORDER BY first_seen", (row["id"],)
+    ).fetchall()
+    return {
+        "title": row["title"], "url": row["url"],
+        "first_seen": _fmt(row["first_seen"]), "last_seen": _fmt(row["last_seen"]),
+        "source_count": len(sources),
+        "sources": [{"id": s["name"], "sector": s["sector"], "sightings": s["sightings"],
+                     "first_seen": _fmt(s["first_seen"]), "best_rank": s["best_rank"]} for s in sources],
+    }
+
+
+def search(conn, text, limit=20):
+    """
+    标题全文检索。trigram 至少需要 3 个字符，更短的关键词退化为 LIKE 扫描
+    """
+    text = text.strip()
+    if len(text) >= 3:
+        sql = ("SELECT i.id, i.title, i.url, i.first_seen, i.last_seen FROM items_fts f "
+               "JOIN items i ON i.id = f.rowid WHERE items_fts MATCH ? ORDER BY i.last_seen DESC LIMIT ?")
+        params = ('"' + text.replace('"', '""') + '"', limit)
+    else:
+        sql = ("SELECT id, title, url, first_seen, last_seen FROM items WHERE title LIKE ? "
+               "ORDER BY last_seen DESC LIMIT ?")
+        params = (f"%{text}%", limit)
+    return [{"title": r["title"], "url": r["url"], "first_seen": _fmt(r["first_seen"]),
+             "last_seen": _fmt(r["last_seen"])} for r in conn.execute(sql, params)]
+
+
+def source_timeline(conn, source, since=None, until=None, limit=100):
+    """
+    某个平台在时间窗口内出现过的标题，按时间倒序
+    """
+    rows = conn.execute(
+        "SELECT i.title, i.url, g.seen_at, g.rank FROM sightings g "
+        "JOIN sources s ON s.id = g.source_id JOIN items i ON i.id = g.item_id "
+        "WHERE s.name = ? AND g.seen_at BETWEEN ? AND ? ORDER BY g.seen_at DESC, g.rank LIMIT ?",
+        (source, int(since or 0), int(until or time.time() + 86400), limit)
+    )
+    return [{"title": r["title"], "url": r["url"], "seen_at": _fmt(r["seen_at"]), "rank": r["rank"]} for r in rows]
+
+
+def top_items(conn, since=None, until=None, limit=20):
+    """
+    时间窗口内被最多平台报道的标题
+    """
+    rows = conn.execute(
+        "SELECT i.title, i.url, i.first_seen, COUNT(DISTINCT g.source_id) AS source_count, COUNT(*) AS sightings "
+        "FROM sightings g JOIN items i ON i.id = g.item_id WHERE g.seen_at BETWEEN ? AND ? "
+        "GROUP BY g.item_id ORDER BY source_count DESC, sightings DESC LIMIT ?",
+        (int(since or 0), int(until or time.time() + 86400), limit)
+    )
+    return [{"title": r["title"], "url": r["url"], "first_seen": _fmt(r["first_seen"]),
+             "source_count": r["source_count"], "sightings": r["sightings"]} for r in rows]
+
+
+# ================= 📥 历史回填 =================
+
+def backfill(history_dir=HISTORY_DIR, path=None):
+    """
+    把 history/<date>/data_*.json（以及只存在于 history_store 的日期）导入数据库。
+    历史快照只有日期，出现时间记为当天 00:00；重复导入是幂等的。
+    """
+    dates = set(history_store.list_dates())
+    if os.path.isdir(history_dir):
+        dates.update(d for d in os.listdir(history_dir) if os.path.isdir(os.path.join(history_dir, d)))
+
+    conn = connect(path)
+    total_rows = total_new = 0
+    start = time.perf_counter()
+    try:
+        for date in sorted(dates):
+            try:
+                seen_at = datetime.strptime(date, "%Y-%m-%d").timestamp()
+            except ValueError:
+                continue
+            day_dir = os.path.join(history_dir, date)
+            files = sorted(
+                os.path.join(day_dir, n) for n in (os.listdir(day_dir) if os.path.isdir(day_dir) else [])
+                if n.startswith("data_") and n.endswith(".json")
+            )
+            if files:
+                sectors = {}
+                for file_path in files:
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        sectors[_sector_of(file_path)] = json.load(f)
+            elif date in history_store.list_dates():
+                sectors = {_sector_of(name): platforms for name, platforms in history_store.load_day(date).items()}
+            else:
+                continue
+            rows, new_items = record_platforms(conn, sectors, seen_at)
+            total_rows += rows
+            total_new += new_items
+            print(f"📥 {date}: {rows} 次出现，新标题 {new_items}")
+    finally:
+        conn.close()
+    print(f"✅ 回填完成：{total_rows} 次出现，{total_new} 条新标题，耗时 {time.perf_counter() - start:.1f}s")
+    return total_rows, total_new
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SQLite 标题时间序列库")
+    parser.add_argument("--db", default=None, help=f"数据库路径（默认 {DB_PATH}）")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_backfill = sub.add_parser("backfill", help="导入已有的 history/")
+    p_backfill.add_argument("--history", default=HISTORY_DIR)
+    p_lookup = sub.add_parser("lookup", help="按完整标题查首次出现时间和来源")
+    p_lookup.add_argument("title")
+    p_search = sub.add_parser("search", help="标题全文检索")
+    p_search.add_argument("text")
+    p_search.add_argument("--limit", type=int, default=20)
+    p_top = sub.add_parser("top", help="某天被最多平台报道的标题")
+    p_top.add_argument("date", nargs="?", default=datetime.now().strftime("%Y-%m-%d"))
+    p_top.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.cmd == "backfill":
+        backfill(args.history, args.db)
+    else:
+        conn = connect(args.db)
+        start = time.perf_counter()
+        if args.cmd == "lookup":
+            result = lookup(conn, args.title)
+        elif args.cmd == "search":
+            result = search(conn, args.text, args.limit)
+        else:
+            day = datetime.strptime(args.date, "%Y-%m-%d").timestamp()
+            result = top_items(conn, day, day + 86400 - 1, args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        print(f"⏱️ 查询耗时 {elapsed:.1f} ms")
+        conn.close()
@@ -0,0 +1,241 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+
+import atomic_io
+
+# ================= 🗄️ 内容寻址的历史归档 =================
+# history/YYYY-MM-DD/ 下每天都整份复制 data_*.json，大部分标题天天重复。
+# 这里改为按“条目”去重：
+#   history_store/packs/<pack>.jsonl.gz   新出现的条目 (哈希, 标题, 链接)，按内容哈希命名
+#   history_store/index.json.gz           条目哈希 -> 所在 pack
+#   history_store/manifests/<date>.json   当天每个文件、每个平台的条目哈希列表
+# 需要时可以把任意一天还原成原来的 history/<date>/data_*.json（逐字节一致）。
+
+STORE_DIR = "history_store"
+HISTORY_DIR = "history"
+
+# zstd 是可选依赖：装了就用，否则退回标准库 gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=9, mtime=0), ".gz"
+
+
+def _decompress(data, ext):
+    if ext == ".zst":
+        if zstandard is None:
+            raise RuntimeError("该 pack 使用 zstd 压缩，请先 pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def item_hash(item):
+    payload = json.dumps([item.get('title', ''), item.get('url', '')], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _paths(store_dir):
+    return {
+        "packs": os.path.join(store_dir, "packs"),
+        "manifests": os.path.join(store_dir, "manifests"),
+        "index": os.path.join(store_dir, "index.json.gz"),
+    }
+
+
+def load_index(store_dir=STORE_DIR):
+    path = _paths(store_dir)["index"]
+    if not os.path.exists(path): return {}
+    with open(path, "rb") as f:
+        return json.loads(gzip.decompress(f.read()))
+
+
+def _save_index(index, store_dir):
+    data = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    atomic_io.write_bytes(_paths(store_dir)["index"], gzip.compress(data, compresslevel=9, mtime=0))
+
+
+def _write_pack(new_items, store_dir):
+    """
+    把新条目写成一个 pack，文件名取内容哈希，返回 pack 名（含扩展名）
+    """
+    lines = "\n".join(json.dumps([h, t, u], ensure_ascii=False) for h, t, u in new_items)
+    raw = lines.encode("utf-8")
+    blob, ext = _compress(raw)
+    pack_name = hashlib.sha1(raw).hexdigest()[:16] + ".jsonl" + ext
+    path = os.path.join(_paths(store_dir)["packs"], pack_name)
+    if not os.path.exists(path):
+        atomic_io.write_bytes(path, blob)
+    return pack_name
+
+
+def _read_pack(pack_name, store_dir):
+    ext = os.path.splitext(pack_name)[1]
+    with open(os.path.join(_paths(store_dir)["packs"], pack_name), "rb") as f:
+        raw = _decompress(f.read(), ext).decode("utf-8")
+    items = {}
+    for line in raw.splitlines():
+        h, t, u = json.loads(line)
+        items[h] = {"title": t, "url": u}
+    return items
+
+
+def archive_files(date, file_paths, store_dir=STORE_DIR):
+    """
+    把一组 data_*.json 以条目去重的方式归档到 date 这一天，返回 (新增条目数, 总条目数)
+    """
+    paths = _paths(store_dir)
+    os.makedirs(paths["packs"], exist_ok=True)
+    os.makedirs(paths["manifests"], exist_ok=True)
+
+    index = load_index(store_dir)
+    manifest_path = os.path.join(paths["manifests"], f"{date}.json")
+    manifest = {"date": date, "files": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    new_items = {}
+    total = 0
+    for file_path in file_paths:
+        if not os.path.exists(file_path): continue
+        with open(file_path, "r", encoding="utf-8") as f:
+            platforms = json.load(f)
+
+        file_entry = []
+        for platform in platforms:
+            hashes = []
+            for item in platform.get('items', []):
+                h = item_hash(item)
+                hashes.append(h)
+                if h not in index and h not in new_items:
+                    new_items[h] = (h, item.get('title', ''), item.get('url', ''))
+                total += 1
+            file_entry.append({"id": platform.get('id'), "items": hashes})
+        manifest["files"][os.path.basename(file_path)] = file_entry
+
+    if new_items:
+        pack_name = _write_pack(list(new_items.values()), store_dir)
+        for h in new_items:
+            index[h] = pack_name
+        _save_index(index, store_dir)
+
+    manifest["packs"] = sorted({
+        index[h] for entries in manifest["files"].values() for p in entries for h in p["items"]
+    })
+    atomic_io.write_json(manifest_path, manifest, compact=True)
+    return len(new_items), total
+
+
+def list_dates(store_dir=STORE_DIR):
+    manifest_dir = _paths(store_dir)["manifests"]
+    if not os.path.isdir(manifest_dir): return []
+    return sorted((n[:-len(".json")] for n in os.listdir(manifest_dir) if n.endswith(".json")), reverse=True)
+
+
+def load_day(date, store_dir=STORE_DIR):
+    """
+    还原某一天的数据，返回 {文件名: 平台列表}
+    """
+    with open(os.path.join(_paths(store_dir)["manifests"], f"{date}.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    items = {}
+    for pack_name in manifest.get("packs", []):
+        items.update(_read_pack(pack_name, store_dir))
+    return {
+        filename: [{"id": p["id"], "items": [items[h] for h in p["items"]]} for p in entries]
+        for filename, entries in manifest["files"].items()
+    }
+
+
+def restore_day(date, out_dir=None, store_dir=STORE_DIR):
+    """
+    按旧目录结构写回 history/<date>/data_*.json（格式与 crawl.py 输出一致）
+    """
+    out_dir = out_dir or os.path.join(HISTORY_DIR, date)
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    for filename, platforms in load_day(date, store_dir).items():
+        path = os.path.join(out_dir, filename)
+        atomic_io.write_json(path, platforms)
+        written.append(path)
+    return written
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def migrate_history(history_dir=HISTORY_DIR, store_dir=STORE_DIR, delete=False, verify=True):
+    """
+    把现有 history/<date>/data_*.json 全部导入 store，并打印节省的字节数。
+    delete=True 时在校验通过后删除原始 data_*.json（reports/ 等其他文件保留）
+    """
+    if not os.path.isdir(history_dir):
+        print(f"❌ 找不到 {history_dir}/")
+        return
+
+    before = 0
+    for date in sorted(os.listdir(history_dir)):
+        day_dir = os.path.join(history_dir, date)
+        if not os.path.isdir(day_dir): continue
+        files = sorted(
+            os.path.join(day_dir, n) for n in os.listdir(day_dir)
+            if n.startswith("data_") and n.endswith(".json")
+        )
+        if not files: continue
+        size = sum(os.path.getsize(p) for p in files)
+        before += size
+        added, total = archive_files(date, files, store_dir)
+        print(f"📚 {date}: {len(files)} 个文件 {size / 1024:7.1f} KB, 条目 {total}, 新增 {added}")
+
+        if verify:
+            for filename, platforms in load_day(date, store_dir).items():
+                rebuilt = json.dumps(platforms, ensure_ascii=False, indent=2).encode("utf-8")
+                with open(os.path.join(day_dir, filename), "rb") as f:
+                    if f.read() != rebuilt:
+                        print(f"⚠️ {date}/{filename} 还原结果与原文件不一致，保留原文件")
+                        files = [p for p in files if os.path.basename(p) != filename]
+        if delete:
+            for path in files:
+                os.remove(path)
+
+    after = _dir_size(store_dir)
+    saved = before - after
+    ratio = (after / before * 100) if before else 0
+    print(f"✅ 迁移完成：原始 {before / 1024:.1f} KB -> store {after / 1024:.1f} KB "
+          f"({ratio:.1f}%)，节省 {saved / 1024:.1f} KB")
+    return before, after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="内容寻址历史归档工具")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_migrate = sub.add_parser("migrate", help="把现有 history/ 导入 store")
+    p_migrate.add_argument("--delete", action="store_true", help="校验通过后删除原始 data_*.json")
+    p_restore = sub.add_parser("restore", help="还原某天为旧的目录结构")
+    p_restore.add_argument("date")
+    p_restore.add_argument("--out", default=None)
+    sub.add_parser("list", help="列出已归档的日期")
+    args = parser.parse_args()
+
+    if args.cmd == "migrate":
+        migrate_history(delete=args.delete)
+    elif args.cmd == "restore":
+        for path in restore_day(args.date, args.out):
+            print(f"📄 {path}")
+    else:
+        for date in list_dates():
+            print(date)
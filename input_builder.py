@@ -0,0 +1,154 @@
+import json
+import os
+
+from title_matcher import normalize_title, title_bigrams
+
+# ================= 🧮 按 Token 预算构建模型输入 =================
+# 取代各脚本里“按平台顺序取前 N 条”的截断：
+#   1. 粗略估算 token（中日韩字符按 1 个 token，其余按 4 个字符 1 个 token）
+#   2. 去掉归一化后相同或字符二元组高度重合的近似重复标题
+#   3. 各平台轮询取条目（可按权重多取），让排在后面的平台也能进入 prompt
+#   4. 可选：传入 news_cluster 的聚类结果，同簇只留一条，并用 {heat} 标出来源数
+#   5. 可选：传入 trend_engine 的升温词，含这些词的标题先于其他标题轮询
+
+# bigram Jaccard 超过该值视为同一条新闻的不同写法
+NEAR_DUP_THRESHOLD = 0.6
+
+# 每个平台每轮取几条；没列出的平台按 1 条
+SOURCE_WEIGHTS = {
+    "wallstreetcn-hot": 2, "cls-hot": 2, "weibo": 2, "zhihu": 2,
+}
+
+
+def _is_cjk(ch):
+    code = ord(ch)
+    return (0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0x3040 <= code <= 0x30FF
+            or 0xAC00 <= code <= 0xD7AF or 0xFF00 <= code <= 0xFFEF or 0x3000 <= code <= 0x303F)
+
+
+def estimate_tokens(text):
+    """
+    不依赖分词器的快速估算，宁可略微高估
+    """
+    if not text: return 0
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def load_platforms(filepath):
+    if not os.path.exists(filepath): return None
+    with open(filepath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _round_robin(platforms, weights):
+    """
+    按轮次依次产出 (平台 id, 条目)：第 r 轮从每个平台取 weight 条
+    """
+    queues = []
+    for platform in platforms:
+        items = [i for i in platform.get('items', []) if (i.get('title') or '').strip()]
+        if items:
+            queues.append((platform.get('id', 'unknown'), items, weights.get(platform.get('id'), 1)))
+    offsets = [0] * len(queues)
+    while True:
+        progressed = False
+        for q, (site_id, items, weight) in enumerate(queues):
+            start = offsets[q]
+            for item in items[start:start + weight]:
+                yield site_id, item
+            if start < len(items):
+                progressed = True
+            offsets[q] = start + weight
+        if not progressed: return
+
+
+def _prioritized(platforms, weights, priority_terms):
+    """
+    先轮询含升温词的标题，再轮询其余标题；两轮各自保持平台间的公平
+    """
+    if not priority_terms:
+        yield from _round_robin(platforms, weights)
+        return
+    hot, rest = [], []
+    for platform in platforms:
+        items = platform.get('items', [])
+        is_hot = [any(t in normalize_title(i.get('title') or '') for t in priority_terms) for i in items]
+        hot.append({'id': platform.get('id'), 'items': [i for i, h in zip(items, is_hot) if h]})
+        rest.append({'id': platform.get('id'), 'items': [i for i, h in zip(items, is_hot) if not h]})
+    yield from _round_robin(hot, weights)
+    yield from _round_robin(rest, weights)
+
+
+def format_line(line_format, site_id, title, clusters=None):
+    """
+    按 line_format 生成一行；{heat} 在多源报道时展开为 “ (N源)”，否则为空
+    """
+    hit = clusters.get(title) if clusters else None
+    heat = f" ({hit[1]}源)" if hit and hit[1] > 1 else ""
+    return line_format.format(site_id=site_id, title=title, heat=heat)
+
+
+def select_items(platforms, token_budget, line_format="- {title}", only_titles=None, weights=None, clusters=None,
+                 priority_terms=None):
+    """
+    返回 (选中的 [(平台 id, 标题, url)], 使用的 token 数, 去重丢弃数)
+    line_format 用来估算每行实际占用的 token，支持 {site_id}、{title} 和 {heat}
+    clusters 为 news_cluster.load_clusters 的结果，同一簇的标题只保留先轮到的那条
+    priority_terms 为 trend_engine.load_trend_terms 的结果，含这些词的标题优先占用预算
+    """
+    weights = SOURCE_WEIGHTS if weights is None else weights
+    selected = []
+    seen_norm = set()
+    seen_clusters = set()
+    postings = {}
+    gram_sets = []
+    used = 0
+    dropped_dups = 0
+
+    for site_id, item in _prioritized(platforms or [], weights, priority_terms):
+        title = item.get('title', '').strip()
+        if only_titles is not None and title not in only_titles: continue
+
+        cluster = clusters.get(title) if clusters else None
+        if cluster and cluster[0] in seen_clusters:
+            dropped_dups += 1
+            continue
+
+        norm = normalize_title(title)
+        if not norm or norm in seen_norm:
+            dropped_dups += 1
+            continue
+        grams = title_bigrams(norm)
+        shared = {}
+        for g in grams:
+            for idx in postings.get(g, ()):
+                shared[idx] = shared.get(idx, 0) + 1
+        if any(n / (len(grams) + len(gram_sets[idx]) - n) >= NEAR_DUP_THRESHOLD for idx, n in shared.items()):
+            dropped_dups += 1
+            continue
+
+        cost = estimate_tokens(format_line(line_format, site_id, title, clusters)) + 1  # +1 换行
+        if used + cost > token_budget:
+            # 预算用完就停；继续找更短的标题会破坏轮询的公平性
+            break
+        used += cost
+
+        idx = len(gram_sets)
+        gram_sets.append(grams)
+        for g in grams:
+            postings.setdefault(g, []).append(idx)
+        seen_norm.add(norm)
+        if cluster: seen_clusters.add(cluster[0])
+        selected.append((site_id, title, item.get('url', '')))
+
+    return selected, used, dropped_dups
+
+
+def build_lines(platforms, token_budget, line_format="- {title}", only_titles=None, weights=None, clusters=None):
+    """
+    直接返回格式化好的行列表，供 prompt 拼接
+    """
+    selected, _, _ = select_items(platforms, token_budget, line_format, only_titles, weights, clusters)
+    return [format_line(line_format, site_id, title, clusters) for site_id, title, _ in selected]
@@ -0,0 +1,218 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import atomic_io
+from rate_limiter import get_bucket
+
+# google-genai 导入要 0.7 秒左右：推迟到第一次创建客户端时再导入，
+# 没有 Key、没有输入或数据没变化的空跑不必付这笔开销（压测脚本会直接替换这个变量）
+genai = None
+
+# ================= 🔑 共享 API Key 池 =================
+# 三个 AI 脚本共用：每个 Key 只建一个 genai.Client，记录成功/429/失败次数与延迟，
+# 429 后进入冷却期（连续 429 冷却时间翻倍），每次请求路由到当前最健康的 Key。
+# 统计写入 key_stats.json（只记环境变量名，不落盘 Key 本身），冷却状态跨运行保留。
+
+KEY_ENVS = [
+    "KEY_FINANCE", "KEY_GLOBAL", "KEY_TECH", "KEY_GENERAL", "GOOGLE_API_KEY",
+    "KEY_1", "KEY_2", "KEY_3", "KEY_4", "KEY_5", "KEY_6", "KEY_7", "KEY_8"
+]
+
+STATS_FILE = "key_stats.json"
+BASE_COOLDOWN = 60           # 第一次 429 的冷却秒数
+MAX_COOLDOWN = 15 * 60       # 冷却上限
+MAX_WAIT = 120               # 所有候选 Key 都在冷却时，最多等待的秒数
+PREFERRED_BONUS = 0.1        # 板块专属 Key 的加分，健康度相近时优先用它
+LATENCY_EWMA = 0.3           # 延迟指数平均的权重
+PROXY_PORT = "17890"         # 本地环境下访问 Google 用的代理端口
+# 单次请求超时（秒）：卡住的连接按 timeout 错误交给 retry_policy 重试，而不是一直挂着
+REQUEST_TIMEOUT = float(os.environ.get("MODEL_TIMEOUT", 600))
+
+
+_SDK_LOCK = threading.Lock()
+
+
+def _load_sdk():
+    """
+    第一次真正要调用模型时才配置代理并导入 SDK（原先 ai_editor / ai_boardroom 在导入时就改了环境变量）
+    """
+    global genai
+    with _SDK_LOCK:
+        if genai is not None: return genai
+        if os.environ.get("GITHUB_ACTIONS"):
+            print("☁️ 检测到云端环境：禁用代理，使用直连...")
+        else:
+            print(f"🏠 检测到本地环境：启用代理 {PROXY_PORT}...")
+            os.environ["HTTP_PROXY"] = f"http://127.0.0.1:{PROXY_PORT}"
+            os.environ["HTTPS_PROXY"] = f"http://127.0.0.1:{PROXY_PORT}"
+        from google import genai as sdk
+        genai = sdk
+        return genai
+
+
+def _new_stats():
+    return {"calls": 0, "success": 0, "rate_limited": 0, "errors": 0,
+            "avg_latency": 0.0, "consecutive_429": 0, "cooldown_until": 0.0, "last_used": None}
+
+
+class KeyPool:
+    def __init__(self, key_envs=KEY_ENVS, stats_file=STATS_FILE):
+        self.stats_file = stats_file
+        self.lock = threading.Lock()
+        self.keys = {}        # key_id(环境变量名) -> api_key
+        self.aliases = {}     # 环境变量名 -> key_id（同一个 Key 配在多个变量里时合并）
+        self.clients = {}
+        self.inflight = {}
+        self.global_bucket = None   # 设置后所有 Key 再共用一个总令牌桶（replay.py 回填时给整批任务限速）
+
+        seen = {}
+        for env in key_envs:
+            api_key = os.environ.get(env)
+            if not api_key: continue
+            if api_key in seen:
+                self.aliases[env] = seen[api_key]
+                continue
+            seen[api_key] = env
+            self.keys[env] = api_key
+            self.aliases[env] = env
+            self.inflight[env] = 0
+
+        saved = self._load_saved()
+        self.stats = {}
+        for key_id in self.keys:
+            stats = _new_stats()
+            stats.update(saved.get(key_id, {}))
+            self.stats[key_id] = stats
+
+    def _load_saved(self):
+        if not os.path.exists(self.stats_file): return {}
+        try:
+            with open(self.stats_file, "r", encoding="utf-8") as f:
+                return json.load(f).get("keys", {})
+        except (OSError, ValueError):
+            return {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def resolve(self, envs):
+        """
+        把一组环境变量名映射为池里实际存在的 key_id（去重、保持顺序）
+        """
+        ids = []
+        for env in envs or []:
+            key_id = self.aliases.get(env)
+            if key_id and key_id not in ids: ids.append(key_id)
+        return ids
+
+    def get_client(self, key_id, api_version=None):
+        cache_key = (key_id, api_version)
+        with self.lock:
+            client = self.clients.get(cache_key)
+            if client is None:
+                sdk = _load_sdk()
+                http_options = {'timeout': int(REQUEST_TIMEOUT * 1000)}
+                if api_version: http_options['api_version'] = api_version
+                client = sdk.Client(api_key=self.keys[key_id], http_options=http_options)
+                self.clients[cache_key] = client
+            return client
+
+    def _score(self, key_id, preferred):
+        s = self.stats[key_id]
+        health = (s["success"] + 1) / (s["success"] + s["errors"] + s["rate_limited"] + 2)
+        score = health - s["avg_latency"] / 120.0 - 0.05 * self.inflight[key_id]
+        if key_id in preferred: score += PREFERRED_BONUS
+        return score
+
+    def acquire(self, preferred=None, candidates=None, exclude=(), api_version=None, max_wait=MAX_WAIT):
+        """
+        选出最健康且不在冷却中的 Key，等待其令牌桶放行后返回 (key_id, client)。
+        没有可用 Key（或冷却等待超过 max_wait）时返回 (None, None)
+        """
+        preferred = self.resolve([preferred] if isinstance(preferred, str) else preferred)
+        pool = self.resolve(candidates) if candidates is not None else list(self.keys)
+        pool = [k for k in pool if k not in exclude]
+        if not pool: return None, None
+
+        deadline = time.time() + max_wait
+        while True:
+            with self.lock:
+                now = time.time()
+                ready = [k for k in pool if self.stats[k]["cooldown_until"] <= now]
+                if ready:
+                    key_id = max(ready, key=lambda k: self._score(k, preferred))
+                    self.inflight[key_id] += 1
+                    break
+                soonest = min(self.stats[k]["cooldown_until"] for k in pool)
+            if soonest > deadline:
+                return None, None
+            print(f"⏳ 所有候选 Key 都在冷却中，等待 {soonest - now:.0f} 秒...")
+            time.sleep(max(0.0, soonest - now))
+
+        get_bucket(self.keys[key_id]).acquire()
+        if self.global_bucket is not None: self.global_bucket.acquire()
+        return key_id, self.get_client(key_id, api_version)
+
+    def _finish(self, key_id):
+        self.inflight[key_id] = max(0, self.inflight[key_id] - 1)
+        s = self.stats[key_id]
+        s["calls"] += 1
+        s["last_used"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return s
+
+    def report_success(self, key_id, latency):
+        with self.lock:
+            s = self._finish(key_id)
+            s["success"] += 1
+            s["consecutive_429"] = 0
+            s["avg_latency"] = round(latency if s["success"] == 1 else
+                                     (1 - LATENCY_EWMA) * s["avg_latency"] + LATENCY_EWMA * latency, 3)
+
+    def report_rate_limited(self, key_id, retry_delay=None):
+        """
+        429：进入冷却。服务端给了 retryDelay 就用它，否则按连续次数指数增长
+        """
+        with self.lock:
+            s = self._finish(key_id)
+            s["rate_limited"] += 1
+            s["consecutive_429"] += 1
+            cooldown = retry_delay or min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** (s["consecutive_429"] - 1))
+            s["cooldown_until"] = time.time() + cooldown
+        get_bucket(self.keys[key_id]).backoff(cooldown)
+        return cooldown
+
+    def report_failure(self, key_id):
+        with self.lock:
+            s = self._finish(key_id)
+            s["errors"] += 1
+
+    def save_stats(self):
+        """
+        与已有的 key_stats.json 合并后写回（其他脚本用到的 Key 统计不会被覆盖）
+        """
+        with self.lock:
+            merged = self._load_saved()
+            merged.update({k: dict(v) for k, v in self.stats.items()})
+        data = {"updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "keys": merged}
+        atomic_io.write_json(self.stats_file, data)
+
+    def print_stats(self):
+        for key_id, s in self.stats.items():
+            if not s["calls"]: continue
+            print(f"🔑 {key_id:<14} 调用 {s['calls']:>4}  成功 {s['success']:>4}  429 {s['rate_limited']:>3}  "
+                  f"失败 {s['errors']:>3}  平均延迟 {s['avg_latency']:.1f}s")
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = KeyPool()
+        return _POOL
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import atomic_io
+
+# ================= 🗃️ 模型响应磁盘缓存 =================
+# 以 (模型, prompt, 生成配置) 的哈希为键，把响应文本存到本地目录。
+# 输入没变时直接复用上一次的结果，不再消耗 API 额度。
+# 过期(TTL)的条目视为未命中；目录超过体积上限时按最近使用时间(LRU)淘汰。
+
+CACHE_DIR = os.environ.get("LLM_CACHE_DIR", ".llm_cache")
+CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", 24 * 3600))                  # 秒
+CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_MB", 50)) * 1024 * 1024
+CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") != "0"
+EVICT_TARGET = 0.9   # 写入时超过上限就淘汰到上限的 90%，留出余量，免得紧接着的每次写入都要重新扫描
+
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_lock = threading.Lock()
+# 缓存目录体积的估算值：本进程第一次写入时完整扫描一次（顺带清掉过期条目），之后按写入累加，
+# 超过上限才再扫描淘汰，不必每次写入都 stat 整个目录
+_total_bytes = None
+
+
+def _config_to_dict(config):
+    """
+    把 GenerateContentConfig 之类的对象转成可稳定序列化的字典
+    """
+    if config is None: return None
+    if hasattr(config, "model_dump"):
+        return config.model_dump(mode="json", exclude_none=True)
+    if isinstance(config, dict):
+        return config
+    return repr(config)
+
+
+def cache_key(model, prompt, config=None):
+    payload = json.dumps(
+        {"model": model, "prompt": prompt, "config": _config_to_dict(config)},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _lookup(model, prompt, config):
+    """
+    读一个条目（不计入命中统计），命中返回响应文本，否则返回 None
+    """
+    path = _entry_path(cache_key(model, prompt, config))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - entry.get("created", 0) > CACHE_TTL:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    # 刷新访问时间，LRU 淘汰时以 mtime 为准
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return entry.get("text")
+
+
+def get(model, prompt, config=None):
+    """
+    命中返回缓存的响应文本，否则返回 None
+    """
+    if not CACHE_ENABLED: return None
+    text = _lookup(model, prompt, config)
+    _count("misses" if text is None else "hits")
+    return text
+
+
+def get_any(models, prompt, config=None):
+    """
+    按顺序查多个模型的缓存（model_router 的降级链），返回 (模型, 文本) 或 (None, None)；
+    整次查找只计一次命中或未命中
+    """
+    if not CACHE_ENABLED: return None, None
+    for model in models:
+        text = _lookup(model, prompt, config)
+        if text is not None:
+            _count("hits")
+            return model, text
+    _count("misses")
+    return None, None
+
+
+def put(model, prompt, config, text):
+    if not CACHE_ENABLED or not text: return
+    path = _entry_path(cache_key(model, prompt, config))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {"created": time.time(), "model": model, "text": text}
+    atomic_io.write_json(path, entry, compact=True)
+    _count("stores")
+    global _total_bytes
+    size = os.path.getsize(path)
+    with _lock:
+        first = _total_bytes is None
+        if not first: _total_bytes += size
+        over = not first and _total_bytes > CACHE_MAX_BYTES
+    if first: evict()
+    elif over: evict(int(CACHE_MAX_BYTES * EVICT_TARGET))
+
+
+def evict(max_bytes=None):
+    """
+    删除过期条目；总体积仍超过上限时，从最久未使用的开始删
+    """
+    global _total_bytes
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(CACHE_DIR): return
+
+    entries = []
+    total = 0
+    now = time.time()
+    for sub in os.listdir(CACHE_DIR):
+        sub_dir = os.path.join(CACHE_DIR, sub)
+        if not os.path.isdir(sub_dir): continue
+        for name in os.listdir(sub_dir):
+            path = os.path.join(sub_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            # mtime 早于 TTL 说明既过期又长期没被访问
+            if now - st.st_mtime > CACHE_TTL:
+                _remove(path)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+    if total > max_bytes:
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes: break
+            _remove(path)
+            total -= size
+    with _lock:
+        _total_bytes = total
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        _count("evictions")
+    except OSError:
+        pass
+
+
+def get_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def print_stats():
+    stats = get_stats()
+    lookups = stats["hits"] + stats["misses"]
+    rate = (stats["hits"] / lookups * 100) if lookups else 0.0
+    print(f"🗃️ LLM 缓存: 命中 {stats['hits']} / 未命中 {stats['misses']} "
+          f"(命中率 {rate:.0f}%)，写入 {stats['stores']}，淘汰 {stats['evictions']}")
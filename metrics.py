@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import atomic_io
+from input_builder import estimate_tokens
+
+# ================= 📈 运行指标：计数器 / 直方图 / 计时器 =================
+# 各阶段把 HTTP 抓取耗时、模型延迟、prompt/响应大小、429 次数、文件读写等记到这里，
+# 阶段结束时 flush(stage) 把该阶段的指标追加写入 metrics.jsonl（每个序列一行），
+# 设置 METRICS_PROM_DIR 时再额外输出 Prometheus textfile（node_exporter 可直接采集）。
+# 所有序列都带 stage 标签：pipeline.py 在一个进程里并发跑多个阶段，flush 只取走自己的。
+
+METRICS_FILE = os.environ.get("METRICS_FILE", "metrics.jsonl")
+METRICS_KEEP = 5000                                  # metrics.jsonl 最多保留的行数
+PROM_DIR = os.environ.get("METRICS_PROM_DIR")        # 为空则不输出 Prometheus 文件
+PROM_PREFIX = "super_"
+ENABLED = os.environ.get("METRICS", "1") != "0"
+
+# 直方图分桶：名字以 _seconds 结尾的按耗时分桶，其余（字节、字符、token）按大小分桶
+TIME_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+RUN_ID = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+_lock = threading.Lock()
+_file_lock = threading.Lock()   # 多个阶段同时 flush 时串行写文件
+_counters = {}     # (name, labels) -> value
+_histograms = {}   # (name, labels) -> {"count", "sum", "min", "max", "buckets": [...]}
+
+
+def _key(name, stage, labels):
+    labels = dict(labels, stage=stage or "unknown")
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, stage=None, **labels):
+    if not ENABLED: return
+    key = _key(name, stage, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, stage=None, **labels):
+    if not ENABLED: return
+    key = _key(name, stage, labels)
+    bounds = TIME_BUCKETS if name.endswith("_seconds") else SIZE_BUCKETS
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = {"count": 0, "sum": 0.0, "min": value, "max": value,
+                                    "bounds": bounds, "buckets": [0] * len(bounds)}
+        h["count"] += 1
+        h["sum"] += value
+        h["min"] = min(h["min"], value)
+        h["max"] = max(h["max"], value)
+        for i, bound in enumerate(bounds):
+            if value <= bound:
+                h["buckets"][i] += 1
+                break
+
+
+@contextmanager
+def timer(name, stage=None, **labels):
+    """
+    with metrics.timer("crawl_fetch_seconds", stage="crawl"): ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, stage, **labels)
+
+
+def observe_model_call(stage, model, status, latency=None, prompt=None, response=None):
+    """
+    模型调用的通用记录：status 取 ok / rate_limited / transient / timeout / malformed / error / cache_hit
+    """
+    inc("model_calls_total", stage=stage, model=model, status=status)
+    if latency is not None:
+        observe("model_latency_seconds", latency, stage, model=model)
+    if prompt is not None:
+        observe("prompt_chars", len(prompt), stage, model=model)
+        observe("prompt_tokens", estimate_tokens(prompt), stage, model=model)
+    if response is not None:
+        observe("response_chars", len(response), stage, model=model)
+
+
+def observe_file_write(stage, path, seconds, size=None):
+    inc("file_writes_total", stage=stage)
+    observe("file_write_seconds", seconds, stage)
+    if size is None and os.path.exists(path):
+        size = os.path.getsize(path)
+    if size is not None:
+        observe("file_write_bytes", size, stage)
+
+
+def _drain(stages):
+    """
+    取走属于 stages 的全部序列（stages 为空表示全部）
+    """
+    def wanted(key):
+        return not stages or dict(key[1]).get("stage") in stages
+
+    with _lock:
+        counters = {k: v for k, v in _counters.items() if wanted(k)}
+        histograms = {k: v for k, v in _histograms.items() if wanted(k)}
+        for k in counters: del _counters[k]
+        for k in histograms: del _histograms[k]
+    return counters, histograms
+
+
+def _append_jsonl(records):
+    records = records[-METRICS_KEEP:]
+    # 注意 [-0:] 会取到整个列表：新记录占满上限时旧行一行都不留
+    keep = max(0, METRICS_KEEP - len(records))
+    lines = []
+    if keep and os.path.exists(METRICS_FILE):
+        with open(METRICS_FILE, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()[-keep:]
+    lines.extend(json.dumps(r, ensure_ascii=False) for r in records)
+    atomic_io.write_text(METRICS_FILE, "\n".join(lines) + "\n")
+
+
+def _prom_labels(labels, extra=None):
+    pairs = list(labels) + (extra or [])
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+
+def _write_prom(stage, counters, histograms):
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PROM_PREFIX}{name} counter")
+        lines.append(f"{PROM_PREFIX}{name}{_prom_labels(labels)} {value}")
+    for (name, labels), h in sorted(histograms.items()):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {PROM_PREFIX}{name} histogram")
+        cumulative = 0
+        for bound, count in zip(h["bounds"], h["buckets"]):
+            cumulative += count
+            lines.append(f"{PROM_PREFIX}{name}_bucket{_prom_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{PROM_PREFIX}{name}_bucket{_prom_labels(labels, [('le', '+Inf')])} {h['count']}")
+        lines.append(f"{PROM_PREFIX}{name}_sum{_prom_labels(labels)} {h['sum']:.6f}")
+        lines.append(f"{PROM_PREFIX}{name}_count{_prom_labels(labels)} {h['count']}")
+
+    os.makedirs(PROM_DIR, exist_ok=True)
+    # textfile collector 可能随时读取，必须原子替换
+    atomic_io.write_text(os.path.join(PROM_DIR, f"{PROM_PREFIX}{stage}.prom"), "\n".join(lines) + "\n")
+
+
+def flush(*stages):
+    """
+    把指定阶段的指标写出并清空，返回写出的记录数
+    """
+    if not ENABLED: return 0
+    counters, histograms = _drain(set(stages))
+    if not counters and not histograms: return 0
+
+    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    records = []
+    for (name, labels), value in counters.items():
+        labels = dict(labels)
+        records.append({"ts": ts, "run": RUN_ID, "stage": labels.pop("stage"), "type": "counter",
+                        "name": name, "labels": labels, "value": value})
+    for (name, labels), h in histograms.items():
+        labels = dict(labels)
+        records.append({"ts": ts, "run": RUN_ID, "stage": labels.pop("stage"), "type": "histogram",
+                        "name": name, "labels": labels, "count": h["count"], "sum": round(h["sum"], 6),
+                        "min": round(h["min"], 6), "max": round(h["max"], 6),
+                        "buckets": dict(zip([str(b) for b in h["bounds"]], h["buckets"]))})
+    with _file_lock:
+        _append_jsonl(records)
+        if PROM_DIR:
+            for stage in sorted({r["stage"] for r in records}):
+                _write_prom(stage,
+                            {k: v for k, v in counters.items() if dict(k[1])["stage"] == stage},
+                            {k: v for k, v in histograms.items() if dict(k[1])["stage"] == stage})
+    return len(records)
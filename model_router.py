@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import atomic_io
+import key_pool
+import llm_cache
+import metrics
+import retry_policy
+from input_builder import estimate_tokens
+
+# ================= 🧭 模型分档路由 =================
+# 三个 AI 脚本不再各自写死模型名，而是按任务向路由要模型：
+#   每个任务(TASKS)配置按质量从高到低排列的几档模型，先在靠前的档里挑，同一档内取满足预算的最便宜模型；
+#   预算：近期 p95 延迟不超过该任务的 max_latency、失败率不超过 MAX_FAILURE_RATE、
+#         本次运行的估算费用不超过 MODEL_COST_BUDGET（0 为不限）。一个都不满足时按估算费用从低到高排。
+#   选中的模型在 retry_policy 里重试用尽仍失败（预览模型下线、持续 5xx、额度用完）时，按顺序降级到后面的模型。
+# 每个模型的调用数、失败率、延迟样本、估算 token 与费用写入 model_stats.json（跨运行保留，路由依据它），
+# 每次路由的候选、跳过原因、最终用了哪个模型、耗时和费用追加到 model_decisions.jsonl；
+# python model_router.py 汇总这两份数据，用来调整档位和预算。
+# 不改代码调整策略：MODEL_POLICY 指向的 JSON（默认 model_policy.json，存在才读）里的 tasks / prices 覆盖默认值。
+
+STATS_FILE = "model_stats.json"
+DECISION_LOG = "model_decisions.jsonl"
+DECISION_LOG_KEEP = 2000                                        # 决策日志最多保留的行数
+POLICY_FILE = os.environ.get("MODEL_POLICY", "model_policy.json")
+RUN_COST_BUDGET = float(os.environ.get("MODEL_COST_BUDGET", 0))   # 每次运行的估算费用上限（美元）
+MAX_FAILURE_RATE = 0.5          # 失败率（指数平均）超过它的模型先跳过
+FAILURE_EWMA = 0.2
+MIN_SAMPLES = 5                 # 样本少于这么多时不按延迟/失败率跳过
+# 因延迟或失败被跳过的模型每隔这么久（秒）放行一次调用当作探测，用新样本判断是否恢复；
+# 探测时间记在 model_stats.json 里跨运行生效，05_pipeline 每 2 小时一轮，默认约每 3 轮探测一次
+PROBE_INTERVAL = int(os.environ.get("MODEL_PROBE_INTERVAL", 6 * 3600))
+LATENCY_WINDOW = 50             # 每个模型保留的最近延迟样本数
+DEFAULT_OUTPUT_TOKENS = 2000    # 还没有样本时，估算费用用的响应 token 数
+
+# 每百万 token 的美元价格 (输入, 输出)，按官方价目表填写；价格调整时改这里或 model_policy.json
+PRICES = {
+    "gemini-3-flash-preview": (0.50, 3.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.0-flash-exp": (0.10, 0.40),
+}
+
+# 任务 -> tiers：按质量从高到低的模型档（后面的档就是降级链）；max_latency：延迟预算（秒，按近期 p95）
+TASKS = {
+    "editor":         {"tiers": [["gemini-3-flash-preview"], ["gemini-2.5-flash"]], "max_latency": 240},
+    "comments.smart": {"tiers": [["gemini-3-flash-preview"], ["gemini-2.5-flash"]], "max_latency": 120},
+    "comments.cheap": {"tiers": [["gemini-2.5-flash"], ["gemini-2.5-flash-lite"]], "max_latency": 120},
+    "boardroom":      {"tiers": [["gemini-2.0-flash-exp"], ["gemini-2.5-flash"]], "max_latency": 240},
+}
+
+
+def load_policy(path=POLICY_FILE):
+    """
+    默认策略叠加策略文件里的 tasks / prices，返回 (tasks, prices)；文件不存在或格式错误时用默认值
+    """
+    tasks = {name: dict(policy) for name, policy in TASKS.items()}
+    prices = dict(PRICES)
+    if not path or not os.path.exists(path): return tasks, prices
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            custom = json.load(f)
+        for name, policy in custom.get("tasks", {}).items():
+            tasks[name] = dict(tasks.get(name, {}), **policy)
+        prices.update({model: tuple(price) for model, price in custom.get("prices", {}).items()})
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        print(f"⚠️ 模型策略文件 {path} 无法解析，使用默认策略: {e}")
+    return tasks, prices
+
+
+def _new_stats():
+    return {"calls": 0, "responses": 0, "success": 0, "failures": 0, "rate_limited": 0, "malformed": 0,
+            "failure_rate": 0.0, "latencies": [], "input_tokens": 0, "output_tokens": 0, "cost": 0.0,
+            "last_call": 0.0, "last_probe": 0.0, "last_used": None}
+
+
+def p95(samples):
+    if not samples: return None
+    samples = sorted(samples)
+    return samples[int(0.95 * (len(samples) - 1))]
+
+
+class ModelRouter:
+    def __init__(self, stats_file=STATS_FILE, policy_file=POLICY_FILE, cost_budget=RUN_COST_BUDGET):
+        self.stats_file = stats_file
+        self.tasks, self.prices = load_policy(policy_file)
+        self.cost_budget = cost_budget
+        self.lock = threading.Lock()
+        self.spent = 0.0          # 本次运行（进程）的估算费用
+        self.decisions = []       # 尚未写入 DECISION_LOG 的决策
+        self.used = set()         # 本次运行调用过的模型
+        saved = self._load_saved()
+        self.stats = {}
+        for model in set(saved) | {m for task in self.tasks.values() for tier in task["tiers"] for m in tier}:
+            stats = _new_stats()
+            stats.update(saved.get(model, {}))
+            self.stats[model] = stats
+
+    def _load_saved(self):
+        if not os.path.exists(self.stats_file): return {}
+        try:
+            with open(self.stats_file, "r", encoding="utf-8") as f:
+                return json.load(f).get("models", {})
+        except (OSError, ValueError):
+            return {}
+
+    # ================= 🧮 路由 =================
+    def estimate_cost(self, model, input_tokens, output_tokens=None):
+        if output_tokens is None:
+            s = self.stats.get(model)
+            output_tokens = s["output_tokens"] / s["responses"] if s and s["responses"] else DEFAULT_OUTPUT_TOKENS
+        price_in, price_out = self.prices.get(model, (0.0, 0.0))
+        return (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+    def _skip_reason(self, model, max_latency, cost):
+        """
+        返回跳过原因；满足预算返回 None。因延迟/失败本该跳过、但到了探测时间的模型返回 "probe:<原因>" 并放行
+        """
+        s = self.stats.setdefault(model, _new_stats())
+        if self.cost_budget and self.spent + cost > self.cost_budget: return "cost"
+        latency = p95(s["latencies"])
+        if max_latency and len(s["latencies"]) >= MIN_SAMPLES and latency > max_latency: reason = "latency"
+        elif s["calls"] >= MIN_SAMPLES and s["failure_rate"] > MAX_FAILURE_RATE: reason = "failures"
+        else: return None
+        now = time.time()
+        if now - s.get("last_probe", 0.0) < PROBE_INTERVAL: return reason
+        s["last_probe"] = now
+        return f"probe:{reason}"
+
+    def route(self, task, prompt):
+        """
+        返回 (按尝试顺序排列的模型, {被跳过或按探测放行的模型: 原因}, 首选模型的估算费用)
+        """
+        policy = self.tasks[task]
+        input_tokens = estimate_tokens(prompt)
+        chain, skipped, costs = [], {}, {}
+        with self.lock:
+            for tier in policy["tiers"]:
+                eligible = []
+                for model in tier:
+                    costs[model] = self.estimate_cost(model, input_tokens)
+                    reason = self._skip_reason(model, policy.get("max_latency"), costs[model])
+                    if reason: skipped[model] = reason
+                    if not reason or reason.startswith("probe:"): eligible.append(model)
+                chain.extend(sorted(eligible, key=lambda m: costs[m]))
+        if not chain:
+            # 没有模型满足预算：按估算费用从低到高试，宁可降级也不让整个任务失败
+            chain = sorted(costs, key=lambda m: costs[m])
+        return chain, skipped, costs[chain[0]]
+
+    # ================= 📊 观测 =================
+    def record_response(self, model, latency, prompt, text, stage=None):
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text or "")
+        cost = self.estimate_cost(model, input_tokens, output_tokens)
+        with self.lock:
+            s = self.stats.setdefault(model, _new_stats())
+            self._touch(s, model)
+            s["responses"] += 1
+            s["latencies"] = (s["latencies"] + [round(latency, 3)])[-LATENCY_WINDOW:]
+            s["input_tokens"] += input_tokens
+            s["output_tokens"] += output_tokens
+            s["cost"] = round(s["cost"] + cost, 6)
+            self.spent += cost
+        metrics.inc("model_cost_usd", cost, stage=stage, model=model)
+        return cost
+
+    def record_outcome(self, model, kind, no_response=False):
+        """
+        kind 为 ok 或 retry_policy 的错误分类；no_response 表示请求本身失败（没经过 record_response，这里补记调用数）。
+        429 是 Key 的额度问题，不计入模型失败率
+        """
+        with self.lock:
+            s = self.stats.setdefault(model, _new_stats())
+            if no_response: self._touch(s, model)
+            if kind == retry_policy.QUOTA:
+                s["rate_limited"] += 1
+                return
+            if kind == "ok": s["success"] += 1
+            else: s["malformed" if kind == retry_policy.MALFORMED else "failures"] += 1
+            s["failure_rate"] = round((1 - FAILURE_EWMA) * s["failure_rate"] + FAILURE_EWMA * (kind != "ok"), 4)
+
+    def _touch(self, s, model):
+        s["calls"] += 1
+        s["last_call"] = time.time()
+        s["last_used"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.used.add(model)
+
+    def _observed(self, stage, model, prompt, send, parse, tally):
+        """
+        包一层 send / parse：每次实际请求的延迟、token、费用和成败都记到该模型名下（对冲的那份也算），
+        费用同时累加到 tally["cost"]（这一次 call 花了多少，写进决策日志）
+        """
+        def observed_send(client):
+            start = time.perf_counter()
+            try:
+                raw = send(client, model)
+            except Exception as e:
+                self.record_outcome(model, retry_policy.classify(e), no_response=True)
+                raise
+            text = raw[0] if isinstance(raw, tuple) else raw
+            cost = self.record_response(model, time.perf_counter() - start, prompt, text, stage)
+            with self.lock:
+                tally["cost"] += cost
+            if parse is None: self.record_outcome(model, "ok")
+            return raw
+
+        def observed_parse(raw):
+            try:
+                result = parse(raw)
+            except Exception as e:
+                self.record_outcome(model, retry_policy.classify(e))
+                raise
+            self.record_outcome(model, "ok")
+            return result
+
+        return observed_send, observed_parse if parse else None
+
+    def _log(self, task, stage, label, chain, skipped, model, outcome, seconds, cost, error=None):
+        record = {"time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "run": metrics.RUN_ID, "task": task,
+                  "stage": stage, "label": label, "chain": chain, "skipped": skipped, "model": model,
+                  "outcome": outcome, "seconds": round(seconds, 3), "cost": round(cost, 6)}
+        if error is not None: record["error"] = str(error)[:200]
+        with self.lock:
+            self.decisions.append(record)
+        metrics.inc("model_routes_total", stage=stage, task=task, model=model or "-", outcome=outcome)
+
+    # ================= 📞 调用 =================
+    def call(self, task, stage, prompt, send, pool, parse=None, label=None, gen_config=None, **acquire_args):
+        """
+        按路由结果依次尝试模型，返回 (模型, 响应文本, 解析结果, 是否来自缓存)。
+        send(client, model) 发请求；单个模型内的分类重试、预算和对冲交给 retry_policy.call，
+        重试用尽仍失败时降级到下一个模型（没有可用 Key 时直接失败）。
+        传入 gen_config 时先按路由顺序查响应缓存，写缓存仍由调用方决定（只缓存完整的响应）
+        """
+        label = label or task
+        chain, skipped, _ = self.route(task, prompt)
+        start = time.perf_counter()
+        if gen_config is not None:
+            model, text = llm_cache.get_any(chain, prompt, gen_config)
+            if text is not None:
+                print(f"🗃️ {label}: 命中缓存 ({model})，跳过 API 调用。")
+                metrics.observe_model_call(stage, model, "cache_hit", prompt=prompt)
+                self._log(task, stage, label, chain, skipped, model, "cache_hit", 0.0, 0.0)
+                return model, text, parse(text) if parse else text, True
+
+        error, tally = None, {"cost": 0.0}
+        for i, model in enumerate(chain):
+            if i:
+                print(f"↘️ {label}: {chain[i - 1]} 不可用，降级到 {model}")
+                metrics.inc("model_fallbacks_total", stage=stage, task=task, model=model)
+            observed_send, observed_parse = self._observed(stage, model, prompt, send, parse, tally)
+            try:
+                text, result = retry_policy.call(stage, model, prompt, observed_send, pool, parse=observed_parse,
+                                                 label=label, **acquire_args)
+            except Exception as e:
+                error = e
+                if isinstance(e, retry_policy.NoKeyAvailable): break
+                continue
+            self._log(task, stage, label, chain, skipped, model, "ok" if i == 0 else "fallback",
+                      time.perf_counter() - start, tally["cost"])
+            return model, text, result, False
+        self._log(task, stage, label, chain, skipped, None, "error", time.perf_counter() - start, tally["cost"], error)
+        raise error
+
+    # ================= 💾 持久化 =================
+    def save_stats(self):
+        """
+        模型统计与已有文件合并后写回，积累的决策追加到决策日志
+        """
+        with self.lock:
+            merged = self._load_saved()
+            merged.update({m: dict(s) for m, s in self.stats.items() if s["calls"]})
+            decisions, self.decisions = self.decisions, []
+        data = {"updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "models": merged}
+        atomic_io.write_json(self.stats_file, data)
+        if not decisions: return
+        decisions = decisions[-DECISION_LOG_KEEP:]
+        keep = max(0, DECISION_LOG_KEEP - len(decisions))   # [-0:] 会取到整个列表，所以 keep 为 0 时不读旧行
+        lines = []
+        if keep and os.path.exists(DECISION_LOG):
+            with open(DECISION_LOG, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()[-keep:]
+        lines.extend(json.dumps(d, ensure_ascii=False) for d in decisions)
+        atomic_io.write_text(DECISION_LOG, "\n".join(lines) + "\n")
+
+    def print_stats(self):
+        for model in sorted(self.used):
+            s = self.stats[model]
+            latency = p95(s["latencies"])
+            print(f"🧭 {model:<24} 调用 {s['calls']:>4}  失败率 {s['failure_rate']:.0%}  "
+                  f"p95 {latency or 0:.1f}s  累计估算费用 ${s['cost']:.4f}")
+        if self.used:
+            budget = f" / 预算 ${self.cost_budget:g}" if self.cost_budget else ""
+            print(f"🧭 本次运行估算费用 ${self.spent:.4f}{budget}")
+
+
+_ROUTER = None
+_ROUTER_LOCK = threading.Lock()
+
+
+def get_router():
+    global _ROUTER
+    with _ROUTER_LOCK:
+        if _ROUTER is None:
+            _ROUTER = ModelRouter()
+        return _ROUTER
+
+
+def finish_run():
+    """
+    阶段收尾（三个 AI 脚本和 replay.py 共用）：打印缓存 / Key 池 / 模型统计，并把 Key 与模型统计写回
+    """
+    llm_cache.print_stats()
+    pool = key_pool.get_pool()
+    pool.print_stats()
+    pool.save_stats()
+    router = get_router()
+    router.print_stats()
+    router.save_stats()
+
+
+def summarize(log_file=DECISION_LOG, stats_file=STATS_FILE):
+    """
+    按 任务 x 模型 汇总决策日志，再列出各模型的累计统计
+    """
+    rows = {}
+    if os.path.exists(log_file):
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    d = json.loads(line)
+                except ValueError:
+                    continue
+                r = rows.setdefault((d["task"], d.get("model") or "-"), {"n": 0, "fallback": 0, "error": 0,
+                                                                          "cache_hit": 0, "seconds": 0.0, "cost": 0.0})
+                r["n"] += 1
+                if d["outcome"] in r: r[d["outcome"]] += 1
+                r["seconds"] += d.get("seconds", 0.0)
+                r["cost"] += d.get("cost", 0.0)
+    print(f"{'task':<16}{'model':<26}{'calls':>6}{'fallback':>9}{'error':>6}{'cache':>6}{'avg(s)':>8}{'cost($)':>10}")
+    for (task, model), r in sorted(rows.items()):
+        print(f"{task:<16}{model:<26}{r['n']:>6}{r['fallback']:>9}{r['error']:>6}{r['cache_hit']:>6}"
+              f"{r['seconds'] / r['n']:>8.1f}{r['cost']:>10.4f}")
+
+    router = ModelRouter(stats_file=stats_file)
+    print(f"\n{'model':<26}{'calls':>6}{'fail%':>7}{'429':>5}{'bad':>5}{'p95(s)':>8}{'out tok':>9}{'$/call':>9}")
+    for model, s in sorted(router.stats.items()):
+        if not s["calls"]: continue
+        per_call = s["cost"] / s["responses"] if s["responses"] else 0.0
+        out_tokens = s["output_tokens"] / s["responses"] if s["responses"] else 0
+        print(f"{model:<26}{s['calls']:>6}{s['failure_rate']:>7.0%}{s['rate_limited']:>5}{s['malformed']:>5}"
+              f"{p95(s['latencies']) or 0:>8.1f}{out_tokens:>9.0f}{per_call:>9.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="汇总模型路由的决策日志和各模型统计")
+    parser.add_argument("--log", default=DECISION_LOG)
+    parser.add_argument("--stats", default=STATS_FILE)
+    args = parser.parse_args()
+    summarize(args.log, args.stats)
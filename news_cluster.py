@@ -0,0 +1,170 @@
+import json
+import os
+import random
+import zlib
+from datetime import datetime
+
+import atomic_io
+from title_matcher import normalize_title
+
+# ================= 🧩 跨源近似重复聚类 =================
+# 同一条快讯会同时出现在 cls-telegraph / wallstreetcn-quick / jin10 / 36kr-quick 等源，
+# 只是措辞略有不同。这里在 crawl.py 分类之后把它们聚成簇：
+#   1. 归一化标题切成字符 shingle（中文不需要分词）
+#   2. MinHash 签名 + LSH 分桶召回候选对，避免两两比较
+#   3. 候选对再用真实 Jaccard 校验，并查集合并成簇
+# 每个簇给出代表标题、成员链接和来源数（来源数本身就是“热度”信号）。
+# 结果写入 data_clusters.json，只保存跨条目的簇，单条新闻不重复存储。
+
+CLUSTER_FILE = "data_clusters.json"
+
+SHINGLE_SIZE = 2          # 字符 shingle 长度，中文标题用二元组召回率最好
+NUM_PERM = 64             # MinHash 签名长度
+BANDS = 16                # LSH 分段数，每段 NUM_PERM // BANDS 行
+JACCARD_THRESHOLD = 0.5   # 候选对的 shingle Jaccard 达到该值才合并
+MIN_CHARS = 6             # 归一化后太短的标题（如热搜词）只做精确合并
+MAX_BUCKET = 50           # 过大的桶通常是模板化标题（如“XX收盘”），跳过
+
+_MERSENNE = (1 << 61) - 1
+
+
+class MinHasher:
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.perms = [(rng.randrange(1, _MERSENNE), rng.randrange(0, _MERSENNE)) for _ in range(num_perm)]
+
+    def signature(self, hashes):
+        return [min([(a * h + b) % _MERSENNE for h in hashes]) for a, b in self.perms]
+
+
+def shingles(norm, size=SHINGLE_SIZE):
+    if len(norm) <= size: return {norm} if norm else set()
+    return {norm[i:i + size] for i in range(len(norm) - size + 1)}
+
+
+def _jaccard(a, b):
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter) if inter else 0.0
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_items(platforms, threshold=JACCARD_THRESHOLD, hasher=None, bands=BANDS):
+    """
+    对一个分类下的全部平台条目聚类，返回簇列表（按来源数、条目数降序）：
+    {"title": 代表标题, "source_count": 来源数, "sources": [...], "members": [{"id","title","url"}]}
+    """
+    hasher = hasher or MinHasher()
+    rows = len(hasher.perms) // bands
+
+    entries = []   # (site_id, title, url, norm)
+    for platform in platforms or []:
+        site_id = platform.get('id', 'unknown')
+        for item in platform.get('items', []):
+            title = (item.get('title') or '').strip()
+            norm = normalize_title(title)
+            if norm: entries.append((site_id, title, item.get('url', ''), norm))
+
+    parent = list(range(len(entries)))
+    grams = [None] * len(entries)
+    exact = {}
+    buckets = {}
+    for i, (_, _, _, norm) in enumerate(entries):
+        # 归一化后完全相同的直接合并
+        if norm in exact:
+            parent[i] = exact[norm]
+            continue
+        exact[norm] = i
+        if len(norm) < MIN_CHARS: continue
+
+        grams[i] = shingles(norm)
+        sig = hasher.signature([zlib.crc32(g.encode("utf-8")) for g in grams[i]])
+        for band in range(bands):
+            key = (band, tuple(sig[band * rows:(band + 1) * rows]))
+            buckets.setdefault(key, []).append(i)
+
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2 or len(members) > MAX_BUCKET: continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                i, j = members[x], members[y]
+                if (i, j) in checked: continue
+                checked.add((i, j))
+                ri, rj = _find(parent, i), _find(parent, j)
+                if ri != rj and _jaccard(grams[i], grams[j]) >= threshold:
+                    parent[max(ri, rj)] = min(ri, rj)
+
+    groups = {}
+    for i in range(len(entries)):
+        groups.setdefault(_find(parent, i), []).append(i)
+
+    clusters = []
+    for idxs in groups.values():
+        sources = []
+        for i in idxs:
+            if entries[i][0] not in sources: sources.append(entries[i][0])
+        clusters.append({
+            "title": entries[_canonical(idxs, grams, entries)][1],
+            "source_count": len(sources),
+            "sources": sources,
+            "members": [{"id": entries[i][0], "title": entries[i][1], "url": entries[i][2]} for i in idxs],
+        })
+    clusters.sort(key=lambda c: (-c["source_count"], -len(c["members"])))
+    return clusters
+
+
+def _canonical(idxs, grams, entries):
+    """
+    代表标题取与其他成员平均相似度最高的那条（簇中心），并列时取最先出现的
+    """
+    if len(idxs) <= 2: return idxs[0]
+    best, best_score = idxs[0], -1.0
+    for i in idxs:
+        gi = grams[i] or shingles(entries[i][3])
+        score = sum(_jaccard(gi, grams[j] or shingles(entries[j][3])) for j in idxs if j != i)
+        if score > best_score:
+            best, best_score = i, score
+    return best
+
+
+def cluster_sectors(categorized_data, threshold=JACCARD_THRESHOLD):
+    hasher = MinHasher()
+    return {cat: cluster_items(platforms, threshold, hasher) for cat, platforms in categorized_data.items()}
+
+
+def save_clusters(clusters_by_sector, path=CLUSTER_FILE):
+    """
+    只保存成员数 > 1 的簇；每个板块额外记录条目总数和簇总数，方便看压缩比
+    """
+    data = {"generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "sectors": {}}
+    for cat, clusters in clusters_by_sector.items():
+        data["sectors"][cat] = {
+            "items": sum(len(c["members"]) for c in clusters),
+            "clusters": len(clusters),
+            "merged": [c for c in clusters if len(c["members"]) > 1],
+        }
+    atomic_io.write_json(path, data, compact=True)   # 只给 ai_editor 读
+    return data
+
+
+def load_clusters(sector, path=CLUSTER_FILE):
+    """
+    返回 {标题: (簇编号, 来源数)}，只包含被合并过的标题；没有聚类文件时返回 None
+    """
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            merged = json.load(f).get("sectors", {}).get(sector, {}).get("merged", [])
+    except (OSError, ValueError):
+        return None
+    lookup = {}
+    for idx, cluster in enumerate(merged):
+        for member in cluster["members"]:
+            lookup.setdefault(member["title"], (idx, cluster["source_count"]))
+    return lookup
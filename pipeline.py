@@ -0,0 +1,214 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import atomic_io
+import metrics
+
+# ================= 🛠️ 单进程流水线 =================
+# 取代 01~04 四个错开 10 分钟的定时任务：在一个进程里按依赖关系跑
+#   crawl -> (trends -> editor | comments | boardroom) -> archive -> bundles
+# 没有相互依赖的阶段并发执行；输入文件内容哈希与上次成功运行一致的阶段直接跳过。
+# 阶段函数抛异常记为 error（下游跳过）；返回 False 记为 incomplete（下游照常，但不记哈希，下一轮重跑）。
+
+STATE_FILE = "pipeline_state.json"
+RUN_LOG = "pipeline_runs.jsonl"
+RUN_LOG_KEEP = 500  # 运行日志最多保留的行数
+
+RAW_FILES = ["data_finance.json", "data_global.json", "data_tech.json", "data_general.json"]
+REPORT_FILES = ["strategy_finance.md", "strategy_global.md", "strategy_tech.md", "strategy_general.md"]
+ANALYSIS_FILES = ["analysis_finance.json", "analysis_global.json", "analysis_tech.json", "analysis_general.json"]
+COMMENT_FILES = ["comments_finance.json", "comments_global.json", "comments_tech.json", "comments_general.json"]
+TREND_FILES = ["trends_finance.json", "trends_global.json", "trends_tech.json", "trends_general.json"]
+
+
+def run_crawl():
+    import crawl
+    if not crawl.run_spider():
+        raise RuntimeError("抓取失败，根目录仍是上一轮数据")
+
+
+def run_trends():
+    import trend_engine
+    trend_engine.update_trends()
+
+
+def run_editor():
+    import ai_editor
+    results = ai_editor.run_editor()
+    failed = [key for key, (status, _) in results.items() if status == "error"]
+    if failed:
+        raise RuntimeError(f"板块生成失败: {', '.join(failed)}")
+    # partial（流式截断后抢救的结果）和 skipped（没有 Key / 没有输入）都不算完成
+    unfinished = [key for key, (status, _) in results.items() if status not in ("ok", "unchanged")]
+    if unfinished:
+        print(f"⚠️ [editor] 未完成的板块: {', '.join(unfinished)}，下一轮重新生成。")
+        return False
+
+
+def run_comments():
+    import ai_comments
+    timings = ai_comments.run_comments()
+    failed = sorted(f"{key}#{idx}" for key, idx, _, _, count, *_ in timings if not count)
+    if failed:
+        raise RuntimeError(f"评论分片生成失败: {', '.join(failed)}")
+
+
+def run_boardroom():
+    import ai_boardroom
+    failed = ai_boardroom.run_boardroom(archive=False)
+    if failed:
+        raise RuntimeError(f"董事会报告生成失败: {', '.join(failed)}")
+
+
+def run_archive():
+    import archive_manager
+    archive_manager.init_dirs()
+    archive_manager.archive_daily_data(RAW_FILES)
+    archive_manager.update_history_index()
+    metrics.flush("archive")
+
+
+def run_bundles():
+    import archive_manager
+    archive_manager.build_bundles()
+    metrics.flush("archive")
+
+
+# deps：必须先完成的阶段；inputs：用于判断“输入是否变化”的文件（空列表表示每次都跑）；
+# daily：按日期落盘的阶段，日期也算输入，数据没变但跨了零点时照样要写当天的归档和索引
+STAGES = {
+    "crawl":     {"deps": [],                       "inputs": [],        "run": run_crawl},
+    "trends":    {"deps": ["crawl"],                "inputs": RAW_FILES, "run": run_trends},
+    "editor":    {"deps": ["crawl", "trends"],      "inputs": RAW_FILES, "run": run_editor},
+    "comments":  {"deps": ["crawl"],                "inputs": RAW_FILES, "run": run_comments},
+    "boardroom": {"deps": ["crawl"],                "inputs": RAW_FILES, "run": run_boardroom},
+    "archive":   {"deps": ["crawl", "boardroom"],   "inputs": RAW_FILES + REPORT_FILES, "daily": True, "run": run_archive},
+    "bundles":   {"deps": ["archive", "editor", "comments", "trends"],
+                  "inputs": RAW_FILES + REPORT_FILES + ANALYSIS_FILES + COMMENT_FILES + TREND_FILES, "daily": True,
+                  "run": run_bundles},
+}
+
+
+def hash_inputs(paths, date=None):
+    if not paths: return None
+    digest = hashlib.sha256()
+    if date: digest.update(date.encode("utf-8"))
+    for path in sorted(paths):
+        digest.update(path.encode("utf-8"))
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update(b"<missing>")
+    return digest.hexdigest()
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE): return {}
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    atomic_io.write_json(STATE_FILE, state, compact=True)
+
+
+def append_run_log(record):
+    lines = []
+    if os.path.exists(RUN_LOG):
+        with open(RUN_LOG, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()[-(RUN_LOG_KEEP - 1):]
+    lines.append(json.dumps(record, ensure_ascii=False))
+    atomic_io.write_text(RUN_LOG, "\n".join(lines) + "\n")
+
+
+def run_stage(name, state, force):
+    """
+    执行单个阶段，返回 (状态, 耗时, 输入哈希)
+    """
+    stage = STAGES[name]
+    input_hash = hash_inputs(stage["inputs"], datetime.now().strftime("%Y-%m-%d") if stage.get("daily") else None)
+    if not force and input_hash and state.get(name) == input_hash:
+        print(f"⏭️ [{name}] 输入未变化，跳过。")
+        return "skipped", 0.0, input_hash
+
+    print(f"▶️ [{name}] 开始...")
+    start = time.perf_counter()
+    try:
+        status = "incomplete" if stage["run"]() is False else "ok"
+    except Exception as e:
+        print(f"❌ [{name}] 失败: {e}")
+        status = "error"
+    elapsed = time.perf_counter() - start
+    metrics.observe("stage_seconds", elapsed, "pipeline", step=name, status=status)
+    print(f"⏹️ [{name}] {status}，耗时 {elapsed:.1f}s")
+    return status, elapsed, input_hash
+
+
+def run_pipeline(selected=None, force=False, max_workers=4):
+    """
+    按依赖关系调度各阶段；未被选中的依赖视为已满足，失败阶段的下游全部跳过
+    """
+    selected = list(STAGES) if not selected else [s for s in STAGES if s in selected]
+    state = load_state()
+    results = {}
+    pending = set(selected)
+    running = {}
+    run_start = time.perf_counter()
+    started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def deps_of(name):
+        return [d for d in STAGES[name]["deps"] if d in selected]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name in sorted(pending):
+                deps = deps_of(name)
+                if any(results.get(d, {}).get("status") in ("error", "blocked") for d in deps):
+                    results[name] = {"status": "blocked", "seconds": 0.0}
+                    pending.discard(name)
+                    print(f"⛔ [{name}] 上游失败，跳过。")
+                elif all(d in results for d in deps):
+                    running[pool.submit(run_stage, name, state, force)] = name
+                    pending.discard(name)
+
+            if not running: continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status, elapsed, input_hash = future.result()
+                results[name] = {"status": status, "seconds": round(elapsed, 3)}
+                if status == "ok" and input_hash:
+                    # 输入哈希在阶段运行前计算，只有成功后才记下
+                    state[name] = input_hash
+                elif status in ("error", "incomplete"):
+                    # 旧记录也作废：数据若变回上次成功时的样子，不能因此跳过这一轮没做完的工作
+                    state.pop(name, None)
+
+    save_state(state)
+    total = time.perf_counter() - run_start
+    metrics.flush("pipeline")
+    append_run_log({"started": started_at, "total_seconds": round(total, 3), "stages": results})
+
+    print("⏱️ 流水线耗时:")
+    for name in selected:
+        r = results.get(name, {})
+        print(f"   {name:<10} {r.get('status', '-'):<8} {r.get('seconds', 0):7.1f}s")
+    print(f"⏱️ 总耗时: {total:.1f}s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="单进程流水线：抓取 -> AI 阶段 -> 归档")
+    parser.add_argument("--stages", default=None, help="只运行指定阶段，逗号分隔，如 editor,comments")
+    parser.add_argument("--force", action="store_true", help="忽略输入哈希，强制运行")
+    args = parser.parse_args()
+    run_pipeline(args.stages.split(",") if args.stages else None, force=args.force)
@@ -0,0 +1,87 @@
+import hashlib
+import re
+import threading
+import time
+
+# ================= 🚦 按 Key 的令牌桶限速 =================
+# 每个 API Key 一个令牌桶：平时按配额匀速放行，真正遇到 429 时才整体退避，
+# 取代各脚本里硬编码的 time.sleep。
+
+DEFAULT_RPM = 10      # 每个 Key 每分钟请求数
+DEFAULT_BURST = 2     # 允许的瞬时突发请求数
+
+_RETRY_DELAY_RE = re.compile(r"retry[_ ]?delay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE)
+
+
+class TokenBucket:
+    def __init__(self, rpm=DEFAULT_RPM, burst=DEFAULT_BURST):
+        self.rate = rpm / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        阻塞直到拿到一个令牌，返回等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def backoff(self, seconds):
+        """
+        收到 429 后暂停该 Key 的所有请求；积攒的突发令牌作废，只留一个给退避结束后的重试
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = min(self.tokens, 1.0)
+
+
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+def get_bucket(api_key, rpm=None, burst=None):
+    """
+    同一个 Key 值共享同一个桶（多个板块回退到 GOOGLE_API_KEY 时也会被合并限速）。
+    rpm/burst 不传时读取模块级默认值，便于压测脚本整体调高
+    """
+    bucket_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+    with _BUCKETS_LOCK:
+        if bucket_id not in _BUCKETS:
+            _BUCKETS[bucket_id] = TokenBucket(rpm or DEFAULT_RPM, burst or DEFAULT_BURST)
+        return _BUCKETS[bucket_id]
+
+
+def is_rate_limited(error):
+    error_str = str(error)
+    return "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+
+
+def retry_delay_from_error(error, default):
+    """
+    优先使用服务端在 429 中给出的 retryDelay，否则用调用方给的默认值
+    """
+    match = _RETRY_DELAY_RE.search(str(error))
+    if match:
+        return float(match.group(1))
+    return default
@@ -0,0 +1,196 @@
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import ai_boardroom
+import ai_comments
+import ai_editor
+import archive_manager
+import atomic_io
+import history_store
+import input_builder
+import key_pool
+import llm_cache
+import metrics
+import model_router
+import news_cluster
+from rate_limiter import TokenBucket
+
+# ================= ⏪ 历史回放 / 回填 =================
+# 对已归档的日期重新跑 AI 阶段，不用再把 history/YYYY-MM-DD/data_*.json 手工拷回根目录：
+#   输入  history/<日期>/data_*.json（history_store 后端时先还原到 .replay/<日期>/）
+#   输出  history/<日期>/analysis_*.json、comments_*.json、reports/<板块>_strategy.md
+# 根目录的最新文件不受影响。各阶段的 datetime.now() 换成注入的历史日期，prompt 里的日期与当天一致，
+# 也不看当前抓取的差量/升温词，整份数据重新处理。
+# 多个日期并发回放，所有模型调用在各 Key 自己的令牌桶之外再共用一个总令牌桶（REPLAY_RPM）。
+# 响应缓存按 prompt 命中：中途被杀或到了 --max-minutes 上限后重跑同一条命令，已完成的调用直接走缓存；
+# 改了 prompt 的阶段则整批重新生成。
+
+STAGES = ["editor", "comments", "boardroom"]
+WORKERS = int(os.environ.get("REPLAY_WORKERS", 2))       # 同时回放的日期数
+RPM = int(os.environ.get("REPLAY_RPM", 30))               # 所有 Key 合计每分钟请求数
+# 回填可能跨好几天分批跑完，缓存的有效期至少放宽到这么久
+CACHE_TTL = int(os.environ.get("REPLAY_CACHE_TTL", 14 * 24 * 3600))
+WORK_DIR = ".replay"                                      # 还原出的输入、当天的聚类
+CLOCK_TIME = (23, 59)                                     # 注入时钟：历史日期当天的这个时刻
+
+
+def day_clock(date):
+    return datetime.strptime(date, "%Y-%m-%d").replace(hour=CLOCK_TIME[0], minute=CLOCK_TIME[1])
+
+
+def date_range(start, end=None):
+    """
+    [start, end] 之间有归档的日期，按时间顺序
+    """
+    end = end or start
+    first, last = datetime.strptime(start, "%Y-%m-%d"), datetime.strptime(end, "%Y-%m-%d")
+    available = set(archive_manager.get_available_dates())
+    dates = []
+    while first <= last:
+        date = first.strftime("%Y-%m-%d")
+        if date in available: dates.append(date)
+        first += timedelta(days=1)
+    return dates
+
+
+def rebase(files_config, in_dir, out_dir, **extra):
+    """
+    复制一份阶段的 FILES_CONFIG，输入/输出换到历史目录
+    """
+    rebased = {}
+    for key, config in files_config.items():
+        config = dict(config, **extra)
+        config["in"] = os.path.join(in_dir, os.path.basename(config["in"]))
+        if "out" in config: config["out"] = os.path.join(out_dir, os.path.basename(config["out"]))
+        rebased[key] = config
+    return rebased
+
+
+def prepare_day(date):
+    """
+    准备某天的输入目录，返回 (输入目录, 聚类文件或 None)
+    """
+    day_dir = os.path.join(archive_manager.HISTORY_DIR, date)
+    work_dir = os.path.join(WORK_DIR, date)
+    in_dir = day_dir
+    names = [os.path.basename(cfg["in"]) for cfg in ai_editor.FILES_CONFIG.values()]
+    if not any(os.path.exists(os.path.join(day_dir, n)) for n in names) and date in history_store.list_dates():
+        history_store.restore_day(date, out_dir=work_dir)
+        in_dir = work_dir
+
+    if not ai_editor.USE_CLUSTERS: return in_dir, None
+    # 聚类是回放里最耗 CPU 的一步，输入没变时续跑直接复用上次的结果
+    inputs = [p for p in (os.path.join(in_dir, n) for n in names) if os.path.exists(p)]
+    cluster_file = os.path.join(work_dir, news_cluster.CLUSTER_FILE)
+    if os.path.exists(cluster_file) and all(os.path.getmtime(p) <= os.path.getmtime(cluster_file) for p in inputs):
+        return in_dir, cluster_file
+    categorized = {key: input_builder.load_platforms(os.path.join(in_dir, os.path.basename(cfg["in"]))) or []
+                   for key, cfg in ai_editor.FILES_CONFIG.items()}
+    os.makedirs(work_dir, exist_ok=True)
+    news_cluster.save_clusters(news_cluster.cluster_sectors(categorized), path=cluster_file)
+    return in_dir, cluster_file
+
+
+def replay_day(date, stages, deadline=None):
+    """
+    按顺序跑完某一天的各阶段，返回 {阶段: 结果摘要}；已过截止时间则返回 None（留给下次续跑）
+    """
+    if deadline and time.time() > deadline: return None
+    start = time.perf_counter()
+    now = day_clock(date)
+    out_dir = os.path.join(archive_manager.HISTORY_DIR, date)
+    in_dir, cluster_file = prepare_day(date)
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"⏪ {date}: 回放 {', '.join(stages)}（输入 {in_dir}）")
+
+    summary = {}
+    if "editor" in stages:
+        extra = {"clusters": cluster_file} if cluster_file else {}
+        results = ai_editor.process_sectors(ai_editor.DEFAULT_MODE, rebase(ai_editor.FILES_CONFIG, in_dir, out_dir, **extra), now)
+        summary["editor"] = ",".join(f"{k}:{status}" for k, (status, _) in results.items())
+    if "comments" in stages:
+        timings = ai_comments.process_sectors(files_config=rebase(ai_comments.FILES_CONFIG, in_dir, out_dir), now=now)
+        summary["comments"] = f"{sum(t[4] for t in timings)} 条"
+    if "boardroom" in stages:
+        reports = ai_boardroom.generate_reports(files_config=rebase(ai_boardroom.FILES_CONFIG, in_dir, out_dir), now=now)
+        report_dir = os.path.join(out_dir, "reports")
+        os.makedirs(report_dir, exist_ok=True)
+        for key, content in reports.items():
+            if content: atomic_io.write_text(os.path.join(report_dir, f"{key}_strategy.md"), content, stage="boardroom")
+        summary["boardroom"] = f"{sum(1 for c in reports.values() if c)}/{len(reports)} 份"
+
+    elapsed = time.perf_counter() - start
+    metrics.observe("replay_day_seconds", elapsed, "replay")
+    print(f"✅ {date}: 完成，用时 {elapsed:.1f}s")
+    return summary
+
+
+def run_replay(start, end=None, stages=None, workers=None, rpm=None, max_minutes=None):
+    """
+    回放 [start, end] 之间的全部归档日期，返回 (已完成 {日期: 摘要}, 未开始的日期)
+    """
+    stages = stages or STAGES
+    dates = date_range(start, end)
+    if not dates:
+        print(f"⚠️ {start} ~ {end or start} 之间没有归档数据。")
+        return {}, []
+    pool = key_pool.get_pool()
+    if not len(pool):
+        print("❌ 未检测到 API Key，无法回放。")
+        return {}, dates
+
+    if llm_cache.CACHE_ENABLED:
+        llm_cache.CACHE_TTL = max(llm_cache.CACHE_TTL, CACHE_TTL)
+    else:
+        print("⚠️ 响应缓存已关闭 (LLM_CACHE=0)，中断后重跑会重新调用模型。")
+    pool.global_bucket = TokenBucket(rpm or RPM)
+    deadline = time.time() + max_minutes * 60 if max_minutes else None
+    print(f"⏪ 回放 {len(dates)} 天 ({dates[0]} ~ {dates[-1]})，阶段 {', '.join(stages)}，"
+          f"并发 {workers or WORKERS}，总限速 {rpm or RPM} RPM")
+
+    run_start = time.perf_counter()
+    done = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers or WORKERS) as executor:
+            futures = {date: executor.submit(replay_day, date, stages, deadline) for date in dates}
+            for date, future in futures.items():
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    print(f"❌ {date}: 回放失败 ({e})")
+                    continue
+                if summary is not None: done[date] = summary
+    finally:
+        pool.global_bucket = None
+
+    remaining = [d for d in dates if d not in done]
+    if done:
+        archive_manager.update_history_index(sorted(done))
+        archive_manager.build_bundles(sorted(done))
+    print(f"⏱️ 回放耗时 {time.perf_counter() - run_start:.1f}s:")
+    for date, summary in sorted(done.items()):
+        print(f"   {date}  " + "  ".join(f"{stage} {result}" for stage, result in summary.items()))
+    if remaining:
+        print(f"⏸️ 未完成 {len(remaining)} 天: {', '.join(remaining)}，重新运行同一命令即可借助缓存续跑。")
+    model_router.finish_run()
+    metrics.flush("editor", "comments", "boardroom", "archive", "replay")
+    return done, remaining
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对历史日期重新运行 AI 阶段，结果写回 history/<日期>/")
+    parser.add_argument("--from", dest="start", required=True, help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", default=None, help="结束日期（含），默认与起始日期相同")
+    parser.add_argument("--stages", default=",".join(STAGES), help="逗号分隔，可选 editor,comments,boardroom")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="同时回放的日期数")
+    parser.add_argument("--rpm", type=int, default=RPM, help="所有 Key 合计每分钟请求数")
+    parser.add_argument("--max-minutes", type=float, default=None, help="到时后不再开始新的日期，剩余的下次续跑")
+    args = parser.parse_args()
+    selected = [s for s in args.stages.split(",") if s]
+    unknown = set(selected) - set(STAGES)
+    if unknown: parser.error(f"未知阶段: {', '.join(sorted(unknown))}")
+    _, left = run_replay(args.start, args.end, selected, args.workers, args.rpm, args.max_minutes)
+    raise SystemExit(1 if left else 0)
@@ -0,0 +1,261 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from rate_limiter import is_rate_limited, retry_delay_from_error
+
+# ================= 🔁 模型调用的统一重试策略 =================
+# 三个 AI 脚本的模型调用都经由 call()：取 Key -> 发请求 -> 解析，失败时先给错误分类再决定怎么重试：
+#   quota      429 / RESOURCE_EXHAUSTED：Key 进入冷却（尊重服务端给的 retryDelay / Retry-After），立即换 Key
+#   transient  5xx、连接被重置：指数退避 + 抖动后重试
+#   timeout    请求超时：同上，次数更少（超时本身已经很耗时）
+#   malformed  有响应但解析失败（JSON 不合法、内容为空）：退避后重新生成
+#   fatal      其他错误（参数错误、鉴权失败等）：不重试
+# 每个阶段每次运行共用一份重试预算（固定额度 + 请求数的一定比例），故障面大时尽快失败，
+# 不会把整轮运行拖到超时；回放几周数据时额度随请求数增长。
+# 对冲：请求耗时超过该阶段/模型近期延迟的 p95 仍未返回时，换一个 Key 再发一份，谁先成功用谁。
+
+QUOTA, TRANSIENT, TIMEOUT, MALFORMED, FATAL = "quota", "transient", "timeout", "malformed", "fatal"
+
+# 单次 call() 里每类错误最多重试的次数（不含第一次）
+MAX_RETRIES = {QUOTA: 3, TRANSIENT: 3, TIMEOUT: 2, MALFORMED: 2, FATAL: 0}
+BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 1.0))    # 第一次退避的上限（秒），之后逐次翻倍
+MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 30.0))
+RUN_BUDGET = int(os.environ.get("RETRY_BUDGET", 20))           # 每个阶段每次运行的重试 + 对冲固定额度
+BUDGET_RATIO = float(os.environ.get("RETRY_BUDGET_RATIO", 0.2))  # 另外每发起一次调用增加的额度
+
+HEDGE = os.environ.get("RETRY_HEDGE", "1") == "1"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 8                                           # 延迟样本太少时不对冲
+HEDGE_MIN_DELAY = float(os.environ.get("RETRY_HEDGE_MIN_DELAY", 5.0))   # 再快的模型也至少等这么久才对冲
+LATENCY_WINDOW = 100                                            # 每个阶段/模型保留的最近延迟样本数
+HEDGE_WORKERS = 32
+
+_STATUS_RE = re.compile(r"^\s*(\d{3})\b")
+
+
+class MalformedResponse(Exception):
+    """
+    模型有响应但内容不能用（JSON 不合法、为空、缺字段）
+    """
+
+
+class NoKeyAvailable(RuntimeError):
+    """
+    没有可用的 API Key（全部在冷却中或未配置）
+    """
+
+
+def _status_code(error):
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code is None: code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(code, int): return code
+    match = _STATUS_RE.match(str(error))
+    return int(match.group(1)) if match else None
+
+
+def classify(error):
+    """
+    把异常归到 quota / transient / timeout / malformed / fatal 之一
+    """
+    if isinstance(error, NoKeyAvailable): return FATAL
+    # 只认解析失败；其他 ValueError 多半是代码或参数问题，重新生成也没用
+    if isinstance(error, (MalformedResponse, json.JSONDecodeError)): return MALFORMED
+    if is_rate_limited(error): return QUOTA
+    text = str(error)
+    status = _status_code(error)
+    if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__ or status == 504 \
+            or "DEADLINE_EXCEEDED" in text or "timed out" in text.lower():
+        return TIMEOUT
+    if (status and 500 <= status < 600) or "UNAVAILABLE" in text or isinstance(error, ConnectionError):
+        return TRANSIENT
+    return FATAL
+
+
+def retry_after(error):
+    """
+    服务端建议的等待秒数：HTTP Retry-After 头，或 Gemini 错误体里的 retryDelay；都没有时返回 None
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass   # HTTP 日期格式很少见，交给下面的 retryDelay 或默认退避
+    return retry_delay_from_error(error, None)
+
+
+def backoff_delay(attempt, error=None):
+    """
+    第 attempt 次重试前的等待：full jitter 指数退避，服务端给了 Retry-After 时不少于它
+    """
+    delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+    hint = retry_after(error) if error is not None else None
+    return max(delay, min(hint, MAX_DELAY)) if hint is not None else delay
+
+
+# ================= 💰 每次运行的重试预算 =================
+class RetryBudget:
+    def __init__(self, reserve=RUN_BUDGET, ratio=BUDGET_RATIO):
+        self.reserve = reserve
+        self.ratio = ratio
+        self.calls = 0
+        self.used = 0
+        self.lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return int(self.reserve + self.ratio * self.calls)
+
+    def record_call(self):
+        with self.lock:
+            self.calls += 1
+
+    def spend(self):
+        with self.lock:
+            if self.used >= self.limit: return False
+            self.used += 1
+            return True
+
+
+_BUDGETS = {}
+_LATENCIES = {}
+_LOCK = threading.Lock()
+_EXECUTOR = None
+
+
+def get_budget(stage):
+    with _LOCK:
+        if stage not in _BUDGETS:
+            _BUDGETS[stage] = RetryBudget()
+        return _BUDGETS[stage]
+
+
+def reset():
+    """
+    清空预算和延迟样本（同一进程里开始新一轮运行时调用，压测脚本也用它）
+    """
+    with _LOCK:
+        _BUDGETS.clear()
+        _LATENCIES.clear()
+
+
+def _record_latency(stage, model, latency):
+    with _LOCK:
+        _LATENCIES.setdefault((stage, model), deque(maxlen=LATENCY_WINDOW)).append(latency)
+
+
+def hedge_delay(stage, model):
+    """
+    该阶段/模型近期延迟的 p95（不低于 HEDGE_MIN_DELAY）；样本不足或关闭对冲时返回 None
+    """
+    if not HEDGE: return None
+    with _LOCK:
+        samples = sorted(_LATENCIES.get((stage, model), ()))
+    if len(samples) < HEDGE_MIN_SAMPLES: return None
+    return max(HEDGE_MIN_DELAY, samples[int(HEDGE_QUANTILE * (len(samples) - 1))])
+
+
+def _executor():
+    global _EXECUTOR
+    with _LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _EXECUTOR
+
+
+# ================= 📞 调用 =================
+def _send(stage, model, prompt, send, pool, key_id, client):
+    """
+    在一个 Key 上发一次请求并把结果记到 Key 池和指标里；send 返回响应文本，或首项为文本的元组
+    """
+    start = time.perf_counter()
+    try:
+        raw = send(client)
+    except Exception as e:
+        latency = time.perf_counter() - start
+        kind = classify(e)
+        if kind == QUOTA:
+            pool.report_rate_limited(key_id, retry_after(e))
+            metrics.observe_model_call(stage, model, "rate_limited", latency)
+        else:
+            pool.report_failure(key_id)
+            metrics.observe_model_call(stage, model, "error" if kind == FATAL else kind, latency)
+        raise
+    latency = time.perf_counter() - start
+    pool.report_success(key_id, latency)
+    _record_latency(stage, model, latency)
+    text = raw[0] if isinstance(raw, tuple) else raw
+    metrics.observe_model_call(stage, model, "ok", latency, prompt, text or "")
+    return raw
+
+
+def _attempt(stage, model, prompt, send, pool, acquire_args, budget):
+    key_id, client = pool.acquire(**acquire_args)
+    if key_id is None: raise NoKeyAvailable("没有可用的 API Key（全部在冷却中）")
+    delay = hedge_delay(stage, model)
+    if delay is None:
+        return _send(stage, model, prompt, send, pool, key_id, client)
+
+    primary = _executor().submit(_send, stage, model, prompt, send, pool, key_id, client)
+    done, _ = wait([primary], timeout=delay)
+    candidates = acquire_args.get("candidates")
+    others = [k for k in (pool.resolve(candidates) if candidates is not None else pool.keys) if k != key_id]
+    if done or not others or not budget.spend(): return primary.result()
+    hedge_key, hedge_client = pool.acquire(**dict(acquire_args, exclude=[key_id], max_wait=0))
+    if hedge_key is None: return primary.result()
+
+    # 主请求超过 p95 还没回来：另一个 Key 再发一份，先成功的那份生效，另一份的结果丢弃
+    print(f"🪢 [{stage}] {model} 已等待 {delay:.1f}s，换 {hedge_key} 对冲...")
+    metrics.inc("model_hedges_total", stage=stage, model=model)
+    hedge = _executor().submit(_send, stage, model, prompt, send, pool, hedge_key, hedge_client)
+    pending, error = {primary, hedge}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge: metrics.inc("model_hedge_wins_total", stage=stage, model=model)
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def call(stage, model, prompt, send, pool, parse=None, label=None, **acquire_args):
+    """
+    带分类重试、预算和对冲地调用一次模型，返回 (响应文本, 解析结果)。
+    send(client) 发请求并返回响应文本（或首项为文本的元组，整个元组交给 parse）；
+    parse 把它转成结果，内容不能用时抛 MalformedResponse / json.JSONDecodeError。
+    acquire_args 原样传给 pool.acquire（preferred / candidates / api_version ...）。
+    不可重试、该类错误次数用完或预算耗尽时抛出最后一次的异常
+    """
+    label = label or stage
+    budget = get_budget(stage)
+    budget.record_call()
+    retries = {}
+    while True:
+        try:
+            raw = _attempt(stage, model, prompt, send, pool, acquire_args, budget)
+            result = parse(raw) if parse else raw
+            return (raw[0] if isinstance(raw, tuple) else raw), result
+        except Exception as e:
+            kind = classify(e)
+            if kind == MALFORMED: metrics.inc("malformed_responses_total", stage=stage, model=model)
+            count = retries.get(kind, 0)
+            if count >= MAX_RETRIES[kind]: raise
+            if not budget.spend():
+                print(f"🛑 {label}: 本轮重试预算 ({budget.limit} 次) 已用完，不再重试 ({kind}: {e})")
+                metrics.inc("retry_budget_exhausted_total", stage=stage)
+                raise
+            retries[kind] = count + 1
+            metrics.inc("model_retries_total", stage=stage, model=model, kind=kind)
+            # 429 的等待已经体现在 Key 冷却里，直接换 Key；其他错误先退避
+            delay = 0.0 if kind == QUOTA else backoff_delay(count, e)
+            print(f"🔁 {label}: {kind} 错误，{delay:.1f}s 后重试 ({retries[kind]}/{MAX_RETRIES[kind]}): {str(e)[:120]}")
+            if delay: time.sleep(delay)
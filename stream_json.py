@@ -0,0 +1,136 @@
+import json
+
+# ================= 🌊 容错的流式 JSON 解析 =================
+# 针对 ai_editor 的输出格式 {"summary": "...", "items": [{...}, {...}]}：
+# 边接收边扫描字符，items 数组里每个对象一闭合就立即解析出来；
+# 顶层的其他字段在值结束时记录下来。流被截断或整体 JSON 不合法时，
+# 已完成的条目和字段仍然可用，不必整次重试。
+# 开头的 ```json 之类的包裹字符会被跳过（第一个 "{" 之前的内容都忽略）。
+
+
+class StreamingJSONParser:
+    def __init__(self, array_key="items"):
+        self.array_key = array_key
+        self.buffer = []          # 已接收的全部字符（从第一个 "{" 开始）
+        self.items = []           # 已完整解析的数组元素
+        self.fields = {}          # 已完整解析的顶层字段
+        self.bad_items = 0        # 闭合了但解析失败的元素
+        self.done = False         # 顶层对象已闭合
+
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None  # 最近一个在顶层闭合的字符串（可能是键名）
+        self._key = None          # 当前顶层键
+        self._value_start = None
+        self._in_array = False    # 正在 array_key 对应的数组里
+        self._item_start = None
+
+    def feed(self, chunk):
+        """
+        喂入一段文本，返回这段文本里新完成的元素列表
+        """
+        new_items = []
+        for ch in chunk or "":
+            if self.done: break
+            if not self._started:
+                if ch != "{": continue
+                self._started = True
+            pos = len(self.buffer)
+            self.buffer.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None:
+                        self._last_string = "".join(self.buffer[self._string_start:pos + 1])
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = pos
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 2 and self._key is not None and self._value_start is None:
+                    self._value_start = pos
+                    self._in_array = ch == "[" and self._key == self.array_key
+                elif self._depth == 3 and self._in_array and ch == "{":
+                    self._item_start = pos
+            elif ch in "}]":
+                if self._depth == 3 and self._in_array and ch == "}" and self._item_start is not None:
+                    item = self._loads(self._item_start, pos + 1)
+                    if isinstance(item, dict):
+                        self.items.append(item)
+                        new_items.append(item)
+                    else:
+                        self.bad_items += 1
+                    self._item_start = None
+                self._depth -= 1
+                if self._depth == 1 and ch == "]":
+                    self._in_array = False
+                if self._depth == 0:
+                    self._end_value(pos)
+                    self.done = True
+            elif ch == ":" and self._depth == 1 and self._last_string is not None:
+                try:
+                    self._key = json.loads(self._last_string)
+                except ValueError:
+                    self._key = None
+                self._last_string = None
+                self._value_start = None
+            elif ch == "," and self._depth == 1:
+                self._end_value(pos)
+            elif self._depth == 1 and self._key is not None and self._value_start is None and not ch.isspace():
+                # 数字 / true / false / null
+                self._value_start = pos
+        return new_items
+
+    def _loads(self, start, end):
+        try:
+            return json.loads("".join(self.buffer[start:end]))
+        except ValueError:
+            return None
+
+    def _end_value(self, pos):
+        if self._key is not None and self._value_start is not None:
+            value = self._loads(self._value_start, pos)
+            if value is not None or "".join(self.buffer[self._value_start:pos]).strip() == "null":
+                self.fields[self._key] = value
+        self._key = None
+        self._value_start = None
+        self._last_string = None
+
+    @property
+    def complete(self):
+        """
+        顶层对象已闭合且整体是合法 JSON
+        """
+        return self.done and self._loads(0, len(self.buffer)) is not None
+
+    def result(self):
+        """
+        完整时返回原始解析结果；否则用已完成的字段和元素拼出一个尽量完整的对象
+        """
+        if self.done:
+            full = self._loads(0, len(self.buffer))
+            if isinstance(full, dict): return full
+        data = dict(self.fields)
+        data[self.array_key] = list(self.items)
+        return data
+
+
+def parse_tolerant(text, array_key="items"):
+    """
+    一次性解析完整文本：合法 JSON 原样返回，否则尽量抢救，返回 (结果, 是否完整)
+    """
+    parser = StreamingJSONParser(array_key)
+    parser.feed(text)
+    return parser.result(), parser.complete
@@ -0,0 +1,101 @@
+import re
+import unicodedata
+from collections import Counter
+from itertools import chain
+
+# ================= 🔗 标题 -> URL 索引匹配器 =================
+# 用于把 AI 改写过的新闻标题回填到原始链接。
+# 思路：归一化标题做精确哈希命中；未命中时用字符二元组(bigram)倒排索引召回候选，
+# 再按相似度打分取最高分，而不是像以前那样拿第一个子串命中的结果。
+
+# 低于该分数视为没有可靠匹配，调用方应回退为 "#"
+DEFAULT_MIN_SCORE = 0.35
+
+# 出现在过多标题中的 bigram 区分度太低（如 "中国"、"美国"），召回时跳过
+MAX_POSTING_RATIO = 0.1
+
+# 进入精确打分的候选数量上限
+MAX_CANDIDATES = 16
+
+_STRIP_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def normalize_title(title):
+    """
+    标题归一化：全半角统一、转小写、去掉空白和标点
+    """
+    if not title: return ""
+    title = unicodedata.normalize("NFKC", title).lower()
+    return _STRIP_RE.sub("", title)
+
+
+def title_bigrams(norm):
+    """
+    把归一化后的标题切成字符二元组集合，单字标题退化为单字
+    """
+    if len(norm) < 2: return {norm} if norm else set()
+    return {norm[i:i + 2] for i in range(len(norm) - 1)}
+
+
+class TitleMatcher:
+    """
+    对 load_and_simplify 返回的 url_lookup 一次性建索引，之后每次 match 只查候选集
+    """
+
+    def __init__(self, url_lookup, min_score=DEFAULT_MIN_SCORE):
+        self.min_score = min_score
+        self.exact = {}
+        self.entries = []
+        self.postings = {}
+
+        for raw_title, url in (url_lookup or {}).items():
+            norm = normalize_title(raw_title)
+            if not norm: continue
+            # 同一个归一化标题只保留第一条，和原字典插入顺序一致
+            if norm in self.exact: continue
+            self.exact[norm] = url
+            grams = title_bigrams(norm)
+            idx = len(self.entries)
+            self.entries.append((norm, url, len(grams)))
+            for g in grams:
+                self.postings.setdefault(g, []).append(idx)
+
+        self.max_posting = max(8, int(len(self.entries) * MAX_POSTING_RATIO))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def match(self, title):
+        """
+        返回 (url, score)。score 在 0~1 之间；没有达到 min_score 时返回 (None, 最高分)
+        """
+        norm = normalize_title(title)
+        if not norm: return None, 0.0
+
+        url = self.exact.get(norm)
+        if url is not None: return url, 1.0
+
+        grams = title_bigrams(norm)
+        postings = self.postings
+        max_posting = self.max_posting
+        counts = Counter(chain.from_iterable(
+            p for p in map(postings.get, grams) if p and len(p) <= max_posting
+        ))
+
+        best_idx, best_score = None, 0.0
+        q_size = len(grams)
+        # 只对共享 bigram 最多的少量候选精确打分
+        for idx, shared in counts.most_common(MAX_CANDIDATES):
+            raw_norm, _, r_size = self.entries[idx]
+            # Dice 系数衡量整体相似；重叠系数照顾“一方是另一方子串”的情况
+            dice = 2.0 * shared / (q_size + r_size)
+            overlap = shared / min(q_size, r_size)
+            if overlap < 1.0 or not (norm in raw_norm or raw_norm in norm):
+                overlap = min(overlap, 0.95)
+            score = 0.5 * dice + 0.5 * overlap
+            if score > best_score:
+                best_idx, best_score = idx, score
+
+        if best_idx is None or best_score < self.min_score:
+            return None, best_score
+        return self.entries[best_idx][1], best_score
@@ -0,0 +1,367 @@
+import argparse
+import array
+import base64
+import json
+import math
+import os
+import re
+import sys
+import zlib
+from datetime import datetime, timedelta
+
+import atomic_io
+import delta_store
+import history_store
+import news_cluster
+from title_matcher import normalize_title
+
+# ================= 📈 标题趋势 / 加速度引擎 =================
+# 统计每个板块、每天快照里各“词”出现在多少条标题中，和前几天的基线比较，找出正在升温的话题：
+#   词      归一化标题里的中文二元组 + 英文/数字词（不依赖分词器）
+#   计数    每天、每个板块一个 array('H')，下标是词表里的编号（紧凑、可整段压缩存盘）
+#   velocity 今天 - 昨天；burst = (今天 - 基线均值) / √(基线均值 + 1)（泊松近似的 z 分数）
+# 历史日期只读一次（history/ 或 history_store/），当天的计数按当前 data_*.json 重算；
+# 有差量文件且板块没变化时直接跳过该板块。结果写入 trends_<sector>.json，
+# 供前端展示热度，也供 ai_editor 在 token 预算内优先选入升温话题的标题。
+
+TRENDS_STATE = os.environ.get("TRENDS_STATE", "trends_state.json")
+TRENDS_FILE = "trends_{sector}.json"
+HISTORY_DIR = "history"
+WINDOW_DAYS = int(os.environ.get("TRENDS_WINDOW", 14))   # 滚动窗口（含今天）
+TOP_TERMS = 30
+TOP_STORIES = 15
+MIN_COUNT = 3            # 今天至少出现在这么多条标题里才参与排名
+MAX_EXAMPLES = 3
+MERGE_OVERLAP = 0.8      # 两个词命中的标题集合重合度超过该值时只保留排名靠前的（如“英伟”“伟达”）
+COUNT_MAX = 65535        # array('H') 的上限
+
+FILES = {
+    "finance": "data_finance.json",
+    "tech": "data_tech.json",
+    "global": "data_global.json",
+    "general": "data_general.json",
+}
+
+# 高频但没有信息量的二元组，基线足够时它们的 burst 本来就低，这里只去掉最常见的一批
+STOP_TERMS = {
+    "的是", "一个", "什么", "我们", "你们", "他们", "如何", "为什么", "怎么", "这个", "那个",
+    "没有", "不是", "就是", "可以", "已经", "还是", "自己", "今天", "今年", "时候", "现在",
+    "最新", "回应", "官方", "消息", "网友", "视频", "曝光", "突发", "快讯", "热搜", "了一",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def title_terms(title):
+    """
+    标题 -> 词集合：英文/数字词（纯数字除外）整体算一个词，其余字符按二元组切分
+    """
+    norm = normalize_title(title)
+    terms = {w for w in _WORD_RE.findall(norm) if len(w) >= 2 and not w.isdigit()}
+    for run in _WORD_RE.sub(" ", norm).split():
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms - STOP_TERMS
+
+
+def expand_term(term, norms, support=0.6, max_len=12):
+    """
+    二元组往往是词的碎片（“统李”），在命中的标题里向左右贪心扩展成多数标题共有的片段（“总统李在明”）
+    """
+    need = max(2, math.ceil(support * len(norms)))
+    while len(term) < max_len:
+        options = {}
+        for norm in norms:
+            start = norm.find(term)
+            while start != -1:
+                if start > 0: options.setdefault(norm[start - 1] + term, set()).add(norm)
+                if start + len(term) < len(norm): options.setdefault(term + norm[start + len(term)], set()).add(norm)
+                start = norm.find(term, start + 1)
+        best = max(options.items(), key=lambda kv: len(kv[1]), default=None)
+        if not best or len(best[1]) < need: break
+        term = best[0]
+    return term
+
+
+def _titles(platforms):
+    titles = []
+    for platform in platforms or []:
+        for item in platform.get("items", []):
+            title = (item.get("title") or "").strip()
+            if title: titles.append(title)
+    return titles
+
+
+def _read_json(path):
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _encode(counts):
+    return base64.b64encode(zlib.compress(counts.tobytes(), 6)).decode("ascii")
+
+
+def _decode(text, byteorder):
+    counts = array.array("H")
+    counts.frombytes(zlib.decompress(base64.b64decode(text)))
+    if byteorder != sys.byteorder: counts.byteswap()
+    return counts
+
+
+class TrendCounter:
+    """
+    词表 + 按 (日期, 板块) 存放的计数数组；数组只在需要时向后补零，词表变长不影响旧数组
+    """
+
+    def __init__(self, window=None):
+        self.window = WINDOW_DAYS if window is None else window
+        self.terms = []
+        self.index = {}
+        self.days = {}       # date -> {sector: array('H')}
+        self.archived = set()  # 已经从归档读过的日期
+        self.stories = {}    # sector -> {簇标题指纹: 上一轮的来源数}
+
+    # ---------- 计数 ----------
+    def term_id(self, term):
+        idx = self.index.get(term)
+        if idx is None:
+            idx = self.index[term] = len(self.terms)
+            self.terms.append(term)
+        return idx
+
+    def set_day(self, date, sector, titles):
+        """
+        用一份快照的标题重算某天某板块的计数（同一条标题在多个平台出现各算一次）
+        """
+        ids = {}
+        for title in titles:
+            for term in title_terms(title):
+                idx = self.term_id(term)
+                ids[idx] = ids.get(idx, 0) + 1
+        counts = array.array("H", bytes(2 * (max(ids) + 1 if ids else 0)))
+        for idx, n in ids.items():
+            counts[idx] = min(n, COUNT_MAX)
+        self.days.setdefault(date, {})[sector] = counts
+
+    def count(self, date, sector, idx):
+        counts = self.days.get(date, {}).get(sector)
+        return counts[idx] if counts is not None and idx < len(counts) else 0
+
+    def roll(self, today):
+        """
+        丢掉窗口外的日期，再把不再出现的词从词表里压缩掉
+        """
+        cutoff = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=self.window - 1)).strftime("%Y-%m-%d")
+        expired = [d for d in self.days if d < cutoff]
+        for date in expired:
+            del self.days[date]
+        self.archived = {d for d in self.archived if d >= cutoff}
+        if not expired: return
+
+        used = set()
+        for sectors in self.days.values():
+            for counts in sectors.values():
+                used.update(i for i, n in enumerate(counts) if n)
+        if len(used) == len(self.terms): return
+        keep = sorted(used)
+        remap = {old: new for new, old in enumerate(keep)}
+        self.terms = [self.terms[i] for i in keep]
+        self.index = {term: i for i, term in enumerate(self.terms)}
+        for sectors in self.days.values():
+            for sector, counts in sectors.items():
+                compact = array.array("H", bytes(2 * len(keep)))
+                for i, n in enumerate(counts):
+                    if n: compact[remap[i]] = n
+                sectors[sector] = compact
+
+    # ---------- 评分 ----------
+    def score(self, date, sector, titles, clusters=None):
+        """
+        返回 {"terms": [...], "stories": [...]}；titles 用来挑例句、合并重叠的词
+        """
+        today = self.days.get(date, {}).get(sector)
+        if today is None: return {"terms": [], "stories": []}
+        prev_days = sorted(d for d in self.days if d < date)
+        yesterday = prev_days[-1] if prev_days else None
+
+        candidates = []
+        for idx, c in enumerate(today):
+            if c < MIN_COUNT: continue
+            history = [self.count(d, sector, idx) for d in prev_days]
+            base = sum(history) / len(history) if history else 0.0
+            burst = (c - base) / math.sqrt(base + 1)
+            if burst <= 0: continue
+            velocity = c - self.count(yesterday, sector, idx) if yesterday else c
+            candidates.append((burst, velocity, c, base, idx))
+        candidates.sort(reverse=True)
+
+        norm_titles = [(t, normalize_title(t)) for t in dict.fromkeys(titles)]
+        terms, covered = [], []
+        for burst, velocity, c, base, idx in candidates:
+            if len(terms) >= TOP_TERMS: break
+            term = self.terms[idx]
+            hits = {t for t, norm in norm_titles if term in norm}
+            if any(len(hits & other) >= MERGE_OVERLAP * min(len(hits), len(other)) for other in covered if hits and other):
+                continue
+            covered.append(hits)
+            terms.append({
+                "term": term, "label": expand_term(term, [normalize_title(t) for t in hits]),
+                "count": c, "baseline": round(base, 2),
+                "velocity": velocity, "burst": round(burst, 2),
+                "examples": sorted(hits, key=len)[:MAX_EXAMPLES],
+            })
+
+        stories = self._score_stories(sector, terms, clusters or [])
+        return {"terms": terms, "stories": stories}
+
+    def _score_stories(self, sector, terms, clusters):
+        """
+        多源报道的簇：来源数 × (1 + 标题里升温最快的词的 burst)，并和上一轮的来源数比较
+        """
+        bursts = {t["term"]: t["burst"] for t in terms}
+        previous = self.stories.get(sector, {})
+        current, stories = {}, []
+        for cluster in clusters:
+            fp = delta_store.item_fingerprint({"title": cluster["title"]})
+            sources = cluster.get("source_count", len(cluster.get("members", [])))
+            current[fp] = sources
+            heat = max((bursts.get(term, 0.0) for term in title_terms(cluster["title"])), default=0.0)
+            stories.append({
+                "title": cluster["title"], "sources": sources,
+                "growth": sources - previous[fp] if fp in previous else None,
+                "score": round(sources * (1 + heat), 2),
+                "url": next((m.get("url") for m in cluster.get("members", []) if m.get("url")), ""),
+            })
+        self.stories[sector] = current
+        stories.sort(key=lambda s: s["score"], reverse=True)
+        return stories[:TOP_STORIES]
+
+    # ---------- 持久化 ----------
+    def to_json(self):
+        return {
+            "window": self.window, "byteorder": sys.byteorder, "terms": self.terms,
+            "archived": sorted(self.archived), "stories": self.stories,
+            "days": {date: {sector: _encode(c) for sector, c in sectors.items()} for date, sectors in self.days.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data, window=None):
+        counter = cls(window)
+        counter.terms = data.get("terms", [])
+        counter.index = {term: i for i, term in enumerate(counter.terms)}
+        counter.archived = set(data.get("archived", []))
+        counter.stories = data.get("stories", {})
+        byteorder = data.get("byteorder", sys.byteorder)
+        counter.days = {date: {sector: _decode(text, byteorder) for sector, text in sectors.items()}
+                        for date, sectors in data.get("days", {}).items()}
+        return counter
+
+
+def load_counter(path=TRENDS_STATE):
+    if not os.path.exists(path): return TrendCounter()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return TrendCounter.from_json(json.load(f))
+    except (OSError, ValueError, zlib.error):
+        return TrendCounter()
+
+
+def _archived_dates():
+    dates = set(history_store.list_dates())
+    if os.path.isdir(HISTORY_DIR):
+        dates.update(d for d in os.listdir(HISTORY_DIR) if os.path.isdir(os.path.join(HISTORY_DIR, d)))
+    return sorted(dates)
+
+
+def _load_archived_day(date):
+    """
+    返回 {sector: 平台列表}；history/ 目录优先，没有时从 history_store 还原
+    """
+    day_dir = os.path.join(HISTORY_DIR, date)
+    store_day = None
+    day = {}
+    for sector, filename in FILES.items():
+        path = os.path.join(day_dir, filename)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                day[sector] = json.load(f)
+            continue
+        if store_day is None:
+            store_day = history_store.load_day(date) if date in history_store.list_dates() else {}
+        if filename in store_day:
+            day[sector] = store_day[filename]
+    return day
+
+
+def load_trend_terms(sector, limit=None):
+    """
+    读取 trends_<sector>.json 里排名靠前的词，供 input_builder 优先选入相关标题
+    """
+    path = TRENDS_FILE.format(sector=sector)
+    if not os.path.exists(path): return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            terms = json.load(f).get("terms", [])
+    except (OSError, ValueError):
+        return []
+    return [t["term"] for t in terms[:limit]]
+
+
+def update_trends(today=None, state_path=None, force=False):
+    """
+    增量更新：补读窗口内尚未读过的归档日期，重算今天有变化的板块并写出 trends_<sector>.json。
+    返回本次写出的板块列表
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    state_path = state_path or TRENDS_STATE
+    counter = load_counter(state_path)
+    counter.roll(today)
+    cutoff = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=counter.window - 1)).strftime("%Y-%m-%d")
+
+    # 1. 历史日期只读一次；今天的归档就是当前快照，按下面的实时数据算
+    for date in _archived_dates():
+        if date < cutoff or date >= today or date in counter.archived: continue
+        for sector, platforms in _load_archived_day(date).items():
+            counter.set_day(date, sector, _titles(platforms))
+        counter.archived.add(date)
+
+    # 2. 今天：差量显示没变化、且已经算过的板块直接跳过
+    delta = delta_store.load_delta()
+    written = []
+    for sector, filename in FILES.items():
+        if not force and today in counter.days and sector in counter.days[today] \
+                and delta is not None and not delta_store.sector_changed(sector, delta):
+            continue
+        platforms = _read_json(filename)
+        if platforms is None: continue
+        titles = _titles(platforms)
+        counter.set_day(today, sector, titles)
+
+        clusters_data = _read_json(news_cluster.CLUSTER_FILE) or {}
+        clusters = clusters_data.get("sectors", {}).get(sector, {}).get("merged", [])
+        result = counter.score(today, sector, titles, clusters)
+        atomic_io.write_json(TRENDS_FILE.format(sector=sector), {
+            "sector": sector, "date": today, "window_days": counter.window,
+            "baseline_days": len([d for d in counter.days if d < today]),
+            "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            **result,
+        })
+        written.append(sector)
+
+    atomic_io.write_json(state_path, counter.to_json(), compact=True)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="标题趋势 / 加速度排名")
+    parser.add_argument("--date", default=None, help="按哪一天计算（默认今天）")
+    parser.add_argument("--force", action="store_true", help="忽略差量，所有板块都重算")
+    args = parser.parse_args()
+    for sector in update_trends(args.date, force=args.force):
+        with open(TRENDS_FILE.format(sector=sector), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        top = ", ".join(f"{t['label']}({t['burst']})" for t in data["terms"][:8])
+        print(f"📈 {sector}: {top or '暂无明显升温的话题'}")